@@ -0,0 +1,135 @@
+"""
+Concurrency and tail-latency benchmark: WSGI vs ASGI
+
+Start the same project under both servers against the same database, e.g.
+
+    pip install gunicorn uvicorn
+    gunicorn config.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn config.asgi:application --workers 1 --port 8001
+
+then run
+
+    python benchmarks/concurrency.py \\
+        --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001 \\
+        --path /api/service-requests/pending/ --concurrency 1,10,50,200 --hold 20
+
+Each round runs `--requests` GETs from `--concurrency` concurrent clients and
+reports throughput and p50/p99 latency. `--hold` keeps that many slow clients
+connected for the whole round, each having sent only part of its request,
+the way stalled mobile and long-poll clients occupy a sync worker.
+Only the standard library is used.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float('nan')
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+async def fetch(host, port, path):
+    """One GET on a fresh connection; returns the HTTP status code"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()  # until the server closes
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def hold_slow_client(host, port, path, stop):
+    """Send part of a request and sit on the connection until stopped"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        await writer.drain()
+        await stop.wait()
+    finally:
+        writer.close()
+
+
+async def run_round(base_url, path, concurrency, requests, hold, timeout):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    stop = asyncio.Event()
+    holders = [asyncio.create_task(hold_slow_client(host, port, path, stop)) for _ in range(hold)]
+    await asyncio.sleep(0.2 if hold else 0)
+
+    latencies, errors = [], 0
+    remaining = requests
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(host, port, path), timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                errors += 1
+                continue
+            if status >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*holders, return_exceptions=True)
+    return {
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': statistics.median(latencies) * 1000 if latencies else float('nan'),
+        'p99': percentile(latencies, 99) * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', action='append', required=True,
+                        help='name=base URL, repeat for each server')
+    parser.add_argument('--path', action='append',
+                        help='path to request (repeatable, default: pending queue)')
+    parser.add_argument('--concurrency', default='1,10,50,200',
+                        help='comma-separated concurrent client counts')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per round')
+    parser.add_argument('--hold', type=int, default=0, help='slow clients held open per round')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds')
+    args = parser.parse_args()
+
+    targets = [target.split('=', 1) for target in args.target]
+    paths = args.path or ['/api/service-requests/pending/']
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    print(f"{'target':<8} {'path':<36} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for path in paths:
+        for level in levels:
+            for name, base_url in targets:
+                result = asyncio.run(run_round(
+                    base_url, path, level, args.requests, args.hold, args.timeout
+                ))
+                print(f"{name:<8} {path:<36} {level:>5} {result['rps']:>9.1f} "
+                      f"{result['p50']:>9.1f} {result['p99']:>9.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
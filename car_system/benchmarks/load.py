@@ -0,0 +1,320 @@
+"""
+API load benchmark with a saved baseline and a regression gate
+
+Drives the list endpoints and custom actions with a fixed scenario list and
+reports throughput and p50/p95/p99 latency per scenario. Seed the database
+first, e.g. `python manage.py generate_data --service-requests 1000000`, then
+run from the project directory:
+
+    python benchmarks/load.py --requests 200 --save-baseline benchmarks/baseline.json
+    python benchmarks/load.py --requests 200 --baseline benchmarks/baseline.json --threshold 0.2
+
+By default requests go through Django's test client in this process, one at
+a time, and the write scenarios run inside a transaction that is rolled
+back. With `--url` they go to a running server over HTTP from
+`--concurrency` threads; write scenarios are then skipped unless `--writes`
+is given, because their rows are kept. Path parameters (a customer, a
+vehicle, a pending request...) are picked from the database the settings
+point at, which must be the server's.
+
+With `--baseline`, the run exits with status 1 when a scenario's p95 grew by
+more than `--threshold` (and by at least `--min-delta-ms`), its throughput
+fell by more than `--threshold`, or it failed requests the baseline did not.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from concurrency import percentile  # noqa: E402  (benchmarks/ is on sys.path)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Scenario:
+    """One endpoint: path may use {customer}, {vehicle}, {attendant}, {service_request}, {pending}"""
+
+    def __init__(self, name, path, method='GET', body=None, prepare=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.body = body
+        self.prepare = prepare  # callable(ids) -> extra path parameters, run untimed
+
+    @property
+    def writes(self):
+        return self.method != 'GET'
+
+
+def new_pending_request(ids):
+    from carwash.models import ServiceRequest
+    service = ServiceRequest.objects.create(
+        vehicle_id=ids['vehicle'], customer_id=ids['customer'], service_type_id=ids['service_type']
+    )
+    return {'new_request': service.pk}
+
+
+def new_started_request(ids):
+    from carwash.models import ServiceRequest
+    from django.utils import timezone
+    service = ServiceRequest.objects.create(
+        vehicle_id=ids['vehicle'], customer_id=ids['customer'], service_type_id=ids['service_type'],
+        attendant_id=ids['attendant'], status='in_progress', start_time=timezone.now(),
+    )
+    return {'new_request': service.pk}
+
+
+SCENARIOS = [
+    Scenario('service-requests.list', '/api/service-requests/'),
+    Scenario('service-requests.list.sparse', '/api/service-requests/?fields=id,vehicle_plate,status'),
+    Scenario('service-requests.list.cursor', '/api/service-requests/?pagination=cursor'),
+    Scenario('service-requests.retrieve', '/api/service-requests/{service_request}/'),
+    Scenario('service-requests.pending', '/api/service-requests/pending/'),
+    Scenario('service-requests.next_available', '/api/service-requests/next_available/'),
+    Scenario('service-requests.predicted_wait', '/api/service-requests/{pending}/predicted_wait/'),
+    Scenario('parking.list', '/api/parking/'),
+    Scenario('parking.active', '/api/parking/active/'),
+    Scenario('parking.duration_stats', '/api/parking/duration_stats/'),
+    Scenario('parking-lots.occupancy', '/api/parking-lots/occupancy/'),
+    Scenario('payments.list', '/api/payments/'),
+    Scenario('payments.daily_revenue', '/api/payments/daily_revenue/'),
+    Scenario('payments.monthly_revenue', '/api/payments/monthly_revenue/'),
+    Scenario('customers.list', '/api/customers/'),
+    Scenario('customers.summary', '/api/customers/{customer}/summary/'),
+    Scenario('search.typeahead', '/api/search/?q={plate_prefix}'),
+    Scenario('gate.lookup', '/api/gate/?plate={plate}'),
+    Scenario('vehicles.service_history', '/api/vehicles/{vehicle}/service_history/'),
+    Scenario('attendants.performance', '/api/attendants/{attendant}/performance/'),
+    Scenario('service-requests.create', '/api/service-requests/', 'POST',
+             {'vehicle': '{vehicle}', 'customer': '{customer}', 'service_type': '{service_type}'}),
+    Scenario('service-requests.start_service', '/api/service-requests/{new_request}/start_service/', 'POST',
+             prepare=new_pending_request),
+    Scenario('service-requests.complete_service', '/api/service-requests/{new_request}/complete_service/',
+             'POST', prepare=new_started_request),
+]
+
+
+def sample_ids():
+    """Path parameters from the database: recent rows, as the app's hot paths see them"""
+    from carwash.models import Attendant, Customer, ServiceRequest, ServiceType, Vehicle
+
+    latest = ServiceRequest.objects.order_by('-request_date').first()
+    pending = ServiceRequest.objects.filter(status='pending').order_by('-request_date').first()
+    vehicle = Vehicle.objects.filter(pk=latest.vehicle_id).first() if latest else Vehicle.objects.first()
+    return {
+        'service_request': latest.pk if latest else None,
+        'pending': pending.pk if pending else None,
+        'vehicle': vehicle.pk if vehicle else None,
+        'plate': vehicle.plate_key if vehicle else None,
+        'plate_prefix': vehicle.plate_key[:4] if vehicle else None,
+        'customer': vehicle.customer_id if vehicle else Customer.objects.values_list('pk', flat=True).first(),
+        'attendant': Attendant.objects.filter(is_active=True).values_list('pk', flat=True).first(),
+        'service_type': ServiceType.objects.filter(is_active=True).values_list('pk', flat=True).first(),
+    }
+
+
+def fill(template, params):
+    if isinstance(template, dict):
+        return {key: fill(value, params) for key, value in template.items()}
+    if not isinstance(template, str):
+        return template
+    value = template.format(**params)
+    return int(value) if template.startswith('{') and value.isdigit() else value
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(HTTP_HOST='localhost', HTTP_ACCEPT='application/json')
+
+    def __call__(self, method, path, body):
+        if method == 'GET':
+            response = self.client.get(path)
+        else:
+            response = self.client.generic(method, path, json.dumps(body or {}), 'application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+
+class HTTPClient:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def __call__(self, method, path, body):
+        data = json.dumps(body or {}).encode() if method != 'GET' else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+
+def run_scenario(scenario, client, ids, requests, warmup, concurrency):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(timed):
+        nonlocal errors
+        params = dict(ids)
+        if scenario.prepare:
+            params.update(scenario.prepare(ids))
+        path, body = fill(scenario.path, params), fill(scenario.body, params)
+        started = time.perf_counter()
+        try:
+            status = client(scenario.method, path, body)
+        except OSError:
+            status = None
+        elapsed = time.perf_counter() - started
+        if timed:
+            with lock:
+                if status is None or status >= 400:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+    for _ in range(warmup):
+        one(False)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda _: one(True), range(requests)))
+    else:
+        for _ in range(requests):
+            one(True)
+    elapsed = time.perf_counter() - started
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+    }
+    for pct in (50, 95, 99):
+        result[f'p{pct}_ms'] = round(percentile(latencies, pct) * 1000, 2) if latencies else None
+    return result
+
+
+def ms(value):
+    return f'{value:>9.2f}' if value is not None else f"{'-':>9}"
+
+
+def run(scenarios, client, requests, warmup, concurrency):
+    ids = sample_ids()
+    results = {}
+    print(f"{'scenario':<38} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario in scenarios:
+        template = scenario.path + json.dumps(scenario.body)
+        needed = [name for name in ids if scenario.prepare or f'{{{name}}}' in template]
+        if any(ids[name] is None for name in needed):
+            print(f'{scenario.name:<38} skipped: no rows to request')
+            continue
+        result = run_scenario(scenario, client, ids, requests, warmup, concurrency)
+        results[scenario.name] = result
+        print(f"{scenario.name:<38} {result['rps']:>9.1f} {ms(result['p50_ms'])} "
+              f"{ms(result['p95_ms'])} {ms(result['p99_ms'])} {result['errors']:>7}")
+    return results
+
+
+def regressions(results, baseline, threshold, min_delta_ms):
+    """Descriptions of every scenario that got worse than the baseline allows"""
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] is not None and base['p95_ms'] is not None and (
+            result['p95_ms'] > base['p95_ms'] * (1 + threshold)
+            and result['p95_ms'] - base['p95_ms'] >= min_delta_ms
+        ):
+            found.append(f"{name}: p95 {base['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result['rps'] < base['rps'] * (1 - threshold):
+            found.append(f"{name}: throughput {base['rps']:.1f} -> {result['rps']:.1f} req/s")
+        if result['errors'] and not base['errors']:
+            found.append(f"{name}: {result['errors']} failed requests")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario first')
+    parser.add_argument('--only', help='comma-separated scenario names or prefixes (e.g. payments.)')
+    parser.add_argument('--url', help='base URL of a running server (default: in-process)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads, with --url')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout with --url')
+    parser.add_argument('--writes', action='store_true', help='run write scenarios against --url')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative p95 growth / throughput loss (default 0.2)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='ignore p95 growth smaller than this')
+    parser.add_argument('--settings', help='Django settings module')
+    args = parser.parse_args()
+
+    if args.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    from django.db import transaction
+
+    # Failed requests are counted; slow-request and 4xx log lines would drown the table
+    logging.disable(logging.WARNING)
+
+    scenarios = SCENARIOS
+    if args.only:
+        prefixes = tuple(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario.name.startswith(prefixes)]
+    if args.url:
+        if not args.writes:
+            scenarios = [scenario for scenario in scenarios if not scenario.writes]
+        results = run(scenarios, HTTPClient(args.url, args.timeout), args.requests, args.warmup, args.concurrency)
+    else:
+        try:
+            with transaction.atomic():
+                results = run(scenarios, InProcessClient(), args.requests, args.warmup, 1)
+                raise Rollback
+        except Rollback:
+            pass
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({
+            'meta': {
+                'target': args.url or 'in-process', 'concurrency': args.concurrency if args.url else 1,
+                'requests': args.requests, 'python': platform.python_version(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }, indent=2) + '\n')
+        print(f'Baseline written to {args.save_baseline}')
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())['results']
+        found = regressions(results, baseline, args.threshold, args.min_delta_ms)
+        if found:
+            print('Regressions against the baseline:')
+            for line in found:
+                print(f'  {line}')
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
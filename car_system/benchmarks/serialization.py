@@ -0,0 +1,138 @@
+"""
+List serialization benchmark: DRF serializers vs the values_list() fast path
+
+Measures rows per second for the service request, parking and payment list
+payloads, built by the ModelSerializers and rendered with DRF's JSONRenderer
+versus built by carwash.fastpath and rendered with FastJSONRenderer, and
+checks both produce the same bytes. Run from the project directory:
+
+    python benchmarks/serialization.py --rows 2000 --repeat 5
+
+Sample rows are added when the database holds fewer than `--rows`, inside a
+transaction that is rolled back afterwards. Pass `--settings` to point at
+another settings module (default: DJANGO_SETTINGS_MODULE or config.settings).
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(rows):
+    """Top the service request, parking and payment tables up to `rows` each"""
+    from carwash.models import (
+        Attendant, Customer, Parking, Payment, ServiceRequest, ServiceType, Vehicle
+    )
+
+    missing = rows - min(ServiceRequest.objects.count(), Parking.objects.count(), Payment.objects.count())
+    if missing <= 0:
+        return
+    attendant = Attendant.objects.create(
+        name='Bench Attendant', phone='bench-att', email='bench-att@example.com', id_number='bench-att'
+    )
+    service_type = ServiceType.objects.create(
+        name='Bench Wash', description='benchmark', base_price=Decimal('15000'), estimated_time_minutes=30
+    )
+    customers = Customer.objects.bulk_create([
+        Customer(name=f'Bench Customer {n}', phone=f'bench-{n}', email=f'bench{n}@example.com',
+                 id_number=f'bench-{n}', address='Dar es Salaam')
+        for n in range(missing // 10 + 1)
+    ])
+    vehicles = Vehicle.objects.bulk_create([
+        Vehicle(customer=customer, plate_number=f'BENCH-{n:05d}', vehicle_type='sedan',
+                color='white', make='Toyota', model='Corolla', year=2020)
+        for n, customer in enumerate(customers)
+    ])
+    services = ServiceRequest.objects.bulk_create([
+        ServiceRequest(vehicle=vehicles[n % len(vehicles)], customer=vehicles[n % len(vehicles)].customer,
+                       service_type=service_type, attendant=attendant if n % 2 else None, notes=f'visit {n}')
+        for n in range(missing)
+    ])
+    parkings = Parking.objects.bulk_create([
+        Parking(vehicle=vehicles[n % len(vehicles)], customer=vehicles[n % len(vehicles)].customer,
+                attendant=attendant if n % 2 else None, parking_fee=Decimal('2000'))
+        for n in range(missing)
+    ])
+    Payment.objects.bulk_create([
+        Payment(customer=services[n].customer, amount=Decimal('15000.50'), payment_method='cash',
+                service_request=services[n] if n % 3 == 1 else None,
+                parking=parkings[n] if n % 3 == 2 else None)
+        for n in range(missing)
+    ])
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run(rows, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from carwash.fastpath import row_plan
+    from carwash.renderers import FastJSONRenderer
+    from carwash.views import ParkingViewSet, PaymentViewSet, ServiceRequestViewSet
+
+    json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    print(f"{'endpoint':<18} {'path':<12} {'rows/s build':>13} {'rows/s +render':>15} {'speedup':>8}")
+    for viewset in (ServiceRequestViewSet, ParkingViewSet, PaymentViewSet):
+        queryset = viewset.queryset.all()[:rows]
+        serializer_class = viewset.serializer_class
+        plan = row_plan(serializer_class)
+        count = len(queryset)
+
+        serializer_build, _ = best_of(repeat, lambda: serializer_class(queryset.all(), many=True).data)
+        serializer_total, expected = best_of(
+            repeat, lambda: json_renderer.render(serializer_class(queryset.all(), many=True).data)
+        )
+        fast_build, _ = best_of(repeat, lambda: plan.rows(plan.values(queryset)))
+        fast_total, actual = best_of(repeat, lambda: fast_renderer.render(plan.rows(plan.values(queryset))))
+        if actual != expected:
+            raise SystemExit(f'{serializer_class.__name__}: fast path output differs from the serializer')
+
+        name = serializer_class.__name__.replace('Serializer', '')
+        for label, build, total in (
+            ('serializer', serializer_build, serializer_total),
+            ('fastpath', fast_build, fast_total),
+        ):
+            speedup = f'{serializer_total / total:.1f}x' if label == 'fastpath' else ''
+            print(f'{name:<18} {label:<12} {count / build:>13,.0f} {count / total:>15,.0f} {speedup:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=2000, help='rows per list payload')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is kept)')
+    parser.add_argument('--settings', help='Django settings module')
+    args = parser.parse_args()
+
+    if args.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    from django.db import transaction
+
+    try:
+        with transaction.atomic():
+            seed(args.rows)
+            run(args.rows, args.repeat)
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
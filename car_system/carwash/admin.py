@@ -4,7 +4,8 @@ Django Admin configuration for Smart Car Wash System
 from django.contrib import admin
 from .models import (
     Attendant, Customer, Vehicle, ServiceType,
-    ServiceRequest, Parking, Payment
+    ServiceRequest, ParkingLot, ParkingBay, Parking, Payment, RevenueRollup,
+    ArchivedServiceRequest, ArchivedParking, ArchivedPayment
 )
 
 
@@ -33,7 +34,10 @@ class CustomerAdmin(admin.ModelAdmin):
     list_display = ['name', 'phone', 'email', 'id_number', 'date_registered', 'is_active']
     list_filter = ['is_active', 'date_registered']
     search_fields = ['name', 'phone', 'email', 'id_number']
-    readonly_fields = ['date_registered', 'created_at', 'updated_at']
+    readonly_fields = [
+        'date_registered', 'vehicle_count', 'visit_count', 'lifetime_spend', 'last_visit',
+        'created_at', 'updated_at'
+    ]
     fieldsets = (
         ('Personal Information', {
             'fields': ('name', 'phone', 'email', 'id_number', 'address')
@@ -41,6 +45,9 @@ class CustomerAdmin(admin.ModelAdmin):
         ('Account', {
             'fields': ('date_registered', 'is_active')
         }),
+        ('Activity', {
+            'fields': ('vehicle_count', 'visit_count', 'lifetime_spend', 'last_visit')
+        }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -53,7 +60,7 @@ class VehicleAdmin(admin.ModelAdmin):
     list_display = ['plate_number', 'customer', 'make', 'model', 'year', 'vehicle_type', 'is_active']
     list_filter = ['vehicle_type', 'color', 'is_active', 'year']
     search_fields = ['plate_number', 'customer__name', 'make', 'model', 'vin']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['visit_count', 'lifetime_spend', 'last_visit', 'created_at', 'updated_at']
     fieldsets = (
         ('Vehicle Identification', {
             'fields': ('plate_number', 'vin', 'customer')
@@ -64,6 +71,9 @@ class VehicleAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('is_active',)
         }),
+        ('Activity', {
+            'fields': ('visit_count', 'lifetime_spend', 'last_visit')
+        }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -120,16 +130,35 @@ class ServiceRequestAdmin(admin.ModelAdmin):
     )
 
 
+class ParkingBayInline(admin.TabularInline):
+    model = ParkingBay
+    fields = ['code', 'is_occupied']
+    readonly_fields = ['is_occupied']
+    extra = 0
+
+
+@admin.register(ParkingLot)
+class ParkingLotAdmin(admin.ModelAdmin):
+    list_display = ['name', 'capacity', 'occupied', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['name']
+    readonly_fields = ['occupied', 'created_at', 'updated_at']
+    inlines = [ParkingBayInline]
+
+
 @admin.register(Parking)
 class ParkingAdmin(admin.ModelAdmin):
     list_display = ['vehicle', 'customer', 'check_in_time', 'check_out_time', 'status', 'parking_fee', 'attendant']
     list_filter = ['status', 'check_in_time']
     search_fields = ['vehicle__plate_number', 'customer__name']
-    readonly_fields = ['check_in_time', 'created_at', 'updated_at']
+    readonly_fields = ['check_in_time', 'lot', 'bay', 'created_at', 'updated_at']
     fieldsets = (
         ('Vehicle & Customer', {
             'fields': ('vehicle', 'customer', 'attendant')
         }),
+        ('Location', {
+            'fields': ('lot', 'bay')
+        }),
         ('Parking Timeline', {
             'fields': ('check_in_time', 'check_out_time')
         }),
@@ -167,3 +196,41 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'payment_method', 'total_amount', 'transaction_count', 'updated_at']
+    list_filter = ['payment_method', 'date']
+    readonly_fields = ['date', 'payment_method', 'total_amount', 'transaction_count', 'updated_at']
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Archived rows are read-only; manage.py archive_records moves them"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedServiceRequest)
+class ArchivedServiceRequestAdmin(ArchiveAdmin):
+    list_display = ['vehicle', 'customer', 'service_type', 'status', 'attendant', 'request_date', 'archived_at']
+    list_filter = ['status', 'request_date', 'service_type']
+    search_fields = ['vehicle__plate_number', 'customer__name']
+
+
+@admin.register(ArchivedParking)
+class ArchivedParkingAdmin(ArchiveAdmin):
+    list_display = ['vehicle', 'customer', 'check_in_time', 'check_out_time', 'parking_fee', 'archived_at']
+    list_filter = ['check_in_time']
+    search_fields = ['vehicle__plate_number', 'customer__name']
+
+
+@admin.register(ArchivedPayment)
+class ArchivedPaymentAdmin(ArchiveAdmin):
+    list_display = ['customer', 'amount', 'payment_method', 'status', 'payment_date', 'transaction_ref', 'archived_at']
+    list_filter = ['status', 'payment_method', 'payment_date']
+    search_fields = ['customer__name', 'transaction_ref']
@@ -10,8 +10,11 @@ class CarwashConfig(AppConfig):
     verbose_name = 'Smart Car Wash & Parking System'
 
     def ready(self):
-        """Customize admin site when app is ready"""
+        """Customize admin site and connect signal handlers when app is ready"""
         from django.contrib import admin
+        from . import signals  # noqa: F401
+        from .profiling import record_queries
+        record_queries()
         admin.site.site_header = "🚗 Chism Car Care Administration"
         admin.site.site_title = "Chism Car Care"
         admin.site.index_title = "Welcome to Chism Car Care Management System"
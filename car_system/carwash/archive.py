@@ -0,0 +1,142 @@
+"""
+Hot/cold archival of closed service requests, parking and payments
+
+`manage.py archive_records` moves rows older than ARCHIVE_RETENTION_DAYS
+from ServiceRequest, Parking and Payment into ArchivedServiceRequest,
+ArchivedParking and ArchivedPayment, a batch per transaction, keeping ids
+and timestamps. Only closed rows move: completed or cancelled service
+requests and completed parking, each together with its settled payment,
+then settled payments linked to neither. A payment linked to both a service
+request and a parking record moves with the service request, taking the
+parking record along, once both are closed and past the window. An
+interrupted run loses at most its current batch and the next run carries on
+from the oldest rows left.
+
+Archived rows still count: the hot rows are deleted under keep_counted()
+(carwash.signals), so Customer/Vehicle counters and revenue rollups are
+untouched, and reconcile() and RevenueRollup.rebuild() read both tables. Read paths that
+take a date range (exports, vehicle service history) add the archive when
+the range starts on or before its newest row; see archive_reaches().
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import (
+    ArchivedParking, ArchivedPayment, ArchivedServiceRequest, Parking, Payment, ServiceRequest,
+)
+from .signals import keep_counted
+
+SETTLED_PAYMENT = ('completed', 'failed', 'refunded')
+
+
+class Archive:
+    """How rows of one hot model qualify for and move to their archive table"""
+
+    def __init__(self, model, archive_model, date_field, closed, payment_link=None, carries=None):
+        self.model = model
+        self.archive_model = archive_model
+        self.date_field = date_field
+        self.closed = closed
+        # Payment field pointing at this model; its payment moves along
+        self.payment_link = payment_link
+        # Archive of the other record a payment may link; it moves along too
+        self.carries = carries
+        self.carried_by = None
+        if carries is not None:
+            carries.carried_by = payment_link
+
+    def closed_before(self, cutoff, prefix=''):
+        return Q(**{f'{prefix}status__in': self.closed, f'{prefix}{self.date_field}__lt': cutoff})
+
+    def eligible(self, cutoff):
+        rows = self.model._base_manager.filter(self.closed_before(cutoff))
+        if self.model is Payment:
+            return rows.filter(service_request__isnull=True, parking__isnull=True)
+        settled = Q(payment__status__in=SETTLED_PAYMENT)
+        if self.carries is not None:
+            # The payment's other record moves along, so it must qualify too
+            link = f'payment__{self.carries.payment_link}'
+            other = Q(**{f'{link}__isnull': True}) | self.carries.closed_before(cutoff, f'{link}__')
+            return rows.filter(Q(payment__isnull=True) | (settled & other))
+        # A record whose payment also links a carrying record moves with that one
+        return rows.filter(
+            Q(payment__isnull=True) | Q(settled, **{f'payment__{self.carried_by}__isnull': True})
+        )
+
+    def move_batch(self, cutoff, batch_size):
+        """
+        Move up to batch_size of the oldest eligible rows
+
+        Returns (rows, linked payments, carried records) moved.
+        """
+        with transaction.atomic(), keep_counted():
+            pks = list(
+                self.eligible(cutoff).select_for_update(of=('self',))
+                .order_by(self.date_field, 'pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return 0, 0, 0
+            rows = self.model._base_manager.filter(pk__in=pks)
+            payments = Payment._base_manager.none()
+            if self.payment_link:
+                payments = Payment._base_manager.filter(**{f'{self.payment_link}_id__in': pks})
+            carried = None
+            if self.carries is not None:
+                carried_ids = payments.filter(**{f'{self.carries.payment_link}__isnull': False})
+                carried = self.carries.model._base_manager.filter(
+                    pk__in=list(carried_ids.values_list(f'{self.carries.payment_link}_id', flat=True))
+                )
+                self.carries.archive_model.objects.bulk_create(copies(self.carries.archive_model, carried))
+            self.archive_model.objects.bulk_create(copies(self.archive_model, rows))
+            moved_payments = len(ArchivedPayment.objects.bulk_create(copies(ArchivedPayment, payments)))
+            # Payments go first as they reference the rows
+            payments.delete()
+            moved_carried = carried.delete()[0] if carried is not None else 0
+            rows.delete()
+        return len(pks), moved_payments, moved_carried
+
+
+def copies(archive_model, rows):
+    now = timezone.now()
+    names = [field.attname for field in archive_model._meta.concrete_fields if field.name != 'archived_at']
+    return [
+        archive_model(archived_at=now, **{name: getattr(row, name) for name in names})
+        for row in rows.order_by()
+    ]
+
+
+PARKING_ARCHIVE = Archive(Parking, ArchivedParking, 'check_in_time', ('completed',), 'parking')
+
+# In the order they are archived: linked payments move with their rows
+ARCHIVES = {
+    ServiceRequest: Archive(
+        ServiceRequest, ArchivedServiceRequest, 'request_date', ('completed', 'cancelled'), 'service_request',
+        carries=PARKING_ARCHIVE
+    ),
+    Parking: PARKING_ARCHIVE,
+    Payment: Archive(Payment, ArchivedPayment, 'payment_date', SETTLED_PAYMENT),
+}
+
+
+def retention_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_RETENTION_DAYS', 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_reaches(model, start=None):
+    """True when archived rows of model may fall on or after start (any archived row when None)"""
+    archive = ARCHIVES[model]
+    newest = archive.archive_model.objects.aggregate(newest=Max(archive.date_field))['newest']
+    return newest is not None and (start is None or newest >= start)
+
+
+def archived_rows(model, filters, start=None):
+    """Archived rows of model matching filters, or None when the range cannot reach them"""
+    if not archive_reaches(model, start):
+        return None
+    return ARCHIVES[model].archive_model.objects.filter(**filters)
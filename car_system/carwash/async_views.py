@@ -0,0 +1,280 @@
+"""
+Async read paths for the read-heavy endpoints
+
+Served under ASGI (config.asgi), GETs on the service request, parking,
+payment, customer and vehicle lists, `pending`, `active`, customer `summary`
+and the revenue actions run on Django's async ORM, so a worker is not tied
+up while slow clients and queries wait. They reuse each viewset's queryset,
+filters, serializer or row plan, and ETag validators. Writes, search,
+ordering, cursor pages, `?format=` and the browsable API fall through to
+the regular DRF view.
+
+Every request first goes through the viewset's DRF initial() in a worker
+thread, so authentication, permissions, throttles, content negotiation and
+conditional GETs behave exactly as on the DRF view. Anything the async path
+does not handle, such as a 404 or an out-of-range page, then runs the DRF
+action on that same view instance, without checking the request twice.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import RevenueRollup
+from .renderers import FastJSONRenderer
+from .routing import replica_reads
+from .serializers import CustomerSerializer, ParkingSerializer, ServiceRequestSerializer
+from .views import PARKING_RELATED, SERVICE_REQUEST_RELATED
+
+SYNC_ONLY_PARAMS = ('search', 'ordering', 'cursor', 'format')
+
+_renderer = FastJSONRenderer()
+
+
+def wants_sync(request, kwargs):
+    if request.method != 'GET' or 'format' in kwargs:
+        return True
+    params = request.GET
+    if params.get('pagination') == 'cursor' or any(param in params for param in SYNC_ONLY_PARAMS):
+        return True
+    return 'text/html' in request.headers.get('Accept', '')
+
+
+def json_response(data, status=200):
+    response = HttpResponse(_renderer.render(data), content_type='application/json', status=status)
+    response['Vary'] = 'Accept'
+    response.data = data  # as on a DRF Response
+    return response
+
+
+def with_validators(view, response):
+    """Add the ETag/Last-Modified that ConditionalGetMixin.initial() computed"""
+    etag = getattr(view, 'conditional_etag', None)
+    if etag:
+        response['ETag'] = etag
+        if view.conditional_last_modified is not None:
+            response['Last-Modified'] = http_date(view.conditional_last_modified)
+    return response
+
+
+async def serialize_rows(view, queryset):
+    """Async FastListMixin.serialize_rows"""
+    plan = view.get_row_plan()
+    if plan is None:
+        return view.get_serializer([row async for row in queryset], many=True).data
+    return plan.rows([row async for row in plan.values(queryset)])
+
+
+async def paginate(view, queryset):
+    """Page-number page of serialized rows, or None to defer to the DRF paginator"""
+    request = view.request
+    paginator = view.paginator
+    try:
+        number = int(request.query_params.get(paginator.page_query_param, 1))
+    except ValueError:
+        return None
+    count = await queryset.acount()
+    pages = max(math.ceil(count / paginator.page_size), 1)
+    if not 1 <= number <= pages:
+        return None
+    offset = (number - 1) * paginator.page_size
+    rows = await serialize_rows(view, queryset[offset:offset + paginator.page_size])
+
+    url = request.build_absolute_uri()
+    previous = None
+    if number == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    elif number > 2:
+        previous = replace_query_param(url, paginator.page_query_param, number - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, paginator.page_query_param, number + 1) if number < pages else None,
+        'previous': previous,
+        'results': rows,
+    }
+
+
+def queryset_action(paginated=False, **filters):
+    """Async handler for a list-style action over the viewset's queryset"""
+    async def handler(view):
+        queryset = view.filter_queryset(view.get_queryset()).filter(**filters)
+        if paginated and view.paginator is not None:
+            data = await paginate(view, queryset)
+            if data is None:
+                return None
+        else:
+            data = await serialize_rows(view, queryset)
+        return with_validators(view, json_response(data))
+    return handler
+
+
+async def get_object(view):
+    """
+    Async GenericAPIView.get_object(): the same filtered lookup and object
+    permission check, or None when there is no such row.
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        obj = await queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]}).afirst()
+    except (TypeError, ValueError, DjangoValidationError):
+        return None
+    if obj is not None:
+        await sync_to_async(view.check_object_permissions)(view.request, obj)
+    return obj
+
+
+async def customer_summary(view):
+    """Async CustomerViewSet.summary"""
+    with replica_reads(view.request):
+        customer = await get_object(view)
+        if customer is None:
+            return None
+        recent_services = [
+            row async for row in customer.service_requests.select_related(*SERVICE_REQUEST_RELATED)[:5]
+        ]
+        recent_parking = [
+            row async for row in customer.parking_records.select_related(*PARKING_RELATED)[:5]
+        ]
+
+    return json_response({
+        'customer': CustomerSerializer(customer).data,
+        'vehicles_count': customer.vehicle_count,
+        'visit_count': customer.visit_count,
+        'last_visit': customer.last_visit,
+        'total_spent': str(customer.lifetime_spend),
+        'recent_services': ServiceRequestSerializer(recent_services, many=True).data,
+        'recent_parking': ParkingSerializer(recent_parking, many=True).data,
+    })
+
+
+async def revenue_totals(rollups):
+    totals = await rollups.aaggregate(total=Sum('total_amount'), count=Sum('transaction_count'))
+    return str(totals['total'] or 0), totals['count'] or 0
+
+
+async def daily_revenue(view):
+    """Async PaymentViewSet.daily_revenue"""
+    today = timezone.localdate()
+    with replica_reads(view.request):
+        rollups = RevenueRollup.objects.filter(date=today)
+        total, count = await revenue_totals(rollups)
+        by_method = {rollup.payment_method: str(rollup.total_amount) async for rollup in rollups}
+    return json_response({
+        'date': today,
+        'total_revenue': total,
+        'transactions': count,
+        'by_method': by_method,
+    })
+
+
+async def monthly_revenue(view):
+    """Async PaymentViewSet.monthly_revenue"""
+    today = timezone.localdate()
+    with replica_reads(view.request):
+        total, count = await revenue_totals(
+            RevenueRollup.objects.filter(date__gte=today.replace(day=1), date__lte=today)
+        )
+    return json_response({
+        'month': today.strftime('%B %Y'),
+        'total_revenue': total,
+        'transactions': count,
+    })
+
+
+# router URL name -> async GET handler
+ASYNC_READS = {
+    'customer-list': queryset_action(paginated=True),
+    'customer-summary': customer_summary,
+    'vehicle-list': queryset_action(paginated=True),
+    'servicerequest-list': queryset_action(paginated=True),
+    'servicerequest-pending': queryset_action(status='pending'),
+    'parking-list': queryset_action(paginated=True),
+    'parking-active': queryset_action(status='active'),
+    'payment-list': queryset_action(paginated=True),
+    'payment-daily-revenue': daily_revenue,
+    'payment-monthly-revenue': monthly_revenue,
+}
+
+
+def finalize(view, response):
+    view.response = view.finalize_response(view.request, response, *view.args, **view.kwargs)
+    return view.response
+
+
+def check_request(view, request, *args, **kwargs):
+    """
+    First half of APIView.dispatch(): wrap the request and run initial().
+
+    Returns the response that ends the request (a 401, 403, 429 or 304),
+    or None when the view may go on to serve it.
+    """
+    view.args, view.kwargs = args, kwargs
+    view.request = view.initialize_request(request, *args, **kwargs)
+    view.headers = view.default_response_headers
+    try:
+        view.initial(view.request, *args, **kwargs)
+    except Exception as exc:
+        return finalize(view, view.handle_exception(exc))
+    return None
+
+
+def run_action(view):
+    """Second half of APIView.dispatch(): the DRF action on a checked view"""
+    try:
+        response = getattr(view, view.action)(view.request, *view.args, **view.kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return finalize(view, response)
+
+
+def async_read_view(sync_view, handler):
+    """Serve GET through handler, falling back to the DRF view for everything else"""
+    viewset = sync_view.cls
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if wants_sync(request, kwargs):
+            return await run_sync(request, *args, **kwargs)
+        instance = viewset(**sync_view.initkwargs)
+        instance.action_map = sync_view.actions
+        instance.action = sync_view.actions['get']
+        response = await sync_to_async(check_request)(instance, request, *args, **kwargs)
+        if response is not None:
+            return response
+        try:
+            response = await handler(instance)
+        except ValidationError:
+            response = None  # reported by the DRF action
+        except APIException as exc:
+            return await sync_to_async(finalize)(instance, instance.handle_exception(exc))
+        if response is None:
+            response = await sync_to_async(run_action)(instance)
+        return response
+
+    view.csrf_exempt = True
+    view.cls = viewset
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    return view
+
+
+def with_async_reads(urls, handlers=ASYNC_READS):
+    """Router URL patterns with the read-heavy GETs served asynchronously"""
+    patterns = []
+    for pattern in urls:
+        handler = handlers.get(getattr(pattern, 'name', None))
+        if handler is not None:
+            pattern = URLPattern(
+                pattern.pattern, async_read_view(pattern.callback, handler),
+                pattern.default_args, pattern.name
+            )
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,243 @@
+"""
+Maintained Customer and Vehicle counters
+
+Customer.vehicle_count, visit_count, lifetime_spend and last_visit, and
+Vehicle.visit_count, lifetime_spend and last_visit, are kept in step by the
+save/delete hooks in carwash.signals and by CountedQuerySet.bulk_create,
+inside the writing transaction. A visit is a service request or a parking
+check-in; spend is completed payments, credited to the vehicle of the
+linked service request (or parking record).
+
+Deleting a visit does not move last_visit back, and writes that bypass the
+hooks (queryset.update, SET_NULL cascades) are not counted: reconcile()
+(`manage.py reconcile_counters`) recomputes the counters and fixes drift.
+Rows moved to the archive tables (carwash.archive) keep counting.
+
+ParkingLot.occupied and ParkingBay.is_occupied are maintained by the
+check-in views and the Parking hooks; reconcile_lots() recomputes them from
+the active parking records. QueueCounter (pending service requests, active
+parking records) is kept by the ServiceRequest and Parking hooks;
+QueueCounter.rebuild() recounts it.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateTimeField, Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import (
+    ArchivedParking, ArchivedPayment, ArchivedServiceRequest, Customer, Parking, ParkingBay,
+    ParkingLot, Payment, ServiceRequest, Vehicle,
+)
+
+CUSTOMER_COUNTERS = Customer.counter_fields
+VEHICLE_COUNTERS = Vehicle.counter_fields
+
+
+class CounterDeltas:
+    """Counter changes collected from rows, applied with one UPDATE per customer/vehicle"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.changes = {model: defaultdict(lambda: defaultdict(int)) for model in (Customer, Vehicle)}
+        self.visits = {Customer: {}, Vehicle: {}}  # pk -> latest visit time
+        self.spend_by_link = []  # (service_request_id, parking_id, amount)
+
+    def record(self, key, sign=1):
+        """Add (sign=1) or withdraw (sign=-1) a row's counter_key() contribution"""
+        if not key:
+            return
+        kind, customer_id = key[0], key[1]
+        if kind == 'vehicle':
+            self.changes[Customer][customer_id]['vehicle_count'] += sign
+        elif kind == 'visit':
+            _, _, vehicle_id, when = key
+            for model, pk in ((Customer, customer_id), (Vehicle, vehicle_id)):
+                self.changes[model][pk]['visit_count'] += sign
+                if sign > 0 and when is not None:
+                    latest = self.visits[model].get(pk)
+                    self.visits[model][pk] = max(latest, when) if latest else when
+        elif kind == 'spend':
+            _, _, service_request_id, parking_id, amount = key
+            self.changes[Customer][customer_id]['lifetime_spend'] += sign * amount
+            if service_request_id or parking_id:
+                self.spend_by_link.append((service_request_id, parking_id, sign * amount))
+
+    def resolve_vehicle_spend(self):
+        """Credit spend to vehicles with one lookup per linked model"""
+        vehicles = {}
+        for model, pks in (
+            (ServiceRequest, {sr for sr, _, _ in self.spend_by_link if sr}),
+            (Parking, {parking for sr, parking, _ in self.spend_by_link if parking and not sr}),
+        ):
+            if pks:
+                vehicles[model] = dict(model.objects.filter(pk__in=pks).values_list('pk', 'vehicle_id'))
+        for service_request_id, parking_id, amount in self.spend_by_link:
+            if service_request_id:
+                vehicle_id = vehicles[ServiceRequest].get(service_request_id)
+            else:
+                vehicle_id = vehicles[Parking].get(parking_id)
+            if vehicle_id:
+                self.changes[Vehicle][vehicle_id]['lifetime_spend'] += amount
+
+    def apply(self):
+        self.resolve_vehicle_spend()
+        now = timezone.now()
+        for model, rows in self.changes.items():
+            for pk in set(rows) | set(self.visits[model]):
+                updates = {field: F(field) + delta for field, delta in rows.get(pk, {}).items() if delta}
+                when = self.visits[model].get(pk)
+                if when is not None:
+                    when = Value(when, output_field=DateTimeField())
+                    updates['last_visit'] = Greatest(Coalesce('last_visit', when), when)
+                if updates:
+                    model.objects.filter(pk=pk).update(updated_at=now, **updates)
+        self.reset()
+
+
+def sync(instance):
+    """Apply the difference between a saved row's counted and current contribution"""
+    previous = getattr(instance, '_counted', None)
+    current = instance.counter_key()
+    if previous != current:
+        deltas = CounterDeltas()
+        deltas.record(previous, -1)
+        deltas.record(current)
+        deltas.apply()
+    instance._counted = current
+
+
+def discard(instance):
+    """Withdraw a deleted row's contribution"""
+    deltas = CounterDeltas()
+    deltas.record(getattr(instance, '_counted', None), -1)
+    deltas.apply()
+    instance._counted = None
+
+
+def count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        .annotate(n=Count('pk')).values('n')
+    ), 0)
+
+
+def latest_of(queryset, field, date_field):
+    return Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by(f'-{date_field}').values(date_field)[:1]
+    )
+
+
+def latest(*values):
+    """The greatest of values that are not NULL (GREATEST is NULL on any NULL in SQLite)"""
+    return Greatest(*(Coalesce(value, *(other for other in values if other is not value)) for value in values))
+
+
+def spend_of(payments):
+    return Coalesce(
+        Subquery(payments.order_by().values('status').annotate(total=Sum('amount')).values('total')),
+        Value(Decimal('0')),
+    )
+
+
+VISITS = (
+    (ServiceRequest, 'request_date'), (ArchivedServiceRequest, 'request_date'),
+    (Parking, 'check_in_time'), (ArchivedParking, 'check_in_time'),
+)
+
+
+def expected_counters(field, spend):
+    """Visit count, spend and last visit per `field` (customer or vehicle) across hot and archived rows"""
+    services, archived_services, parking, archived_parking = (
+        (count_of(model.objects, field), latest_of(model.objects, field, date_field))
+        for model, date_field in VISITS
+    )
+    return {
+        'expected_visit_count': services[0] + archived_services[0] + parking[0] + archived_parking[0],
+        'expected_lifetime_spend': (
+            spend_of(Payment.objects.filter(spend, status='completed'))
+            + spend_of(ArchivedPayment.objects.filter(spend, status='completed'))
+        ),
+        'expected_last_visit': latest(services[1], archived_services[1], parking[1], archived_parking[1]),
+    }
+
+
+def expected_customer_counters():
+    return {
+        'expected_vehicle_count': count_of(Vehicle.objects, 'customer'),
+        **expected_counters('customer', Q(customer=OuterRef('pk'))),
+    }
+
+
+def expected_vehicle_counters():
+    return expected_counters('vehicle', (
+        Q(service_request__vehicle=OuterRef('pk'))
+        | Q(service_request__isnull=True, parking__vehicle=OuterRef('pk'))
+    ))
+
+
+def reconcile_model(queryset, counters, expected, dry_run=False, chunk_size=2000):
+    """Recompute counters for every row of queryset; returns the number that drifted"""
+    names = [f'expected_{field}' for field in counters]
+    rows = queryset.order_by('pk').annotate(**expected).values_list('pk', *counters, *names)
+    drifted = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        stored, actual = row[1:1 + len(counters)], row[1 + len(counters):]
+        if tuple(stored) != tuple(actual):
+            obj = queryset.model(pk=row[0], updated_at=timezone.now())
+            for field, value in zip(counters, actual):
+                setattr(obj, field, value)
+            drifted.append(obj)
+    if drifted and not dry_run:
+        queryset.model.objects.bulk_update(drifted, [*counters, 'updated_at'], batch_size=chunk_size)
+    return len(drifted)
+
+
+def reconcile(customer_ids=None, dry_run=False):
+    """
+    Recompute Customer and Vehicle counters from the source tables
+
+    Limited to the given customers (and their vehicles) when customer_ids is
+    set. Returns (customers fixed, vehicles fixed).
+    """
+    customers = Customer.objects.all()
+    vehicles = Vehicle.objects.all()
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=customer_ids)
+        vehicles = vehicles.filter(customer_id__in=customer_ids)
+    with transaction.atomic():
+        return (
+            reconcile_model(customers, CUSTOMER_COUNTERS, expected_customer_counters(), dry_run),
+            reconcile_model(vehicles, VEHICLE_COUNTERS, expected_vehicle_counters(), dry_run),
+        )
+
+
+def reconcile_lots(dry_run=False):
+    """
+    Recompute lot occupancy and bay flags from the active parking records
+
+    Returns (lots fixed, bays fixed).
+    """
+    active = Parking.objects.filter(status='active')
+    now = timezone.now()
+    with transaction.atomic():
+        lots = [
+            ParkingLot(pk=pk, occupied=expected, updated_at=now)
+            for pk, occupied, expected in ParkingLot.objects.select_for_update()
+            .annotate(expected=count_of(active, 'lot')).values_list('pk', 'occupied', 'expected')
+            if occupied != expected
+        ]
+        bays = [
+            ParkingBay(pk=pk, is_occupied=expected, updated_at=now)
+            for pk, is_occupied, expected in ParkingBay.objects
+            .annotate(expected=Exists(active.filter(bay=OuterRef('pk')))).values_list('pk', 'is_occupied', 'expected')
+            if is_occupied != expected
+        ]
+        if not dry_run:
+            ParkingLot.objects.bulk_update(lots, ['occupied', 'updated_at'])
+            ParkingBay.objects.bulk_update(bays, ['is_occupied', 'updated_at'])
+    return len(lots), len(bays)
@@ -0,0 +1,76 @@
+"""
+Streaming CSV/NDJSON encoders for data exports
+
+stream_rows() encodes an iterator of row tuples for WSGI. astream_rows()
+encodes the same iterator for ASGI, where Django would otherwise read a
+sync iterator to the end before sending anything: rows are fetched a chunk
+at a time in a worker thread and encoded on the event loop.
+"""
+import csv
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+_encoder = DjangoJSONEncoder()
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date, time, Decimal)):
+        return _encoder.default(value)
+    return value
+
+
+def csv_encoder(columns):
+    """(header line, row tuple -> CSV line)"""
+    writer = csv.writer(_Echo())
+    return writer.writerow(columns), lambda row: writer.writerow([_csv_value(value) for value in row])
+
+
+def ndjson_encoder(columns):
+    """(no header, row tuple -> newline-terminated JSON object)"""
+    return None, lambda row: json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+ENCODERS = {
+    'csv': csv_encoder,
+    'ndjson': ndjson_encoder,
+}
+
+
+def stream_rows(export_format, columns, rows):
+    header, encode = ENCODERS[export_format](columns)
+    if header is not None:
+        yield header
+    for row in rows:
+        yield encode(row)
+
+
+async def astream_rows(export_format, columns, rows, chunk_size=2000):
+    header, encode = ENCODERS[export_format](columns)
+    if header is not None:
+        yield header
+    # Thread-sensitive, so every chunk reads from the same connection (and
+    # server-side cursor); queryset.aiterator() runs values_list() queries
+    # on the event loop in Django 4.2
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield encode(row)
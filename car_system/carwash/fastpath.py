@@ -0,0 +1,192 @@
+"""
+Read-only fast path for list responses
+
+A RowPlan compiles a ModelSerializer once into a values_list() query and
+one mapper per field, so list rows are built straight from result tuples
+instead of model instances and field-by-field serializer calls. Nested
+serializers (PaymentSerializer.service_detail) become extra columns on the
+same query. The rows equal the serializer's output, down to omitting a
+dotted-source field whose relation is null and rendering a null nested
+object as None.
+
+Serializers with fields that do not map onto columns (method fields,
+properties, many=True) get no plan and stay on the regular serializer.
+Plans follow `?fields=`/`?expand=` (serializers.SparseFieldsMixin), so a
+sparse request selects and joins only what it renders, and narrow() gives
+the serializer path the same savings.
+"""
+import functools
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PrimaryKeyRelatedField, RelatedField
+
+from .profiling import phase
+
+# Fields whose to_representation() returns the database value unchanged
+IDENTITY_FIELDS = {
+    serializers.CharField, serializers.EmailField,
+    serializers.IntegerField, serializers.BooleanField,
+}
+
+
+class Unsupported(Exception):
+    """A serializer field the fast path cannot map onto a column"""
+
+
+def resolve_source(model, source):
+    """(lookup, lookups of nullable relations on the way, model field) for a dotted source"""
+    parts = source.split('.')
+    path, guards = [], []
+    for position, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise Unsupported(source)
+        if not field.concrete or field.many_to_many:
+            raise Unsupported(source)
+        path.append(part)
+        if position < len(parts) - 1:
+            if not field.is_relation:
+                raise Unsupported(source)
+            if field.null:
+                guards.append('__'.join(path))
+            model = field.related_model
+    return '__'.join(path), guards, field
+
+
+def converter_for(field, model_field):
+    """Mapper for a column value, or None when it is used as is"""
+    if isinstance(field, RelatedField):
+        # values_list() yields the related pk, which is what the field renders
+        if (not model_field.is_relation
+                or type(field).to_representation is not PrimaryKeyRelatedField.to_representation
+                or field.pk_field is not None):
+            raise Unsupported(field.field_name)
+        return None
+    if model_field.is_relation:
+        raise Unsupported(field.field_name)
+    if type(field) in IDENTITY_FIELDS:
+        return None
+    if type(field) is serializers.ChoiceField and all(
+        isinstance(value, str) for value in field.choice_strings_to_values.values()
+    ):
+        return None
+    return field.to_representation
+
+
+class RowPlan:
+    """values_list() lookups and per-field mappers compiled from a serializer"""
+
+    def __init__(self, serializer):
+        self.lookups = []
+        self.steps = self.compile(serializer, '')
+
+    def column(self, lookup):
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return self.lookups.index(lookup)
+
+    def compile(self, serializer, prefix):
+        model = serializer.Meta.model
+        steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or field.default is not empty:
+                raise Unsupported(name)
+            nested = None
+            if isinstance(field, serializers.BaseSerializer):
+                if not isinstance(field, serializers.ModelSerializer):
+                    raise Unsupported(name)
+                lookup, guards, model_field = resolve_source(model, field.source)
+                if not model_field.is_relation:
+                    raise Unsupported(name)
+                nested = self.compile(field, f'{prefix}{lookup}__')
+                convert = None
+            else:
+                lookup, guards, model_field = resolve_source(model, field.source)
+                convert = converter_for(field, model_field)
+            # A null relation part-way along the source makes DRF skip the
+            # field, unless it may be null itself
+            guards = () if field.allow_null else tuple(self.column(prefix + guard) for guard in guards)
+            steps.append((name, self.column(prefix + lookup), convert, guards, nested))
+        return steps
+
+    def narrow(self, queryset):
+        """queryset loading only the plan's columns and relations, for model instances"""
+        related = set()
+        columns = set(self.lookups) | set(getattr(queryset.model, 'tracked_fields', ()))
+        for lookup in self.lookups:
+            model = queryset.model
+            parts = lookup.split('__')
+            for depth in range(1, len(parts)):
+                path = '__'.join(parts[:depth])
+                model = model._meta.get_field(parts[depth - 1]).related_model
+                related.add(path)
+                columns.add(path)
+                columns.update(f'{path}__{name}' for name in getattr(model, 'tracked_fields', ()))
+        return queryset.select_related(None).select_related(*related).only(*columns)
+
+    def values(self, queryset):
+        """The queryset as tuples in the order the plan reads them"""
+        return queryset.values_list(*self.lookups)
+
+    def pageable(self, queryset):
+        """values() for a paginator, counting the queryset without the plan's joins"""
+        return PlannedRows(self, queryset)
+
+    def build(self, steps, row):
+        data = {}
+        for name, column, convert, guards, nested in steps:
+            if guards and any(row[guard] is None for guard in guards):
+                continue
+            value = row[column]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = self.build(nested, row)
+            elif convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
+    def rows(self, tuples):
+        tuples = list(tuples)  # run the query outside the serialize phase
+        steps = self.steps
+        with phase('serialize'):
+            return [self.build(steps, row) for row in tuples]
+
+
+class PlannedRows:
+    """Sliceable plan rows whose count() is the plain queryset's"""
+
+    def __init__(self, plan, queryset):
+        self.plan = plan
+        self.queryset = queryset
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def __getitem__(self, key):
+        return self.plan.values(self.queryset)[key]
+
+
+@functools.lru_cache(maxsize=256)
+def row_plan(serializer_class, fields=None, expand=frozenset()):
+    """
+    Cached RowPlan for a serializer class, or None if it has unsupported fields
+
+    fields (a frozenset, or None for all) and expand are passed to the
+    serializer as its `fields` and `expand` context.
+    """
+    try:
+        return RowPlan(serializer_class(context={'fields': fields, 'expand': expand}))
+    except Unsupported:
+        return None
@@ -0,0 +1,83 @@
+"""
+Normalized search keys for plate numbers, phone numbers and names
+
+"tza 1234ab", "TZA-1234-AB" and "TZA 1234 AB" share the plate key
+TZA1234AB; "0712 345 678", "+255 712-345-678" and "255712345678" share the
+phone key 255712345678; names are lowercased, stripped of accents and
+punctuation, with single spaces between words. SearchKeyField stores the
+key of another field and keeps it in step on every save() and bulk_create().
+"""
+import re
+import unicodedata
+
+from django.db import models
+
+# Country code assumed for national (0-prefixed or 9-digit) phone numbers
+DEFAULT_COUNTRY_CODE = '255'
+NATIONAL_DIGITS = 9
+
+
+def plate_key(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+def phone_key(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('00'):
+        return digits[2:]
+    if digits.startswith('0') and len(digits) == NATIONAL_DIGITS + 1:
+        return DEFAULT_COUNTRY_CODE + digits[1:]
+    if len(digits) == NATIONAL_DIGITS and not digits.startswith('0'):
+        return DEFAULT_COUNTRY_CODE + digits
+    return digits
+
+
+def name_key(value):
+    text = unicodedata.normalize('NFKD', value or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+
+NORMALIZERS = {'plate': plate_key, 'phone': phone_key, 'name': name_key}
+
+
+class SearchKeyField(models.CharField):
+    """
+    Indexed, normalized copy of the `source` field, computed in pre_save()
+
+    save() and bulk_create() both call pre_save(); writes that skip it
+    (queryset.update(), bulk_update(), upserts not listing the key in
+    update_fields) must recompute the key themselves.
+    """
+
+    def __init__(self, *args, source=None, kind=None, **kwargs):
+        if kind not in NORMALIZERS:
+            raise ValueError(f'kind must be one of {sorted(NORMALIZERS)}')
+        self.source = source
+        self.kind = kind
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('default', '')
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.update(source=self.source, kind=self.kind)
+        return name, path, args, kwargs
+
+    def normalize(self, value):
+        return NORMALIZERS[self.kind](value)
+
+    def pre_save(self, model_instance, add):
+        value = self.normalize(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def search_key_fields(model, changed):
+    """Names of the model's search keys derived from any of the `changed` fields"""
+    return [
+        field.name for field in model._meta.concrete_fields
+        if isinstance(field, SearchKeyField) and field.source in changed
+    ]
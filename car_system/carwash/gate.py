@@ -0,0 +1,196 @@
+"""
+Gate lookups: plate -> vehicle, owner, active parking and open service requests
+
+Resolving an arriving plate takes three queries (vehicle with its owner,
+active parking, open service requests). GateCache keeps the resolved
+records of recently seen plates in a bounded LRU in process memory,
+unknown plates included. Saves and deletes of vehicles, customers,
+service requests, parking and payments drop the affected entries through
+signals (see carwash.signals), and CountedQuerySet.bulk_create does the same
+for bulk inserts. Writes made by other worker processes, or by
+queryset.update(), reach a process when its entry expires after
+GATE_CACHE_SECONDS.
+
+Hits, misses, evictions and invalidations are counted in carwash.metrics.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .fields import plate_key
+from .metrics import DESCRIPTIONS, registry
+from .models import Customer, Parking, ServiceRequest, Vehicle
+
+HITS = 'carwash_gate_cache_hits_total'
+MISSES = 'carwash_gate_cache_misses_total'
+EVICTIONS = 'carwash_gate_cache_evictions_total'
+INVALIDATIONS = 'carwash_gate_cache_invalidations_total'
+
+DESCRIPTIONS.update({
+    HITS: ('counter', 'Gate plate lookups served from the in-process cache'),
+    MISSES: ('counter', 'Gate plate lookups resolved from the database'),
+    EVICTIONS: ('counter', 'Gate cache entries evicted as least recently used'),
+    INVALIDATIONS: ('counter', 'Gate cache entries dropped because their rows changed'),
+})
+
+VEHICLE_FIELDS = (
+    'id', 'plate_number', 'vehicle_type', 'color', 'make', 'model', 'year',
+    'is_active', 'visit_count', 'last_visit',
+)
+CUSTOMER_FIELDS = ('id', 'name', 'phone', 'is_active', 'visit_count', 'lifetime_spend', 'last_visit')
+PARKING_FIELDS = ('id', 'check_in_time', 'lot', 'lot__name', 'bay', 'bay__code', 'attendant')
+SERVICE_REQUEST_FIELDS = (
+    'id', 'status', 'service_type', 'service_type__name', 'attendant', 'request_date', 'start_time',
+)
+
+
+def resolve(key):
+    """The gate record of a plate key, or None when no vehicle has that plate"""
+    columns = VEHICLE_FIELDS + tuple(f'customer__{field}' for field in CUSTOMER_FIELDS)
+    row = Vehicle.objects.filter(plate_key=key).values(*columns).first()
+    if row is None:
+        return None
+    vehicle = {field: row[field] for field in VEHICLE_FIELDS}
+    customer = {field: row[f'customer__{field}'] for field in CUSTOMER_FIELDS}
+    parking = (
+        Parking.objects.filter(vehicle_id=vehicle['id'], status='active')
+        .order_by('-check_in_time').values(*PARKING_FIELDS).first()
+    )
+    service_requests = list(
+        ServiceRequest.objects.filter(vehicle_id=vehicle['id'], status__in=['pending', 'in_progress'])
+        .order_by('request_date').values(*SERVICE_REQUEST_FIELDS)
+    )
+    return {
+        'vehicle': vehicle,
+        'customer': customer,
+        'active_parking': parking,
+        'open_service_requests': service_requests,
+    }
+
+
+class GateCache:
+    """Bounded LRU of resolved gate records keyed by plate key"""
+
+    def __init__(self, resolver=resolve):
+        self.resolver = resolver
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, record)
+        self._by_vehicle = {}  # vehicle id -> key
+        self._by_customer = {}  # customer id -> {keys}
+        self._generation = 0
+        self.reset()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'GATE_CACHE_SIZE', 2048)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'GATE_CACHE_SECONDS', 30)
+
+    def lookup(self, plate):
+        """(record or None, True when served from the cache) for a plate as typed"""
+        key = plate_key(plate)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                registry.inc(HITS, ())
+                return entry[1], True
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            registry.inc(MISSES, ())
+            generation = self._generation
+
+        record = self.resolver(key)
+        with self._lock:
+            # An invalidation while resolving may have changed what was read
+            if generation == self._generation and self.max_size > 0:
+                self._store(key, record, now + self.ttl)
+        return record, False
+
+    def _store(self, key, record, expires_at):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, record)
+        if record is not None:
+            self._by_vehicle[record['vehicle']['id']] = key
+            self._by_customer.setdefault(record['customer']['id'], set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+            registry.inc(EVICTIONS, ())
+
+    def _remove(self, key):
+        _, record = self._entries.pop(key)
+        if record is None:
+            return
+        self._by_vehicle.pop(record['vehicle']['id'], None)
+        keys = self._by_customer.get(record['customer']['id'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_customer[record['customer']['id']]
+
+    def invalidate(self, plate_keys=(), vehicle_ids=(), customer_ids=()):
+        """Drop the entries of the given plate keys, vehicles and owners"""
+        with self._lock:
+            self._generation += 1
+            keys = set(plate_keys) | {self._by_vehicle.get(pk) for pk in vehicle_ids}
+            for pk in customer_ids:
+                keys |= self._by_customer.get(pk, set())
+            dropped = [key for key in keys if key in self._entries]
+            for key in dropped:
+                self._remove(key)
+            self.invalidations += len(dropped)
+            if dropped:
+                registry.inc(INVALIDATIONS, (), len(dropped))
+
+    def invalidate_rows(self, rows):
+        """Drop the entries a change to these model instances may affect, now and on commit"""
+        plate_keys, vehicle_ids, customer_ids = set(), set(), set()
+        for row in rows:
+            if isinstance(row, Customer):
+                customer_ids.add(row.pk)
+                continue
+            if isinstance(row, Vehicle):
+                plate_keys.add(row.plate_key or plate_key(row.plate_number))
+                vehicle_ids.add(row.pk)
+            elif isinstance(row, (ServiceRequest, Parking)):
+                vehicle_ids.add(row.vehicle_id)
+            customer_ids.add(row.customer_id)
+        args = (plate_keys, vehicle_ids, customer_ids)
+        self.invalidate(*args)
+        transaction.on_commit(lambda: self.invalidate(*args))
+
+    def reset(self):
+        """Drop every entry and zero the statistics"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_vehicle.clear()
+            self._by_customer.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+gate_cache = GateCache()
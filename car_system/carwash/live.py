@@ -0,0 +1,192 @@
+"""
+Live queue feed: pending service requests and active parking records
+
+Wash-bay screens subscribe once over server-sent events instead of polling.
+Each subscriber gets a snapshot of the queue, then deltas published by the
+save hooks in carwash.signals. A change is read and serialized once and the
+same payload is fanned out to every subscriber in this process.
+
+stream() serves the feed under WSGI, blocking its worker thread between
+events; AsyncStream serves it under ASGI, where a waiting subscriber holds
+no thread and publish() wakes it through its event loop.
+"""
+import asyncio
+import json
+import queue
+import threading
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Parking, ServiceRequest
+
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_BUFFER = 1000
+
+# model -> (feed kind, status that puts a row in the queue, related fields)
+QUEUES = {
+    ServiceRequest: ('service_request', 'pending', ('vehicle', 'customer', 'attendant', 'service_type')),
+    Parking: ('parking', 'active', ('vehicle', 'customer', 'attendant', 'bay')),
+}
+
+
+class Subscription:
+    def __init__(self):
+        self.events = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.overflowed = False
+        self._loop = self._wakeup = None
+
+    def watch(self):
+        """Wake the calling event loop's waiter (see wait()) whenever an event arrives"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # the loop closed with the client gone
+
+    async def wait(self, timeout):
+        """Wait up to timeout seconds for an event or an overflow; False on timeout"""
+        self._wakeup.clear()
+        # Checked after clear() so an event published in between is not missed
+        if self.overflowed or not self.events.empty():
+            return True
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class LiveFeed:
+    """In-process fan-out of queue events to every subscriber"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._sequence = 0
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        with self._lock:
+            self._sequence += 1
+            message = (self._sequence, event, data)
+            for subscription in list(self._subscribers):
+                try:
+                    subscription.events.put_nowait(message)
+                except queue.Full:
+                    # A stalled client is cut off and resyncs on reconnect
+                    subscription.overflowed = True
+                    self._subscribers.discard(subscription)
+                subscription.notify()
+        return message[0]
+
+
+live_feed = LiveFeed()
+
+
+def serialize_rows(model, rows):
+    from .serializers import ParkingSerializer, ServiceRequestSerializer
+    serializer_class = ServiceRequestSerializer if model is ServiceRequest else ParkingSerializer
+    return serializer_class(rows, many=True).data
+
+
+def snapshot():
+    """Current queue contents in the same shape as the pending/active endpoints"""
+    data = {}
+    for model, (kind, queued_status, related) in QUEUES.items():
+        rows = model.objects.select_related(*related).filter(status=queued_status)
+        data[kind] = serialize_rows(model, rows)
+    return data
+
+
+def publish_changes(model, pks):
+    """Read changed rows once and publish an upsert or remove delta for each"""
+    if model not in QUEUES or not pks or not live_feed.has_subscribers:
+        return
+    kind, queued_status, related = QUEUES[model]
+    rows = model.objects.select_related(*related).filter(pk__in=pks, status=queued_status)
+    queued = {item['id']: item for item in serialize_rows(model, rows)}
+    for pk in pks:
+        if pk in queued:
+            live_feed.publish('upsert', {'kind': kind, 'id': pk, 'data': queued[pk]})
+        else:
+            live_feed.publish('remove', {'kind': kind, 'id': pk})
+
+
+def format_event(event_id, event, data):
+    payload = json.dumps(data, cls=JSONEncoder)
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}event: {event}\ndata: {payload}\n\n'
+
+
+def stream(subscription):
+    """Yield server-sent events: a snapshot, then deltas until the client leaves"""
+    try:
+        yield format_event(None, 'snapshot', snapshot())
+        while True:
+            if subscription.overflowed:
+                yield format_event(None, 'resync', {})
+                return
+            try:
+                event_id, event, data = subscription.events.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event_id, event, data)
+    finally:
+        live_feed.unsubscribe(subscription)
+
+
+class AsyncStream:
+    """
+    stream() for ASGI: the same events, awaiting them instead of blocking
+
+    StreamingHttpResponse calls close() when the response ends, as it
+    closes a sync generator, so the subscriber is dropped straight away.
+    """
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        subscription = self.subscription
+        subscription.watch()
+        try:
+            yield format_event(None, 'snapshot', await sync_to_async(snapshot)())
+            while True:
+                if subscription.overflowed:
+                    yield format_event(None, 'resync', {})
+                    return
+                try:
+                    event_id, event, data = subscription.events.get_nowait()
+                except queue.Empty:
+                    if not await subscription.wait(KEEPALIVE_SECONDS):
+                        yield ': keepalive\n\n'
+                    continue
+                yield format_event(event_id, event, data)
+        finally:
+            self.close()
+
+    def close(self):
+        live_feed.unsubscribe(self.subscription)
@@ -0,0 +1,54 @@
+"""
+Move closed service requests, parking records and payments to the archive tables
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from carwash.archive import ARCHIVES, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Archive closed records older than the retention window, one batch per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int,
+            help='Keep records newer than this many days hot (default: ARCHIVE_RETENTION_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Stop after this many batches per table; the next run carries on'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Count the records that would be archived without moving them'
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_days'] is not None and options['retention_days'] < 0:
+            raise CommandError('--retention-days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        cutoff = retention_cutoff(options['retention_days'])
+        self.stdout.write(f'Archiving closed records from before {cutoff:%Y-%m-%d %H:%M}')
+
+        for model, archive in ARCHIVES.items():
+            name = model._meta.verbose_name_plural
+            if options['dry_run']:
+                self.stdout.write(f'{name}: {archive.eligible(cutoff).count()} to archive')
+                continue
+            rows = payments = carried = batches = 0
+            while options['max_batches'] is None or batches < options['max_batches']:
+                moved, moved_payments, moved_carried = archive.move_batch(cutoff, options['batch_size'])
+                if not moved:
+                    break
+                rows += moved
+                payments += moved_payments
+                carried += moved_carried
+                batches += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{name}: {rows} archived')
+            linked = f' with {payments} payments' if archive.payment_link else ''
+            if archive.carries is not None:
+                linked += f' and {carried} {archive.carries.model._meta.verbose_name_plural}'
+            self.stdout.write(self.style.SUCCESS(f'{name}: archived {rows}{linked}'))
@@ -0,0 +1,337 @@
+"""
+Generate a realistic synthetic dataset for load and capacity testing
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from carwash.models import (
+    Attendant, Customer, Parking, Payment, RevenueRollup, ServiceRequest, ServiceType, Vehicle
+)
+
+# Generated customers are recognised by this id_number prefix, so reruns
+# continue the numbering instead of colliding with earlier rows
+ID_PREFIX = 'GEN-'
+
+FIRST_NAMES = [
+    'Amani', 'Baraka', 'Neema', 'Juma', 'Rehema', 'Hamisi', 'Zawadi', 'Salim', 'Upendo', 'Faraji',
+    'Mwanaisha', 'Daudi', 'Imani', 'Khamis', 'Asha', 'Elia', 'Halima', 'Omari', 'Grace', 'Peter',
+]
+LAST_NAMES = [
+    'Mushi', 'Mwakyusa', 'Kimaro', 'Said', 'Massawe', 'Mollel', 'Nyerere', 'Shirima', 'Mbwana', 'Lema',
+    'Komba', 'Mrema', 'Swai', 'Kapinga', 'Ngowi', 'Urassa', 'Temba', 'Hassan', 'Mapunda', 'Minja',
+]
+AREAS = ['Kinondoni', 'Ilala', 'Temeke', 'Ubungo', 'Kigamboni', 'Mikocheni', 'Masaki', 'Sinza', 'Mbezi']
+MAKES = {
+    'Toyota': ['Corolla', 'RAV4', 'Land Cruiser', 'Hilux', 'IST', 'Premio', 'Noah'],
+    'Nissan': ['X-Trail', 'Note', 'Navara', 'March'],
+    'Honda': ['Fit', 'CR-V', 'Civic'],
+    'Mitsubishi': ['Pajero', 'Outlander', 'L200'],
+    'Subaru': ['Forester', 'Impreza', 'Outback'],
+    'Suzuki': ['Swift', 'Escudo', 'Carry'],
+}
+VEHICLE_TYPES = [('sedan', 30), ('suv', 28), ('hatchback', 18), ('pickup', 10), ('van', 7), ('truck', 5), ('other', 2)]
+COLORS = [('white', 35), ('silver', 20), ('black', 15), ('gray', 12), ('blue', 8), ('red', 6), ('other', 4)]
+PAYMENT_METHODS = [('mobile', 45), ('cash', 35), ('card', 12), ('bank_transfer', 5), ('cheque', 3)]
+# Arrivals by hour of day: quiet nights, a morning peak and a longer evening one
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 5, 9, 11, 10, 9, 9, 10, 9, 9, 10, 12, 13, 11, 8, 5, 3, 2, 1]
+DEFAULT_SERVICE_TYPES = [
+    ('Basic Wash', 'Exterior wash and dry', 10000, 20),
+    ('Full Wash', 'Exterior, interior vacuum and windows', 20000, 45),
+    ('Interior Detailing', 'Seats, carpets and dashboard', 30000, 60),
+    ('Engine Wash', 'Engine bay degreasing', 25000, 40),
+    ('Wax & Polish', 'Hand wax and machine polish', 35000, 75),
+]
+PARKING_RATE = Decimal('1000')  # TZS per started hour
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def plate_number(n):
+    """Tanzanian-style plate, unique for n below 17,576,000: `T 123 ABC`"""
+    digits, rest = n % 1000, n // 1000
+    letters = ''.join(LETTERS[(rest // 26 ** i) % 26] for i in (2, 1, 0))
+    return f'T {digits:03d} {letters}'
+
+
+def weighted(choices):
+    values, weights = zip(*choices)
+    return values, weights
+
+
+def insert(model, objs):
+    """
+    Plain bulk INSERT, skipping the counter and rollup upkeep of the model's manager
+
+    That upkeep issues one UPDATE per customer and vehicle per batch; the
+    command tallies the counters in memory and rebuilds the rollups instead.
+    """
+    return models.QuerySet(model).bulk_create(list(objs))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create() keep the historical auto_now/auto_now_add values it is given"""
+    patched = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                patched.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in patched:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    def __init__(self, rng, now, days, payment_rate):
+        self.rng = rng
+        self.now = now
+        self.start = now - timedelta(days=days)
+        self.days = days
+        self.payment_rate = payment_rate
+        self.vehicle_types = weighted(VEHICLE_TYPES)
+        self.colors = weighted(COLORS)
+        self.methods = weighted(PAYMENT_METHODS)
+
+    def pick(self, choices):
+        values, weights = choices
+        return self.rng.choices(values, weights)[0]
+
+    def times(self, count):
+        """`count` sorted arrival times spread over the window with daily peaks"""
+        rng = self.rng
+        hours = rng.choices(range(24), HOURLY_WEIGHTS, k=count)
+        stamps = []
+        for hour in hours:
+            day = timezone.localtime(self.start + timedelta(days=rng.randint(1, self.days)))
+            stamp = day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+            if stamp > self.now:
+                stamp -= timedelta(days=1)
+            stamps.append(stamp)
+        stamps.sort()
+        return stamps
+
+    def vehicle(self, vehicles):
+        # Skewed towards the first vehicles: regulars make most of the visits
+        return vehicles[int(len(vehicles) * self.rng.random() ** 2)]
+
+    def customers(self, first, count):
+        rng = self.rng
+        for n in range(first, first + count):
+            registered = self.start - timedelta(days=rng.randrange(0, 720))
+            yield Customer(
+                name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                phone=f'+2556{n:08d}',
+                email=f'customer{n}@example.com',
+                id_number=f'{ID_PREFIX}{n:08d}',
+                address=f'{rng.choice(AREAS)}, Dar es Salaam',
+                date_registered=registered.date(),
+                created_at=registered, updated_at=registered,
+            )
+
+    def vehicles(self, first, customers):
+        rng = self.rng
+        n = first
+        for customer in customers:
+            for _ in range(rng.choices((1, 2, 3), (70, 22, 8))[0]):
+                make = rng.choice(list(MAKES))
+                yield Vehicle(
+                    customer=customer, plate_number=plate_number(n),
+                    vehicle_type=self.pick(self.vehicle_types), color=self.pick(self.colors),
+                    make=make, model=rng.choice(MAKES[make]), year=rng.randint(2000, self.now.year),
+                    created_at=customer.created_at, updated_at=customer.created_at,
+                )
+                n += 1
+
+    def service_requests(self, count, vehicles, service_types, attendants):
+        rng = self.rng
+        for requested in self.times(count):
+            vehicle = self.vehicle(vehicles)
+            service_type = rng.choice(service_types)
+            start = completion = None
+            attendant = rng.choice(attendants)
+            if self.now - requested < timedelta(hours=2):
+                status = rng.choice(('pending', 'in_progress'))
+            else:
+                status = 'completed' if rng.random() < 0.93 else 'cancelled'
+            if status in ('in_progress', 'completed'):
+                start = min(requested + timedelta(minutes=rng.randint(0, 30)), self.now)
+            if status == 'completed':
+                completion = min(start + timedelta(
+                    minutes=max(service_type.estimated_time_minutes + rng.randint(-5, 15), 5)
+                ), self.now)
+            if status == 'pending' and rng.random() < 0.3:
+                attendant = None
+            yield ServiceRequest(
+                vehicle=vehicle, customer_id=vehicle.customer_id, attendant=attendant,
+                service_type=service_type, request_date=requested, start_time=start,
+                completion_time=completion, status=status,
+                created_at=requested, updated_at=completion or start or requested,
+            )
+
+    def parking(self, count, vehicles, attendants):
+        rng = self.rng
+        for check_in in self.times(count):
+            vehicle = self.vehicle(vehicles)
+            check_out = check_in + timedelta(minutes=rng.randint(20, 600))
+            completed = check_out <= self.now
+            hours = -(-int((check_out - check_in).total_seconds()) // 3600)
+            yield Parking(
+                vehicle=vehicle, customer_id=vehicle.customer_id, attendant=rng.choice(attendants),
+                check_in_time=check_in, check_out_time=check_out if completed else None,
+                status='completed' if completed else 'active',
+                parking_fee=PARKING_RATE * hours if completed else 0,
+                created_at=check_in, updated_at=check_out if completed else check_in,
+            )
+
+    def payment(self, customer_id, amount, paid, **link):
+        rng = self.rng
+        if rng.random() >= self.payment_rate:
+            return None
+        roll = rng.random()
+        status = 'completed' if roll < 0.96 else 'failed' if roll < 0.98 else 'refunded'
+        paid = min(paid + timedelta(minutes=rng.randint(0, 10)), self.now)
+        return Payment(
+            customer_id=customer_id, amount=amount, payment_method=self.pick(self.methods),
+            status=status, payment_date=paid, created_at=paid, updated_at=paid, **link,
+        )
+
+
+class Command(BaseCommand):
+    help = 'Generate customers, vehicles, service requests, parking records and payments with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--service-requests', type=int, default=10000)
+        parser.add_argument('--parking', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='History window the visits are spread over, ending now')
+        parser.add_argument('--payment-rate', type=float, default=0.95,
+                            help='Share of completed visits that get a payment')
+        parser.add_argument('--attendants', type=int, default=8,
+                            help='Attendants to create when there are no active ones')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='Random seed, for a reproducible dataset')
+
+    def handle(self, *args, **options):
+        for name in ('customers', 'batch_size', 'days'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+        if not 0 <= options['payment_rate'] <= 1:
+            raise CommandError('--payment-rate must be between 0 and 1')
+
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        generator = Generator(
+            random.Random(options['seed']), timezone.now(), options['days'], options['payment_rate']
+        )
+        batch_size = options['batch_size']
+        with explicit_timestamps(Customer, Vehicle, ServiceRequest, Parking, Payment):
+            service_types = self.service_types()
+            attendants = self.attendants(options['attendants'])
+            customers, vehicles = self.create_owners(generator, options['customers'], batch_size)
+            request_payments = self.create_visits(
+                ServiceRequest, options['service_requests'], batch_size,
+                lambda count: generator.service_requests(count, vehicles, service_types, attendants),
+                lambda visit: generator.payment(
+                    visit.customer_id, visit.service_type.base_price, visit.completion_time,
+                    service_request=visit,
+                ),
+            )
+            parking_payments = self.create_visits(
+                Parking, options['parking'], batch_size,
+                lambda count: generator.parking(count, vehicles, attendants),
+                lambda visit: generator.payment(
+                    visit.customer_id, visit.parking_fee, visit.check_out_time, parking=visit,
+                ),
+            )
+
+        with transaction.atomic():
+            for model, rows in ((Customer, customers), (Vehicle, vehicles)):
+                models.QuerySet(model).bulk_update(rows, model.counter_fields, batch_size=batch_size)
+        RevenueRollup.rebuild(start=timezone.localdate(generator.start))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['customers']} customers, {len(vehicles)} vehicles, "
+            f"{options['service_requests']} service requests, {options['parking']} parking records and "
+            f"{request_payments + parking_payments} payments in {time.monotonic() - started:.1f}s"
+        ))
+
+    def service_types(self):
+        service_types = list(ServiceType.objects.filter(is_active=True))
+        if not service_types:
+            service_types = [
+                ServiceType.objects.create(
+                    name=name, description=description,
+                    base_price=Decimal(price), estimated_time_minutes=minutes,
+                )
+                for name, description, price, minutes in DEFAULT_SERVICE_TYPES
+            ]
+        return service_types
+
+    def attendants(self, count):
+        attendants = list(Attendant.objects.filter(is_active=True))
+        if not attendants:
+            now = timezone.now()
+            attendants = Attendant.objects.bulk_create([
+                Attendant(
+                    name=f'Attendant {n}', phone=f'+2557{n:08d}', email=f'attendant{n}@example.com',
+                    id_number=f'{ID_PREFIX}ATT-{n:04d}', created_at=now, updated_at=now,
+                )
+                for n in range(1, max(count, 1) + 1)
+            ])
+        return attendants
+
+    def create_owners(self, generator, count, batch_size):
+        """Create customers and their vehicles; returns both lists"""
+        first = Customer.objects.filter(id_number__startswith=ID_PREFIX).count()
+        first_plate = Vehicle.objects.filter(customer__id_number__startswith=ID_PREFIX).count()
+        owners, vehicles = [], []
+        for offset in range(0, count, batch_size):
+            with transaction.atomic():
+                customers = insert(Customer, generator.customers(first + offset, min(batch_size, count - offset)))
+                created = insert(Vehicle, generator.vehicles(first_plate + len(vehicles), customers))
+            for vehicle in created:
+                vehicle.customer.vehicle_count += 1
+            owners.extend(customers)
+            vehicles.extend(created)
+            self.progress('customers', offset + len(customers), count)
+        return owners, vehicles
+
+    def create_visits(self, model, count, batch_size, rows, payment_for):
+        """Create `count` visits from rows(n) and payments for the completed ones; returns the payment count"""
+        payments = 0
+        for offset in range(0, count, batch_size):
+            with transaction.atomic():
+                visits = insert(model, rows(min(batch_size, count - offset)))
+                linked = [
+                    (visit, payment_for(visit) if visit.status == 'completed' else None)
+                    for visit in visits
+                ]
+                created = insert(Payment, [payment for _, payment in linked if payment is not None])
+            for visit, payment in linked:
+                self.tally(visit, payment)
+            payments += len(created)
+            self.progress(model._meta.verbose_name_plural.lower(), offset + len(visits), count)
+        return payments
+
+    def tally(self, visit, payment):
+        """Add a visit and its payment to the owners' counters (see carwash.counters)"""
+        when = visit.counter_key()[3]
+        spend = payment.amount if payment is not None and payment.status == 'completed' else 0
+        for owner in (visit.vehicle, visit.vehicle.customer):
+            owner.visit_count += 1
+            owner.last_visit = max(owner.last_visit, when) if owner.last_visit else when
+            owner.lifetime_spend += spend
+
+    def progress(self, label, done, total):
+        if self.verbosity > 1 or done == total:
+            self.stdout.write(f'  {label}: {done}/{total}')
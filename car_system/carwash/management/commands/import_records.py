@@ -0,0 +1,143 @@
+"""
+Stream customers or vehicles from CSV/NDJSON and upsert them in chunks
+"""
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from carwash.fields import search_key_fields
+from carwash.models import Customer
+from carwash.serializers import CustomerSerializer, VehicleSerializer
+
+# serializer, upsert key
+IMPORTERS = {
+    'customers': (CustomerSerializer, 'id_number'),
+    'vehicles': (VehicleSerializer, 'plate_number'),
+}
+
+
+def read_csv(stream):
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        # Empty cells mean "not provided", so nullable fields get NULL
+        yield line, {key: value for key, value in row.items() if key and value != ''}
+
+
+def read_ndjson(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as exc:
+            yield line, {'__error__': f'Invalid JSON: {exc}'}
+
+
+class Command(BaseCommand):
+    help = 'Stream customers or vehicles from CSV/NDJSON and upsert them in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rejects', help='Write rejected rows and their errors to this NDJSON file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        serializer_class, key = IMPORTERS[options['model']]
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        reader = read_csv(stream) if fmt == 'csv' else read_ndjson(stream)
+
+        started = time.monotonic()
+        read = upserted = rejected = 0
+        try:
+            while True:
+                chunk = list(islice(reader, options['chunk_size']))
+                if not chunk:
+                    break
+                read += len(chunk)
+                saved, failures = self.import_chunk(serializer_class, key, chunk, options['model'])
+                upserted += saved
+                rejected += len(failures)
+                for line, row, errors in failures:
+                    self.stderr.write(f'line {line}: {json.dumps(errors)}')
+                    if rejects:
+                        rejects.write(json.dumps({'line': line, 'row': row, 'errors': errors}) + '\n')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        elapsed = time.monotonic() - started
+        rate = read / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} rows in {elapsed:.2f}s ({rate:.0f} rows/s): '
+            f'{upserted} upserted, {rejected} rejected'
+        ))
+
+    def import_chunk(self, serializer_class, key, chunk, model_name):
+        """Validate and upsert one chunk; returns (saved count, failures)"""
+        failures = []
+        rows = []
+        for line, row in chunk:
+            if not isinstance(row, dict) or '__error__' in row:
+                error = row.get('__error__') if isinstance(row, dict) else 'Expected a JSON object'
+                failures.append((line, row, {'non_field_errors': [error]}))
+            else:
+                rows.append((line, row))
+
+        if model_name == 'vehicles':
+            rows, missing = self.resolve_customers(rows)
+            failures.extend(missing)
+
+        serializer = serializer_class(data=[row for _, row in rows], many=True)
+        valid, errors = serializer.validate_items(upsert_on=key)
+        for index, detail in errors.items():
+            line, row = rows[index]
+            failures.append((line, row, detail))
+
+        # Rows only overwrite the columns they supply: upsert each set of
+        # supplied columns separately so no row resets another's omissions
+        groups = {}
+        for _, attrs in valid:
+            groups.setdefault(frozenset(attrs) - {key}, []).append(attrs)
+        model = serializer_class.Meta.model
+        with transaction.atomic():
+            for columns, group in groups.items():
+                update_fields = sorted(columns)
+                update_fields += search_key_fields(model, update_fields)
+                update_fields.append('updated_at')
+                model.objects.bulk_create(
+                    [model(**attrs) for attrs in group], update_conflicts=True,
+                    unique_fields=[key], update_fields=update_fields,
+                )
+        return len(valid), failures
+
+    def resolve_customers(self, rows):
+        """Map `customer_id_number` columns to customer primary keys in one query"""
+        id_numbers = {row['customer_id_number'] for _, row in rows if 'customer_id_number' in row}
+        customers = dict(
+            Customer.objects.filter(id_number__in=id_numbers).values_list('id_number', 'pk')
+        )
+        resolved, missing = [], []
+        for line, row in rows:
+            if 'customer_id_number' in row:
+                id_number = row.pop('customer_id_number')
+                if id_number not in customers:
+                    missing.append((line, row, {'customer_id_number': [f'No customer with ID number {id_number}.']}))
+                    continue
+                row['customer'] = customers[id_number]
+            resolved.append((line, row))
+        return resolved, missing
@@ -0,0 +1,26 @@
+"""
+Backfill or rebuild the RevenueRollup table from Payment records
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from carwash.models import RevenueRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily revenue rollups from completed payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('start', 'end'):
+            value = options[name]
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise CommandError(f'--{name} must be a date in YYYY-MM-DD format')
+
+        count = RevenueRollup.rebuild(**dates)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} revenue rollup rows'))
@@ -0,0 +1,28 @@
+"""
+Recompute the maintained Customer, Vehicle and parking lot and queue counters and fix drift
+"""
+from django.core.management.base import BaseCommand
+
+from carwash.counters import reconcile, reconcile_lots
+from carwash.models import QueueCounter
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer/vehicle visit, spend and vehicle counters, lot occupancy and queue sizes from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted rows without fixing them'
+        )
+
+    def handle(self, *args, **options):
+        customers, vehicles = reconcile(dry_run=options['dry_run'])
+        lots, bays = reconcile_lots(dry_run=options['dry_run'])
+        queues = QueueCounter.rebuild(dry_run=options['dry_run'])
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} drift in {customers} customers and {vehicles} vehicles'
+        ))
+        self.stdout.write(self.style.SUCCESS(f'{verb} drift in {lots} parking lots and {bays} bays'))
+        self.stdout.write(self.style.SUCCESS(f'{verb} drift in {queues} queue counters'))
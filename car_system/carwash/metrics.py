@@ -0,0 +1,257 @@
+"""
+Prometheus metrics: request rate, errors and latency per view action, plus business gauges
+
+MetricsMiddleware counts every request by view class, action, method and
+status code and adds its duration to a latency histogram, all in process
+memory. With METRICS_DIR set, which multi-process servers (gunicorn,
+uvicorn --workers) need, each process also writes its totals to its own
+file in that directory at most every METRICS_FLUSH_SECONDS, and `/metrics`
+adds up the files of every process. Files of exited processes are kept, so
+the summed counters never go backwards when a worker is recycled.
+
+The gauges are read at scrape time from maintained counters in the
+database, so every worker reports the same values: the QueueCounter rows of
+pending service requests and active parking records, and the RevenueRollup
+of today.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from glob import glob
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import Parking, QueueCounter, RevenueRollup, ServiceRequest
+
+REQUESTS = 'carwash_http_requests_total'
+LATENCY = 'carwash_http_request_duration_seconds'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+DESCRIPTIONS = {
+    REQUESTS: ('counter', 'HTTP requests by view, action, method and status code'),
+    LATENCY: ('histogram', 'HTTP request duration in seconds by view, action and method'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Counters and histograms of this process, keyed by (name, label pairs)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.process_id = f'{self.pid}-{uuid.uuid4().hex[:8]}'
+        self.counters = defaultdict(float)
+        self.histograms = {}  # key -> [per-bucket counts, +Inf last], sum
+        self.flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's counts as its own
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._check_fork()
+            self.counters[(name, labels)] += amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self._check_fork()
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, buckets[:], total]
+                    for (name, labels), (buckets, total) in self.histograms.items()
+                ],
+            }
+
+    def path(self, directory):
+        return os.path.join(directory, f'metrics-{self.process_id}.json')
+
+    def flush(self, directory):
+        """Write this process's totals to its file, replacing it atomically"""
+        self.flushed_at = time.monotonic()
+        path = self.path(directory)
+        with open(f'{path}.tmp', 'w') as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(f'{path}.tmp', path)
+
+    def maybe_flush(self):
+        directory = getattr(settings, 'METRICS_DIR', '')
+        interval = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+        if directory and time.monotonic() - self.flushed_at >= interval:
+            self.flush(directory)
+
+
+registry = Registry()
+
+
+def collect():
+    """(counters, histograms) summed over every process reporting to METRICS_DIR"""
+    directory = getattr(settings, 'METRICS_DIR', '')
+    if directory:
+        registry.flush(directory)
+        snapshots = []
+        for path in glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+    else:
+        snapshots = [registry.snapshot()]
+
+    counters, histograms = defaultdict(float), {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, buckets, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                merged = histograms[key]
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+            else:
+                histograms[key] = [list(buckets), total]
+    return counters, histograms
+
+
+def view_labels(request):
+    """(('view', ...), ('action', ...), ('method', ...)) for a handled request"""
+    method = request.method if request.method in METHODS else 'other'
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return (('view', 'unmatched'), ('action', ''), ('method', method))
+    view = getattr(match.func, 'cls', None)
+    if view is None:
+        return (('view', match.view_name or match.func.__name__), ('action', ''), ('method', method))
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(method.lower()) or (actions.get('get', '') if method == 'HEAD' else '')
+    return (('view', view.__name__), ('action', action), ('method', method))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        labels = view_labels(request)
+        registry.inc(REQUESTS, labels + (('status', str(response.status_code)),))
+        registry.observe(LATENCY, labels, elapsed)
+        registry.maybe_flush()
+
+
+def business_gauges():
+    """[(name, type, help, [(labels, value)])] read from maintained counters"""
+    today = timezone.localdate()
+    revenue = list(
+        RevenueRollup.objects.filter(date=today)
+        .values_list('payment_method', 'total_amount', 'transaction_count')
+    )
+    queues = QueueCounter.sizes()
+    return [
+        ('carwash_pending_queue_depth', 'gauge',
+         'Pending service requests, assigned or not',
+         [((), queues.get(ServiceRequest.queue[0], 0))]),
+        ('carwash_parked_vehicles', 'gauge',
+         'Vehicles currently parked, in a parking lot or not',
+         [((), queues.get(Parking.queue[0], 0))]),
+        ('carwash_revenue_today', 'gauge',
+         'Completed payment amount today (TZS) by payment method',
+         [((('payment_method', method),), amount) for method, amount, _ in revenue]),
+        ('carwash_transactions_today', 'gauge',
+         'Completed payments today by payment method',
+         [((('payment_method', method),), count) for method, _, count in revenue]),
+    ]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def exposition(counters, histograms, gauges):
+    """Prometheus text format (version 0.0.4)"""
+    families = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        families[name].append(f'{name}{format_labels(labels)} {format_value(value)}')
+    for (name, labels), (buckets, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+            cumulative += count
+            families[name].append(
+                f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}'
+            )
+        families[name].append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+        families[name].append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    lines = []
+    for name in sorted(families):
+        kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines += families[name]
+    for name, kind, description, samples in gauges:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in samples]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, guarded by METRICS_TOKEN when it is set"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Unauthorized\n', status=401, content_type=CONTENT_TYPE)
+    counters, histograms = collect()
+    return HttpResponse(exposition(counters, histograms, business_gauges()), content_type=CONTENT_TYPE)
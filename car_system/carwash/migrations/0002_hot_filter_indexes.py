@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carwash', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(fields=['-check_in_time'], name='parking_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-check_in_time'], name='parking_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-payment_date'], name='payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-payment_date'], name='payment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['customer', 'status', '-payment_date'], name='payment_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['-request_date'], name='sr_request_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-request_date'], name='sr_pending_idx'),
+        ),
+    ]
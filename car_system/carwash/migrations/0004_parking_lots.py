@@ -0,0 +1,63 @@
+# Generated by Django 4.2.8 on 2026-10-18 09:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carwash', '0003_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkingLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('capacity', models.PositiveIntegerField()),
+                ('occupied', models.PositiveIntegerField(default=0, help_text='Maintained on check-in and check-out')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Parking Lots',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ParkingBay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20)),
+                ('is_occupied', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bays', to='carwash.parkinglot')),
+            ],
+            options={
+                'verbose_name_plural': 'Parking Bays',
+                'ordering': ['lot', 'code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='bay',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parking_records', to='carwash.parkingbay'),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='parking_records', to='carwash.parkinglot'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingbay',
+            index=models.Index(condition=models.Q(('is_occupied', False)), fields=['lot', 'code'], name='parking_bay_free_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkingbay',
+            constraint=models.UniqueConstraint(fields=('lot', 'code'), name='parking_bay_lot_code'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.8 on 2026-10-18 10:22
+
+import carwash.fields
+from django.db import migrations
+
+from carwash.fields import name_key, phone_key, plate_key
+
+# pg_trgm indexes for substring (typeahead) matching; other databases scan
+TRIGRAM_INDEXES = [
+    ('carwash_customer_name_key_trgm', 'carwash_customer', 'name_key'),
+    ('carwash_customer_phone_key_trgm', 'carwash_customer', 'phone_key'),
+    ('carwash_vehicle_plate_key_trgm', 'carwash_vehicle', 'plate_key'),
+]
+
+
+def backfill(model, sources, chunk_size=2000):
+    rows = model.objects.order_by('pk').values_list('pk', *sources)
+    batch = []
+    for pk, *values in rows.iterator(chunk_size=chunk_size):
+        obj = model(pk=pk)
+        for (key, normalize), value in zip(sources.values(), values):
+            setattr(obj, key, normalize(value))
+        batch.append(obj)
+        if len(batch) == chunk_size:
+            model.objects.bulk_update(batch, [key for key, _ in sources.values()])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, [key for key, _ in sources.values()])
+
+
+def fill_search_keys(apps, schema_editor):
+    backfill(apps.get_model('carwash', 'Customer'), {
+        'phone': ('phone_key', phone_key), 'name': ('name_key', name_key),
+    })
+    backfill(apps.get_model('carwash', 'Vehicle'), {'plate_number': ('plate_key', plate_key)})
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carwash', '0005_customer_vehicle_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_key',
+            field=carwash.fields.SearchKeyField(blank=True, db_index=True, default='', editable=False, kind='name', max_length=100, source='name'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_key',
+            field=carwash.fields.SearchKeyField(blank=True, db_index=True, default='', editable=False, kind='phone', max_length=20, source='phone'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_key',
+            field=carwash.fields.SearchKeyField(blank=True, db_index=True, default='', editable=False, kind='plate', max_length=20, source='plate_number'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
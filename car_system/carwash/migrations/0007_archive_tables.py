@@ -0,0 +1,94 @@
+# Generated by Django 4.2.8 on 2026-10-18 10:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carwash', '0006_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedParking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('check_in_time', models.DateTimeField()),
+                ('check_out_time', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed')], max_length=20)),
+                ('parking_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attendant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_parking_records', to='carwash.attendant')),
+                ('bay', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_parking_records', to='carwash.parkingbay')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_parking_records', to='carwash.customer')),
+                ('lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_parking_records', to='carwash.parkinglot')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_parking_records', to='carwash.vehicle')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Parking Records',
+                'ordering': ['-check_in_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedServiceRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('request_date', models.DateTimeField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('completion_time', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attendant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_service_requests', to='carwash.attendant')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_service_requests', to='carwash.customer')),
+                ('service_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_requests', to='carwash.servicetype')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_service_requests', to='carwash.vehicle')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Service Requests',
+                'ordering': ['-request_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('card', 'Card'), ('mobile', 'Mobile Money'), ('cheque', 'Cheque'), ('bank_transfer', 'Bank Transfer')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], max_length=20)),
+                ('transaction_ref', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('payment_date', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='carwash.customer')),
+                ('parking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment', to='carwash.archivedparking')),
+                ('service_request', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment', to='carwash.archivedservicerequest')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Payments',
+                'ordering': ['-payment_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedservicerequest',
+            index=models.Index(fields=['-request_date'], name='archived_sr_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpayment',
+            index=models.Index(fields=['-payment_date'], name='archived_payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedparking',
+            index=models.Index(fields=['-check_in_time'], name='archived_parking_check_in_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+QUEUES = [
+    ('pending_service_requests', 'ServiceRequest', 'pending'),
+    ('active_parking', 'Parking', 'active'),
+]
+
+
+def count_queues(apps, schema_editor):
+    QueueCounter = apps.get_model('carwash', 'QueueCounter')
+    QueueCounter.objects.bulk_create([
+        QueueCounter(name=name, size=apps.get_model('carwash', model).objects.filter(status=status).count())
+        for name, model, status in QUEUES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carwash', '0007_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('size', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Queue Counters',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(count_queues, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,98 @@
 """
 Models for Smart Car Wash & Parking System
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .fields import SearchKeyField
+
+
+class CountedQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Bulk insert and apply the rows' Customer/Vehicle counter and queue changes in one transaction"""
+        from .counters import CounterDeltas, reconcile
+        from .gate import gate_cache
+        with transaction.atomic(using=self.db):
+            if kwargs.get('update_conflicts'):
+                # Upserts can't tell inserts from updates: recount the owners involved
+                objs = list(objs)
+                unique_fields = kwargs.get('unique_fields') or ()
+                owners = {obj.customer_id for obj in objs}
+                for field in unique_fields:
+                    owners.update(self.filter(
+                        **{f'{field}__in': [getattr(obj, field) for obj in objs]}
+                    ).values_list('customer_id', flat=True))
+                objs = super().bulk_create(objs, *args, **kwargs)
+                reconcile(customer_ids=owners)
+                if self.model.queue:
+                    QueueCounter.rebuild([self.model])
+                    for obj in objs:
+                        obj._queued = obj.in_queue()
+                gate_cache.invalidate_rows(objs)
+                return objs
+            objs = super().bulk_create(objs, *args, **kwargs)
+            deltas = CounterDeltas()
+            for obj in objs:
+                obj._counted = obj.counter_key()
+                deltas.record(obj._counted)
+                obj._queued = obj.in_queue()
+            deltas.apply()
+            if self.model.queue:
+                QueueCounter.add(self.model.queue[0], sum(obj._queued for obj in objs))
+            gate_cache.invalidate_rows(objs)
+        return objs
+
+
+class KeepsCountersMixin:
+    """Counter columns are written only by carwash.counters, never by a full save()"""
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CountedModel(models.Model):
+    """
+    Row that feeds the Customer/Vehicle counters (see carwash.counters)
+
+    counter_key() describes the row's contribution; the save and delete
+    hooks apply the difference from the contribution last counted. Models
+    with a queue also keep the QueueCounter of rows in that status.
+    """
+    # Fields read by from_db(); querysets that defer columns keep these loaded
+    tracked_fields = ()
+    # (QueueCounter name, status) when rows in that status are counted
+    queue = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted = instance.counter_key()
+        instance._queued = instance.in_queue()
+        return instance
+
+    def counter_key(self):
+        raise NotImplementedError
+
+    def in_queue(self):
+        return self.queue is not None and self.__dict__.get('status') == self.queue[1]
+
+    def save(self, *args, **kwargs):
+        """Save and update the counters within the same transaction"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Attendant(models.Model):
     """Employee/Attendant who receives and processes vehicles"""
@@ -25,7 +113,7 @@ class Attendant(models.Model):
         return f"{self.name} ({self.id_number})"
 
 
-class Customer(models.Model):
+class Customer(KeepsCountersMixin, models.Model):
     """Customer/Vehicle Owner"""
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=20, unique=True)
@@ -34,9 +122,19 @@ class Customer(models.Model):
     address = models.TextField()
     date_registered = models.DateField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Maintained counters (carwash.counters)
+    vehicle_count = models.IntegerField(default=0)
+    visit_count = models.IntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
+    # Normalized search keys (carwash.fields)
+    phone_key = SearchKeyField(max_length=20, source='phone', kind='phone')
+    name_key = SearchKeyField(max_length=100, source='name', kind='name')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    counter_fields = ('vehicle_count', 'visit_count', 'lifetime_spend', 'last_visit')
+
     class Meta:
         ordering = ['name']
         verbose_name_plural = "Customers"
@@ -45,7 +143,7 @@ class Customer(models.Model):
         return f"{self.name} ({self.phone})"
 
 
-class Vehicle(models.Model):
+class Vehicle(KeepsCountersMixin, CountedModel):
     """Vehicle Information"""
     VEHICLE_TYPES = [
         ('sedan', 'Sedan'),
@@ -69,6 +167,7 @@ class Vehicle(models.Model):
 
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='vehicles')
     plate_number = models.CharField(max_length=20, unique=True)
+    plate_key = SearchKeyField(max_length=20, source='plate_number', kind='plate')
     vehicle_type = models.CharField(max_length=20, choices=VEHICLE_TYPES)
     color = models.CharField(max_length=20, choices=COLORS)
     make = models.CharField(max_length=50)
@@ -76,9 +175,17 @@ class Vehicle(models.Model):
     year = models.IntegerField()
     vin = models.CharField(max_length=100, unique=True, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Maintained counters (carwash.counters)
+    visit_count = models.IntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+    counter_fields = ('visit_count', 'lifetime_spend', 'last_visit')
+    tracked_fields = ('customer',)
+
     class Meta:
         ordering = ['plate_number']
         verbose_name_plural = "Vehicles"
@@ -86,6 +193,9 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.plate_number} - {self.make} {self.model} ({self.year})"
 
+    def counter_key(self):
+        return ('vehicle', self.customer_id)
+
 
 class ServiceType(models.Model):
     """Available Car Wash Services"""
@@ -105,7 +215,7 @@ class ServiceType(models.Model):
         return f"{self.name} (TZS {self.base_price})"
 
 
-class ServiceRequest(models.Model):
+class ServiceRequest(CountedModel):
     """Service Request for a Vehicle"""
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -126,15 +236,141 @@ class ServiceRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+    tracked_fields = ('customer', 'vehicle', 'request_date', 'status')
+    queue = ('pending_service_requests', 'pending')
+
     class Meta:
         ordering = ['-request_date']
         verbose_name_plural = "Service Requests"
+        indexes = [
+            models.Index(fields=['-request_date'], name='sr_request_date_idx'),
+            models.Index(fields=['customer', '-request_date'], name='sr_customer_date_idx'),
+            models.Index(
+                fields=['-request_date'], name='sr_pending_idx',
+                condition=models.Q(status='pending')
+            ),
+        ]
 
     def __str__(self):
         return f"{self.vehicle.plate_number} - {self.service_type.name} ({self.status})"
 
+    def counter_key(self):
+        return ('visit', self.customer_id, self.vehicle_id, self.request_date)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save hooks tell status transitions apart from other edits
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+
+class ParkingLot(models.Model):
+    """Parking Lot with a fixed number of spaces"""
+    name = models.CharField(max_length=100, unique=True)
+    capacity = models.PositiveIntegerField()
+    occupied = models.PositiveIntegerField(default=0, help_text="Maintained on check-in and check-out")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Full(Exception):
+        """Raised when a lot has no free space left"""
 
-class Parking(models.Model):
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = "Parking Lots"
+
+    def __str__(self):
+        return f"{self.name} ({self.occupied}/{self.capacity})"
+
+    @property
+    def available(self):
+        return max(self.capacity - self.occupied, 0)
+
+    def allocate(self, count=1):
+        """
+        Reserve `count` spaces and return the free bays assigned to them.
+
+        The counter is bumped with a single guarded UPDATE, so concurrent
+        check-ins can never overfill the lot. Raises ParkingLot.Full.
+        """
+        with transaction.atomic():
+            reserved = ParkingLot.objects.filter(
+                pk=self.pk, occupied__lte=F('capacity') - count
+            ).update(occupied=F('occupied') + count, updated_at=timezone.now())
+            if not reserved:
+                raise ParkingLot.Full(f"{self.name} is full")
+            bays = list(
+                self.bays.select_for_update(skip_locked=True)
+                .filter(is_occupied=False).order_by('code')[:count]
+            )
+            if bays:
+                ParkingBay.objects.filter(pk__in=[bay.pk for bay in bays]).update(
+                    is_occupied=True, updated_at=timezone.now()
+                )
+        return bays
+
+    def allocate_available(self, count):
+        """
+        Reserve up to `count` spaces, as many as are free.
+
+        Returns (spaces reserved, bays assigned to them).
+        """
+        while count > 0:
+            capacity, occupied = ParkingLot.objects.values_list('capacity', 'occupied').get(pk=self.pk)
+            count = min(count, capacity - occupied)
+            if count <= 0:
+                break
+            try:
+                return count, self.allocate(count)
+            except ParkingLot.Full:
+                continue  # Another check-in took spaces in between
+        return 0, []
+
+    @staticmethod
+    def release(lot_id, bay_id=None):
+        """
+        Free one space (and its bay) held by a parking record.
+
+        Called by the Parking save and delete hooks in carwash.signals
+        whenever an active record is checked out, closed or removed.
+        """
+        with transaction.atomic():
+            ParkingLot.objects.filter(pk=lot_id, occupied__gt=0).update(
+                occupied=F('occupied') - 1, updated_at=timezone.now()
+            )
+            if bay_id:
+                ParkingBay.objects.filter(pk=bay_id).update(is_occupied=False, updated_at=timezone.now())
+
+
+class ParkingBay(models.Model):
+    """Numbered space within a Parking Lot"""
+    lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='bays')
+    code = models.CharField(max_length=20)
+    is_occupied = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['lot', 'code']
+        verbose_name_plural = "Parking Bays"
+        constraints = [
+            models.UniqueConstraint(fields=['lot', 'code'], name='parking_bay_lot_code'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['lot', 'code'], name='parking_bay_free_idx',
+                condition=models.Q(is_occupied=False)
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.lot.name} - {self.code}"
+
+
+class Parking(CountedModel):
     """Parking Records"""
     STATUS_CHOICES = [
         ('active', 'Active'),
@@ -148,19 +384,68 @@ class Parking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     parking_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     attendant = models.ForeignKey(Attendant, on_delete=models.SET_NULL, null=True, related_name='parking_records')
+    lot = models.ForeignKey(ParkingLot, on_delete=models.PROTECT, null=True, blank=True, related_name='parking_records')
+    bay = models.ForeignKey(ParkingBay, on_delete=models.SET_NULL, null=True, blank=True, related_name='parking_records')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CountedQuerySet.as_manager()
+    tracked_fields = ('customer', 'vehicle', 'check_in_time', 'status', 'lot', 'bay')
+    queue = ('active_parking', 'active')
+
     class Meta:
         ordering = ['-check_in_time']
         verbose_name_plural = "Parking Records"
+        indexes = [
+            models.Index(fields=['-check_in_time'], name='parking_check_in_idx'),
+            models.Index(fields=['customer', '-check_in_time'], name='parking_customer_check_in_idx'),
+            models.Index(
+                fields=['-check_in_time'], name='parking_active_idx',
+                condition=models.Q(status='active')
+            ),
+        ]
 
     def __str__(self):
         return f"{self.vehicle.plate_number} - Parked at {self.check_in_time}"
 
-
-class Payment(models.Model):
+    def counter_key(self):
+        return ('visit', self.customer_id, self.vehicle_id, self.check_in_time)
+
+    def space_key(self):
+        """(lot id, bay id) of the space an active record holds, or None"""
+        values = self.__dict__
+        if values.get('status') != 'active' or not values.get('lot_id'):
+            return None
+        return values['lot_id'], values.get('bay_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save hooks tell status transitions apart from other edits
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._held_space = instance.space_key()
+        return instance
+
+
+class PaymentQuerySet(CountedQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Bulk insert and add completed payments to RevenueRollup in one transaction"""
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            buckets = {}
+            for payment in objs:
+                payment._counted_revenue = payment.revenue_key()
+                if payment._counted_revenue:
+                    day, method, amount = payment._counted_revenue
+                    total, count = buckets.get((day, method), (0, 0))
+                    buckets[(day, method)] = (total + amount, count + 1)
+            for (day, method), (total, count) in buckets.items():
+                RevenueRollup.add(day, method, total, count)
+        return objs
+
+
+class Payment(CountedModel):
     """Payment Records"""
     PAYMENT_METHODS = [
         ('cash', 'Cash'),
@@ -189,9 +474,254 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PaymentQuerySet.as_manager()
+    tracked_fields = (
+        'customer', 'service_request', 'parking', 'amount', 'payment_method', 'status', 'payment_date'
+    )
+
     class Meta:
         ordering = ['-payment_date']
         verbose_name_plural = "Payments"
+        indexes = [
+            models.Index(fields=['-payment_date'], name='payment_date_idx'),
+            models.Index(fields=['status', '-payment_date'], name='payment_status_date_idx'),
+            models.Index(
+                fields=['customer', 'status', '-payment_date'],
+                name='payment_customer_status_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Payment of TZS {self.amount} - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted_revenue = instance.revenue_key()
+        return instance
+
+    def revenue_key(self):
+        """(day, method, amount) this payment contributes to revenue, or None"""
+        if self.status != 'completed' or self.payment_date is None:
+            return None
+        return (timezone.localdate(self.payment_date), self.payment_method, self.amount)
+
+    def counter_key(self):
+        if self.status != 'completed':
+            return None
+        return ('spend', self.customer_id, self.service_request_id, self.parking_id, self.amount)
+
+    def sync_revenue_rollup(self):
+        """Move this payment's contribution in RevenueRollup to its current state"""
+        previous = getattr(self, '_counted_revenue', None)
+        current = self.revenue_key()
+        if previous != current:
+            if previous:
+                RevenueRollup.remove(*previous)
+            if current:
+                RevenueRollup.add(*current)
+        self._counted_revenue = current
+
+    def withdraw_revenue(self):
+        """Take a deleted payment's contribution out of RevenueRollup"""
+        previous = getattr(self, '_counted_revenue', None)
+        if previous:
+            RevenueRollup.remove(*previous)
+        self._counted_revenue = None
+
+
+class RevenueRollup(models.Model):
+    """Completed payment totals per day and payment method"""
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHODS)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'payment_method']
+        verbose_name_plural = "Revenue Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method'], name='revenue_rollup_day_method'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method}: TZS {self.total_amount}"
+
+    @classmethod
+    def add(cls, date, payment_method, amount, count=1):
+        """Add `count` payments totalling `amount` to the day's bucket"""
+        rollup, _ = cls.objects.get_or_create(date=date, payment_method=payment_method)
+        cls.objects.filter(pk=rollup.pk).update(
+            total_amount=F('total_amount') + amount,
+            transaction_count=F('transaction_count') + count,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def remove(cls, date, payment_method, amount, count=1):
+        cls.add(date, payment_method, -amount, -count)
+
+    @classmethod
+    def rebuild(cls, start=None, end=None):
+        """Recompute rollups from Payment and ArchivedPayment for an optional inclusive date range"""
+        rollups = cls.objects.all()
+        if start:
+            rollups = rollups.filter(date__gte=start)
+        if end:
+            rollups = rollups.filter(date__lte=end)
+
+        totals = {}
+        for model in (Payment, ArchivedPayment):
+            payments = model.objects.filter(status='completed')
+            if start:
+                payments = payments.filter(payment_date__date__gte=start)
+            if end:
+                payments = payments.filter(payment_date__date__lte=end)
+            rows = (
+                payments.order_by()
+                .annotate(day=TruncDate('payment_date'))
+                .values_list('day', 'payment_method')
+                .annotate(total=Sum('amount'), count=Count('id'))
+            )
+            for day, method, total, count in rows:
+                amount, transactions = totals.get((day, method), (0, 0))
+                totals[(day, method)] = (amount + total, transactions + count)
+        with transaction.atomic():
+            rollups.delete()
+            created = cls.objects.bulk_create([
+                cls(
+                    date=day, payment_method=method,
+                    total_amount=amount, transaction_count=count,
+                )
+                for (day, method), (amount, count) in totals.items()
+            ])
+        return len(created)
+
+
+class QueueCounter(models.Model):
+    """Number of rows in a queue: pending service requests, active parking records"""
+    name = models.CharField(max_length=50, primary_key=True)
+    size = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = "Queue Counters"
+
+    def __str__(self):
+        return f"{self.name}: {self.size}"
+
+    @classmethod
+    def add(cls, name, count=1):
+        if count:
+            counter, _ = cls.objects.get_or_create(name=name)
+            cls.objects.filter(pk=counter.pk).update(size=F('size') + count, updated_at=timezone.now())
+
+    @classmethod
+    def remove(cls, name, count=1):
+        cls.add(name, -count)
+
+    @classmethod
+    def sizes(cls):
+        return dict(cls.objects.values_list('name', 'size'))
+
+    @classmethod
+    def rebuild(cls, models=(ServiceRequest, Parking), dry_run=False):
+        """Recount the queues of models from their rows; returns the number that drifted"""
+        drifted = 0
+        with transaction.atomic():
+            for model in models:
+                name, status = model.queue
+                stored = cls.objects.select_for_update().filter(name=name).values_list('size', flat=True).first()
+                size = model.objects.filter(status=status).count()
+                if stored != size:
+                    drifted += 1
+                    if not dry_run:
+                        cls.objects.update_or_create(name=name, defaults={'size': size})
+        return drifted
+
+
+# Archive tables (carwash.archive): closed rows moved out of the hot tables by
+# `manage.py archive_records`, keeping their ids, timestamps and counters' worth.
+
+class ArchivedServiceRequest(models.Model):
+    """Completed or cancelled service request moved out of ServiceRequest"""
+    id = models.BigIntegerField(primary_key=True)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='archived_service_requests')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_service_requests')
+    attendant = models.ForeignKey(Attendant, on_delete=models.SET_NULL, null=True, related_name='archived_service_requests')
+    service_type = models.ForeignKey(ServiceType, on_delete=models.PROTECT, related_name='archived_requests')
+    request_date = models.DateTimeField()
+    start_time = models.DateTimeField(null=True, blank=True)
+    completion_time = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=ServiceRequest.STATUS_CHOICES)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-request_date']
+        verbose_name_plural = "Archived Service Requests"
+        indexes = [
+            models.Index(fields=['-request_date'], name='archived_sr_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle.plate_number} - {self.service_type.name} ({self.status})"
+
+
+class ArchivedParking(models.Model):
+    """Completed parking record moved out of Parking"""
+    id = models.BigIntegerField(primary_key=True)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='archived_parking_records')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_parking_records')
+    check_in_time = models.DateTimeField()
+    check_out_time = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Parking.STATUS_CHOICES)
+    parking_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    attendant = models.ForeignKey(Attendant, on_delete=models.SET_NULL, null=True, related_name='archived_parking_records')
+    lot = models.ForeignKey(ParkingLot, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_parking_records')
+    bay = models.ForeignKey(ParkingBay, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_parking_records')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-check_in_time']
+        verbose_name_plural = "Archived Parking Records"
+        indexes = [
+            models.Index(fields=['-check_in_time'], name='archived_parking_check_in_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle.plate_number} - Parked at {self.check_in_time}"
+
+
+class ArchivedPayment(models.Model):
+    """Settled payment moved out of Payment, with its service request or parking record"""
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_payments')
+    service_request = models.OneToOneField(ArchivedServiceRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment')
+    parking = models.OneToOneField(ArchivedParking, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHODS)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    transaction_ref = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    payment_date = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-payment_date']
+        verbose_name_plural = "Archived Payments"
+        indexes = [
+            models.Index(fields=['-payment_date'], name='archived_payment_date_idx'),
+        ]
 
     def __str__(self):
         return f"Payment of TZS {self.amount} - {self.status}"
@@ -0,0 +1,76 @@
+"""
+Pagination classes for Smart Car Wash System API
+"""
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ModelCursorPagination(CursorPagination):
+    """Keyset pagination on a model's default ordering with `id` as tie-breaker"""
+
+    def __init__(self, model):
+        ordering = list(model._meta.ordering)
+        descending = bool(ordering) and ordering[0].startswith('-')
+        ordering.append('-id' if descending else 'id')
+        self.ordering = tuple(ordering)
+
+    def get_ordering(self, request, queryset, view):
+        # Keysets must follow the indexed default ordering, so `?ordering=`
+        # from OrderingFilter does not apply in cursor mode.
+        return self.ordering
+
+
+class CursorOrPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, cursor pagination on request.
+
+    Clients opt in per request with `?pagination=cursor`; follow-up pages
+    carry a `?cursor=` token. Cursor pages skip the COUNT(*) and OFFSET scan,
+    so fetching any page costs the same regardless of table size.
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = ModelCursorPagination(queryset.model)
+            self.cursor_paginator.cursor_query_param = self.cursor_query_param
+            self.cursor_paginator.page_size = self.page_size
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to "cursor" for cursor-based pagination.',
+            'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+        })
+        parameters.append({
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'The pagination cursor value.',
+            'schema': {'type': 'string'},
+        })
+        return parameters
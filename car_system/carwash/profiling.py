@@ -0,0 +1,99 @@
+"""
+Per-request profiling primitives
+
+While a request is being profiled (see config.profiling.ProfilingMiddleware)
+a Profile collects every database query with its duration, through a
+wrapper installed on each connection, and the time spent in named phases:
+`serialize` (serializers and row plans) and `render` (JSON encoding).
+Outside a profiled request each hook costs one ContextVar lookup.
+"""
+import contextvars
+import time
+from collections import defaultdict
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = contextvars.ContextVar('carwash_profile', default=None)
+
+
+class Profile:
+    """Query timings and phase durations of one request"""
+
+    def __init__(self):
+        self.queries = []  # (sql, seconds)
+        self.phases = defaultdict(float)
+
+    @property
+    def db_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def top_queries(self, limit=5):
+        """Slowest statements by total time: [{'sql', 'count', 'ms'}]"""
+        totals = {}
+        for sql, seconds in self.queries:
+            count, total = totals.get(sql, (0, 0.0))
+            totals[sql] = (count + 1, total + seconds)
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'ms': round(total * 1000, 2)}
+            for sql, (count, total) in ranked[:limit]
+        ]
+
+
+def current_profile():
+    return _current.get()
+
+
+def start_profile():
+    """Profile the rest of this context; returns (profile, token for stop_profile)"""
+    profile = Profile()
+    return profile, _current.set(profile)
+
+
+def stop_profile(token):
+    _current.reset(token)
+
+
+class phase:
+    """Context manager adding its duration to the current profile's named phase"""
+    __slots__ = ('name', 'profile', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.profile = _current.get()
+        if self.profile is not None:
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.phases[self.name] += time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, time.perf_counter() - started))
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_queries():
+    """
+    Time queries on connections opened from now on and on this thread's open ones
+
+    Called once from CarwashConfig.ready().
+    """
+    connection_created.connect(install_query_recorder, dispatch_uid='carwash.profiling')
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection=connection)
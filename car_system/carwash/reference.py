@@ -0,0 +1,146 @@
+"""
+Cached reference data: the service catalog and the attendant directory
+
+Both tables are small, read on almost every request and rarely change, so
+each process keeps a full copy in memory. Saves and deletes invalidate the
+copy through signals (see carwash.signals). When REFERENCE_CACHE_ALIAS names
+a Django cache, the version stamp and the loaded rows are shared through it,
+so an invalidation in one worker process reaches the others within
+REFERENCE_CACHE_CHECK_SECONDS. Without it, each process compares the table's
+MAX(updated_at) and row count with its copy at that interval instead, which
+also catches writes made by other processes or without signals.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+from .models import Attendant, ServiceType
+
+
+class ReferenceCache:
+    """Process-local, versioned copy of every row of a small model"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self._lock = threading.Lock()
+        self._rows = None
+        self._by_pk = None
+        self._fingerprint = None
+        self._state = None
+        self._version = 0
+        self._checked_at = 0
+
+    @property
+    def version_key(self):
+        return f'carwash:reference:{self.name}:version'
+
+    @property
+    def rows_key(self):
+        return f'carwash:reference:{self.name}:rows'
+
+    def shared_cache(self):
+        alias = getattr(settings, 'REFERENCE_CACHE_ALIAS', '')
+        return caches[alias] if alias else None
+
+    def shared_version(self, shared):
+        version = shared.get(self.version_key)
+        if version is None:
+            shared.add(self.version_key, 1, timeout=None)
+            version = shared.get(self.version_key, 1)
+        return version
+
+    def table_state(self):
+        """(MAX(updated_at), row count) of the table; changes with any insert, update or delete"""
+        state = self.model.objects.order_by().aggregate(last=Max('updated_at'), count=Count('pk'))
+        return state['last'], state['count']
+
+    def _ensure_loaded(self):
+        shared = self.shared_cache()
+        if self._rows is not None:
+            interval = getattr(settings, 'REFERENCE_CACHE_CHECK_SECONDS', 5)
+            if time.monotonic() - self._checked_at < interval:
+                return
+        with self._lock:
+            version = self._version
+            if shared is not None:
+                version = self.shared_version(shared)
+                self._checked_at = time.monotonic()
+                if self._rows is not None and version == self._version:
+                    return
+            elif self._rows is not None:
+                self._checked_at = time.monotonic()
+                if self.table_state() == self._state:
+                    return
+                self._version += 1
+                version = self._version
+
+            rows = None
+            if shared is not None:
+                cached = shared.get(self.rows_key)
+                if cached and cached[0] == version:
+                    rows = cached[1]
+            if rows is None:
+                rows = list(self.model.objects.all())
+                if shared is not None:
+                    shared.set(self.rows_key, (version, rows), timeout=None)
+
+            state = '|'.join(f'{row.pk}:{row.updated_at.isoformat()}' for row in rows)
+            self._fingerprint = hashlib.sha1(state.encode()).hexdigest()
+            self._by_pk = {row.pk: row for row in rows}
+            self._state = (max((row.updated_at for row in rows), default=None), len(rows))
+            self._rows = rows
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    @property
+    def version(self):
+        """Version stamp of the loaded data; changes whenever it is invalidated"""
+        self._ensure_loaded()
+        return self._version
+
+    @property
+    def fingerprint(self):
+        """Digest of every row's pk and updated_at; equal across processes for equal data"""
+        self._ensure_loaded()
+        return self._fingerprint
+
+    def all(self):
+        self._ensure_loaded()
+        return self._rows
+
+    def active(self):
+        return [row for row in self.all() if row.is_active]
+
+    def by_pk(self):
+        self._ensure_loaded()
+        return self._by_pk
+
+    def get(self, pk):
+        return self.by_pk().get(pk)
+
+    def invalidate(self):
+        """Drop the local copy and bump the shared version stamp"""
+        shared = self.shared_cache()
+        with self._lock:
+            self._rows = None
+            self._by_pk = None
+            self._version += 1
+            if shared is not None:
+                try:
+                    shared.incr(self.version_key)
+                except ValueError:
+                    shared.set(self.version_key, self._version, timeout=None)
+
+
+service_catalog = ReferenceCache('service_types', ServiceType)
+attendant_directory = ReferenceCache('attendants', Attendant)
+
+REFERENCE_CACHES = {
+    ServiceType: service_catalog,
+    Attendant: attendant_directory,
+}
@@ -0,0 +1,48 @@
+"""
+JSON renderer backed by orjson
+
+FastJSONRenderer answers the same `application/json` negotiation as DRF's
+JSONRenderer and produces the same bytes: compact separators, UTF-8 output,
+U+2028/U+2029 escaped, and dates, times, decimals and other non-native
+values encoded by DRF's encoder. Indented output (`Accept:
+application/json; indent=4`), non-default JSON settings, data orjson rejects
+(non-string keys, integers beyond 64 bits) and installs without orjson all
+fall back to JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .profiling import phase
+
+try:
+    import orjson
+except ImportError:  # optional, see requirements.txt
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in JSONRenderer that encodes with orjson when it can"""
+
+    def uses_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.encoder_class is JSONEncoder
+            and self.compact and self.strict and not self.ensure_ascii
+            and not self.get_indent(accepted_media_type, renderer_context)
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('render'):
+            return self.encode(data, accepted_media_type, renderer_context or {})
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if data is None or not self.uses_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Match JSONRenderer, which escapes these for JavaScript consumers
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
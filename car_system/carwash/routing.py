@@ -0,0 +1,97 @@
+"""
+Read-replica routing for reporting endpoints
+
+Writes and ordinary reads always use `default`. View actions decorated with
+@replica_read (revenue, parking stats, summaries) read from the `replica`
+alias when one is configured, so reporting does not compete with check-ins
+on the primary.
+
+Read-your-writes: a client that made a successful write within the last
+REPLICA_STICKY_SECONDS carries a cookie (set by ReplicaStickinessMiddleware)
+and keeps reading from the primary, and a replica action that writes
+switches its own later reads to the primary.
+"""
+import contextlib
+import contextvars
+import functools
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+REPLICA_ALIAS = 'replica'
+STICKY_COOKIE = 'carwash_primary_until'
+
+_replica_reads = contextvars.ContextVar('carwash_replica_reads', default=False)
+_wrote = contextvars.ContextVar('carwash_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def pinned_to_primary(request):
+    """True while the client is within its read-your-writes window"""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    """Send reads inside @replica_read actions to the replica, everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _wrote.get() and replica_configured():
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+@contextlib.contextmanager
+def replica_reads(request):
+    """Route reads in this block to the replica unless the client is pinned"""
+    replica_token = _replica_reads.set(not pinned_to_primary(request))
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _replica_reads.reset(replica_token)
+
+
+def replica_read(view_method):
+    """Mark a read-only view action as safe to serve from the replica"""
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        with replica_reads(request):
+            return view_method(view, request, *args, **kwargs)
+    wrapper.replica_read = True
+    return wrapper
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """Pin a client to the primary for a few seconds after a successful write"""
+
+    def process_response(self, request, response):
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+                and response.status_code < 400
+                and replica_configured()):
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
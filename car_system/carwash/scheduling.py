@@ -0,0 +1,203 @@
+"""
+Bay scheduling: attendant assignment and predicted wait times
+
+The scheduler keeps each active attendant's work in memory: in-progress
+services with their expected end time, and pending services in arrival
+order held in a Fenwick tree of estimated minutes, so the wait ahead of any
+pending request is a prefix sum. A lazy min-heap keyed by queued minutes
+finds the least-loaded attendant. Every update and query is O(log n).
+
+State is seeded from the database on first use, kept in step by the
+ServiceRequest save hooks in carwash.signals, and re-seeded periodically
+(SCHEDULER_RESYNC_SECONDS) to pick up changes made by other processes.
+"""
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ServiceRequest
+from .reference import attendant_directory, service_catalog
+
+
+class FenwickTree:
+    """Append-only Fenwick (binary indexed) tree of numbers"""
+
+    def __init__(self):
+        self._tree = [0]  # 1-based
+        self._values = [0]
+
+    def __len__(self):
+        return len(self._values) - 1
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def append(self, value):
+        index = len(self._values)
+        self._values.append(value)
+        lowbit = index & -index
+        self._tree.append(self.prefix(index - 1) - self.prefix(index - lowbit) + value)
+        return index
+
+    def add(self, index, delta):
+        self._values[index] += delta
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def set(self, index, value):
+        self.add(index, value - self._values[index])
+
+    def prefix(self, index):
+        """Sum of values at positions 1..index"""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+
+class AttendantQueue:
+    def __init__(self, attendant_id):
+        self.attendant_id = attendant_id
+        self.pending = FenwickTree()
+        self.pending_minutes = 0
+        self.in_progress = {}  # request pk -> (expected end timestamp, minutes)
+
+    @property
+    def load(self):
+        """Queued minutes used to rank attendants"""
+        return self.pending_minutes + sum(minutes for _, minutes in self.in_progress.values())
+
+    def remaining_minutes(self, now):
+        return sum(max(end - now, 0) for end, _ in self.in_progress.values()) / 60
+
+
+class BayScheduler:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._queues = None
+        self._requests = {}  # request pk -> (attendant id, 'pending' slot or None)
+        self._heap = []
+        self._seeded_at = 0
+        self._directory = None
+
+    # -- state -------------------------------------------------------------
+
+    def _minutes(self, service_type_id):
+        service_type = service_catalog.get(service_type_id)
+        return service_type.estimated_time_minutes if service_type else 0
+
+    def _ensure_seeded(self):
+        interval = getattr(settings, 'SCHEDULER_RESYNC_SECONDS', 30)
+        if (self._queues is not None
+                and time.monotonic() - self._seeded_at < interval
+                and self._directory == attendant_directory.fingerprint):
+            return
+        self._directory = attendant_directory.fingerprint
+        self._queues = {a.pk: AttendantQueue(a.pk) for a in attendant_directory.active()}
+        self._requests = {}
+        self._heap = []
+        rows = ServiceRequest.objects.filter(
+            status__in=['pending', 'in_progress'], attendant__isnull=False
+        ).order_by('request_date', 'pk').values_list(
+            'pk', 'attendant_id', 'service_type_id', 'status', 'start_time'
+        )
+        for pk, attendant_id, service_type_id, status, start_time in rows:
+            self._track(pk, attendant_id, self._minutes(service_type_id), status, start_time)
+        for queue in self._queues.values():
+            self._push(queue)
+        self._seeded_at = time.monotonic()
+
+    def _push(self, queue):
+        heapq.heappush(self._heap, (queue.load, queue.attendant_id))
+        if len(self._heap) > 4 * len(self._queues) + 16:
+            self._heap = [(q.load, q.attendant_id) for q in self._queues.values()]
+            heapq.heapify(self._heap)
+
+    def _track(self, pk, attendant_id, minutes, status, start_time):
+        queue = self._queues.get(attendant_id)
+        if queue is None:
+            return
+        if status == 'pending':
+            slot = queue.pending.append(minutes)
+            queue.pending_minutes += minutes
+            self._requests[pk] = (attendant_id, slot)
+        else:
+            started = (start_time or timezone.now()).timestamp()
+            queue.in_progress[pk] = (started + minutes * 60, minutes)
+            self._requests[pk] = (attendant_id, None)
+
+    def _untrack(self, pk):
+        attendant_id, slot = self._requests.pop(pk, (None, None))
+        queue = self._queues.get(attendant_id)
+        if queue is None:
+            return None
+        if slot is not None:
+            minutes = queue.pending[slot]
+            queue.pending.set(slot, 0)
+            queue.pending_minutes -= minutes
+        else:
+            queue.in_progress.pop(pk, None)
+        return queue
+
+    # -- public API --------------------------------------------------------
+
+    def sync(self, request):
+        """Reflect a saved ServiceRequest's status and attendant"""
+        with self._lock:
+            if self._queues is None:
+                return
+            queue = self._untrack(request.pk)
+            if request.status in ('pending', 'in_progress') and request.attendant_id:
+                self._track(
+                    request.pk, request.attendant_id, self._minutes(request.service_type_id),
+                    request.status, request.start_time
+                )
+                queue = self._queues.get(request.attendant_id) or queue
+            if queue is not None:
+                self._push(queue)
+
+    def remove(self, pk):
+        with self._lock:
+            if self._queues is None:
+                return
+            queue = self._untrack(pk)
+            if queue is not None:
+                self._push(queue)
+
+    def least_loaded(self):
+        """Return (attendant id, wait in minutes) for the least-loaded active attendant"""
+        with self._lock:
+            self._ensure_seeded()
+            while self._heap:
+                load, attendant_id = self._heap[0]
+                queue = self._queues.get(attendant_id)
+                if queue is not None and queue.load == load:
+                    now = timezone.now().timestamp()
+                    return attendant_id, round(queue.remaining_minutes(now) + queue.pending_minutes, 1)
+                heapq.heappop(self._heap)
+            return None, None
+
+    def predicted_wait(self, pk):
+        """Minutes until a pending request is expected to start, 0 if started, None if unknown"""
+        with self._lock:
+            self._ensure_seeded()
+            attendant_id, slot = self._requests.get(pk, (None, None))
+            queue = self._queues.get(attendant_id)
+            if queue is None:
+                return None
+            if slot is None:
+                return 0
+            now = timezone.now().timestamp()
+            return round(queue.remaining_minutes(now) + queue.pending.prefix(slot - 1), 1)
+
+    def reset(self):
+        with self._lock:
+            self._queues = None
+
+
+scheduler = BayScheduler()
@@ -0,0 +1,91 @@
+"""
+Typeahead over vehicles and customers using the normalized search keys
+
+Matches are tried from cheapest and most specific to broadest, each one
+an indexed query capped at the rows still needed:
+
+1. plate prefix            (index range scan on Vehicle.plate_key)
+2. phone prefix            (index range scan on Customer.phone_key)
+3. name prefix             (range scan on Customer.name_key, then later words)
+4. substring of any key    (pg_trgm GIN indexes on PostgreSQL, see
+                            migration 0006; a scan of the key column elsewhere)
+
+Substring matching starts at three characters, the shortest a trigram
+index can serve. Prefix ranges are also filtered with LIKE so collations
+that ignore spaces cannot widen them.
+"""
+from django.db.models import Q
+
+from .fields import DEFAULT_COUNTRY_CODE, name_key, phone_key, plate_key
+from .models import Customer, Vehicle
+
+MIN_SUBSTRING = 3
+VEHICLE_COLUMNS = ('pk', 'plate_number', 'make', 'model', 'customer_id', 'customer__name')
+CUSTOMER_COLUMNS = ('pk', 'name', 'phone')
+
+
+def prefix(field, value):
+    """Index-friendly `field` starts with `value`: a key range plus the LIKE check"""
+    upper = value[:-1] + chr(ord(value[-1]) + 1)
+    return Q(**{f'{field}__gte': value, f'{field}__lt': upper, f'{field}__startswith': value})
+
+
+def phone_prefixes(query):
+    """Phone keys a partially typed number may start"""
+    digits = ''.join(char for char in query if char.isdigit())
+    if len(digits) < 2 or len(digits) * 2 < len(query.replace(' ', '')):
+        return []
+    if query.lstrip().startswith('+') or digits.startswith(('00', DEFAULT_COUNTRY_CODE)):
+        return [phone_key(digits) if digits.startswith('00') else digits]
+    if digits.startswith('0'):
+        return [DEFAULT_COUNTRY_CODE + digits[1:]]
+    return [DEFAULT_COUNTRY_CODE + digits, digits]
+
+
+def vehicle_row(row, match):
+    pk, plate, make, model, customer, customer_name = row
+    return {
+        'type': 'vehicle', 'id': pk, 'plate_number': plate, 'make': make, 'model': model,
+        'customer': customer, 'customer_name': customer_name, 'match': match,
+    }
+
+
+def customer_row(row, match):
+    pk, name, phone = row
+    return {'type': 'customer', 'id': pk, 'name': name, 'phone': phone, 'match': match}
+
+
+def typeahead(query, limit=10):
+    """Up to `limit` vehicles and customers matching a partially typed plate, phone or name"""
+    plate, phones, name = plate_key(query), phone_prefixes(query), name_key(query)
+    vehicles = Vehicle.objects.filter(is_active=True).order_by('plate_key')
+    customers = Customer.objects.filter(is_active=True).order_by('name_key')
+    steps = []
+    if plate:
+        steps.append((vehicles, vehicle_row, 'plate', prefix('plate_key', plate)))
+    for phone in phones:
+        steps.append((customers, customer_row, 'phone', prefix('phone_key', phone)))
+    if name:
+        steps.append((customers, customer_row, 'name', prefix('name_key', name)))
+    if len(name) >= MIN_SUBSTRING:
+        steps.append((customers, customer_row, 'name', Q(name_key__contains=f' {name}')))
+    if len(plate) >= MIN_SUBSTRING:
+        steps.append((vehicles, vehicle_row, 'plate', Q(plate_key__contains=plate)))
+    for phone in phones:
+        if len(phone) >= MIN_SUBSTRING:
+            steps.append((customers, customer_row, 'phone', Q(phone_key__contains=phone)))
+    if len(name) >= MIN_SUBSTRING:
+        steps.append((customers, customer_row, 'name', Q(name_key__contains=name)))
+
+    results, seen = [], set()
+    for queryset, build, match, condition in steps:
+        needed = limit - len(results)
+        if needed <= 0:
+            break
+        columns = VEHICLE_COLUMNS if build is vehicle_row else CUSTOMER_COLUMNS
+        exclude = [pk for kind, pk in seen if kind is build]
+        rows = queryset.filter(condition).exclude(pk__in=exclude).values_list(*columns)[:needed]
+        for row in rows:
+            seen.add((build, row[0]))
+            results.append(build(row, match))
+    return results
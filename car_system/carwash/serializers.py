@@ -1,14 +1,198 @@
 """
 DRF Serializers for Smart Car Wash System
 """
+import functools
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from .models import (
     Attendant, Customer, Vehicle, ServiceType,
-    ServiceRequest, Parking, Payment
+    ServiceRequest, ParkingLot, Parking, Payment, ArchivedServiceRequest
 )
+from .profiling import current_profile, phase
+from .reference import REFERENCE_CACHES
+
+
+class PrefetchablePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves from a preloaded {pk: object} map when set.
+
+    Reference models (service types, attendants) resolve from the in-process
+    reference cache, so validating them costs no queries. A pk the cache
+    does not hold is looked up in the database, as the row may have been
+    added after the cache last refreshed; a hit there invalidates the cache.
+    """
+    prefetched = None
+
+    def lookup_map(self):
+        if self.prefetched is not None:
+            return self.prefetched
+        cache = REFERENCE_CACHES.get(self.get_queryset().model)
+        return cache.by_pk() if cache is not None else None
+
+    def to_internal_value(self, data):
+        lookup = self.lookup_map()
+        if lookup is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk in lookup:
+            return lookup[pk]
+        cache = REFERENCE_CACHES.get(self.get_queryset().model)
+        if self.prefetched is None and cache is not None:
+            obj = self.get_queryset().filter(pk=pk).first()
+            if obj is not None:
+                cache.invalidate()
+                return obj
+        self.fail('does_not_exist', pk_value=data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer for batch creates.
+
+    Related primary keys are resolved with one query per related model and
+    unique fields are checked with one query per field, instead of one query
+    per item. Items are validated independently so each reports its own errors.
+    """
+
+    def related_fields(self):
+        return {
+            name: field for name, field in self.child.fields.items()
+            if isinstance(field, PrefetchablePrimaryKeyRelatedField) and not field.read_only
+        }
+
+    def unique_fields(self):
+        fields = {}
+        for name, field in self.child.fields.items():
+            validators = [v for v in field.validators if isinstance(v, UniqueValidator)]
+            if validators and not field.read_only:
+                fields[name] = (field, validators[0])
+        return fields
+
+    def prefetch_related(self, items):
+        for name, field in self.related_fields().items():
+            model = field.get_queryset().model
+            if model in REFERENCE_CACHES:
+                continue
+            pks = set()
+            for item in items:
+                try:
+                    pks.add(model._meta.pk.to_python(item.get(name)))
+                except (AttributeError, TypeError, DjangoValidationError):
+                    continue
+            pks.discard(None)
+            field.prefetched = field.get_queryset().in_bulk(pks)
+
+    def validate_items(self, upsert_on=None):
+        """
+        Validate every item in `initial_data`.
+
+        Returns `(valid, errors)`: a list of `(index, validated_data)` pairs and
+        a dict mapping the index of each rejected item to its error detail.
+        With `upsert_on` (a unique field name), rows already stored under the
+        same key are accepted as updates rather than reported as duplicates.
+        """
+        items = self.initial_data
+        self.prefetch_related([item for item in items if isinstance(item, dict)])
+        unique = self.unique_fields()
+        for field, validator in unique.values():
+            field.validators = [v for v in field.validators if v is not validator]
+
+        valid, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+
+        upsert_source = self.child.fields[upsert_on].source if upsert_on else 'pk'
+        keys = {index: attrs.get(upsert_source) for index, attrs in valid}
+        for name, (field, validator) in unique.items():
+            source = field.source
+            values = {}
+            for index, attrs in valid:
+                value = attrs.get(source)
+                if value is not None:
+                    values.setdefault(getattr(value, 'pk', value), []).append(index)
+            owners = dict(
+                validator.queryset.filter(**{f'{source}__in': list(values)})
+                .values_list(source, upsert_source)
+            )
+            for value, indexes in values.items():
+                duplicates = indexes[1:]
+                if value in owners and (not upsert_on or keys[indexes[0]] != owners[value]):
+                    duplicates = indexes
+                for index in duplicates:
+                    errors.setdefault(index, {})[name] = [validator.message]
+
+        valid = [(index, attrs) for index, attrs in valid if index not in errors]
+        return valid, errors
+
+    def bulk_create(self, validated_items):
+        """Insert validated items with a single bulk_create"""
+        model = self.child.Meta.model
+        return model.objects.bulk_create([model(**attrs) for attrs in validated_items])
+
+
+class SparseFieldsMixin:
+    """
+    Output limited by the `fields` and `expand` serializer context.
+
+    Views set them from `?fields=` and `?expand=` (see
+    views.SparseFieldsMixin). `fields` keeps only the named fields;
+    `expand` renders the named relations as nested objects, using the
+    related model's serializer from EXPANDED_SERIALIZERS, instead of primary
+    keys. Only the top-level serializer applies them, not nested ones.
+    """
+
+    def is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level():
+            return fields
+        only = self.context.get('fields')
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only}
+        for name in self.context.get('expand', ()):
+            if name in fields:
+                fields[name] = self.expanded_field(name, fields[name].source or name)
+        return fields
 
+    def to_representation(self, instance):
+        if current_profile() is None or not self.is_top_level():
+            return super().to_representation(instance)
+        with phase('serialize'):
+            return super().to_representation(instance)
 
-class AttendantSerializer(serializers.ModelSerializer):
+    def expanded_field(self, name, source):
+        related_model = self.Meta.model._meta.get_field(source).related_model
+        kwargs = {'source': source} if source != name else {}
+        return EXPANDED_SERIALIZERS[related_model](read_only=True, **kwargs)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def expandable_fields(cls):
+        """Names of the relation fields `expand` can turn into nested objects"""
+        model = cls.Meta.model
+        return frozenset(
+            name for name, field in cls().fields.items()
+            if isinstance(field, serializers.RelatedField)
+            and model._meta.get_field(field.source).related_model in EXPANDED_SERIALIZERS
+        )
+
+
+class AttendantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Attendant
         fields = [
@@ -18,31 +202,40 @@ class AttendantSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'name', 'phone', 'email', 'id_number',
             'address', 'date_registered', 'is_active',
+            'vehicle_count', 'visit_count', 'lifetime_spend', 'last_visit',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'date_registered', 'vehicle_count', 'visit_count', 'lifetime_spend', 'last_visit',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['date_registered', 'created_at', 'updated_at']
 
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
 
+    serializer_related_field = PrefetchablePrimaryKeyRelatedField
+
     class Meta:
         model = Vehicle
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'customer', 'customer_name', 'plate_number',
             'vehicle_type', 'color', 'make', 'model', 'year',
-            'vin', 'is_active', 'created_at', 'updated_at'
+            'vin', 'is_active', 'visit_count', 'lifetime_spend', 'last_visit',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['visit_count', 'lifetime_spend', 'last_visit', 'created_at', 'updated_at']
 
 
-class ServiceTypeSerializer(serializers.ModelSerializer):
+class ServiceTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ServiceType
         fields = [
@@ -53,14 +246,17 @@ class ServiceTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class ServiceRequestSerializer(serializers.ModelSerializer):
+class ServiceRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     vehicle_plate = serializers.CharField(source='vehicle.plate_number', read_only=True)
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     attendant_name = serializers.CharField(source='attendant.name', read_only=True)
     service_name = serializers.CharField(source='service_type.name', read_only=True)
 
+    serializer_related_field = PrefetchablePrimaryKeyRelatedField
+
     class Meta:
         model = ServiceRequest
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'vehicle', 'vehicle_plate', 'customer', 'customer_name',
             'attendant', 'attendant_name', 'service_type', 'service_name',
@@ -70,29 +266,61 @@ class ServiceRequestSerializer(serializers.ModelSerializer):
         read_only_fields = ['request_date', 'created_at', 'updated_at']
 
 
-class ParkingSerializer(serializers.ModelSerializer):
+class ArchivedServiceRequestSerializer(ServiceRequestSerializer):
+    """Archived service requests, in the same shape as live ones"""
+
+    class Meta(ServiceRequestSerializer.Meta):
+        model = ArchivedServiceRequest
+        read_only_fields = ServiceRequestSerializer.Meta.fields
+
+
+class ParkingLotSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    available = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ParkingLot
+        fields = [
+            'id', 'name', 'capacity', 'occupied', 'available',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['occupied', 'created_at', 'updated_at']
+
+
+class ParkingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     vehicle_plate = serializers.CharField(source='vehicle.plate_number', read_only=True)
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     attendant_name = serializers.CharField(source='attendant.name', read_only=True)
+    bay_code = serializers.CharField(source='bay.code', read_only=True)
+
+    serializer_related_field = PrefetchablePrimaryKeyRelatedField
 
     class Meta:
         model = Parking
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'vehicle', 'vehicle_plate', 'customer', 'customer_name',
             'check_in_time', 'check_out_time', 'status', 'parking_fee',
-            'attendant', 'attendant_name', 'notes',
+            'attendant', 'attendant_name', 'lot', 'bay', 'bay_code', 'notes',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['check_in_time', 'created_at', 'updated_at']
+        read_only_fields = ['check_in_time', 'bay', 'created_at', 'updated_at']
+
+    def validate_lot(self, value):
+        if self.instance is not None and value != self.instance.lot:
+            raise serializers.ValidationError('The lot of a parking record cannot be changed.')
+        return value
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     service_detail = ServiceRequestSerializer(source='service_request', read_only=True)
     parking_detail = ParkingSerializer(source='parking', read_only=True)
 
+    serializer_related_field = PrefetchablePrimaryKeyRelatedField
+
     class Meta:
         model = Payment
+        list_serializer_class = BulkListSerializer
         fields = [
             'id', 'customer', 'customer_name', 'service_request',
             'service_detail', 'parking', 'parking_detail',
@@ -100,3 +328,15 @@ class PaymentSerializer(serializers.ModelSerializer):
             'payment_date', 'notes', 'created_at', 'updated_at'
         ]
         read_only_fields = ['payment_date', 'created_at', 'updated_at']
+
+
+# Serializer for a relation to each model when it is named in `?expand=`
+EXPANDED_SERIALIZERS = {
+    Attendant: AttendantSerializer,
+    Customer: CustomerSerializer,
+    Vehicle: VehicleSerializer,
+    ServiceType: ServiceTypeSerializer,
+    ServiceRequest: ServiceRequestSerializer,
+    ParkingLot: ParkingLotSerializer,
+    Parking: ParkingSerializer,
+}
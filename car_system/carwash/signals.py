@@ -0,0 +1,159 @@
+"""
+Signal handlers for Smart Car Wash System
+"""
+import contextlib
+import contextvars
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .gate import gate_cache
+from .live import QUEUES, live_feed, publish_changes
+from .models import Attendant, Customer, Parking, ParkingLot, Payment, QueueCounter, ServiceRequest, ServiceType, Vehicle
+from .reference import REFERENCE_CACHES
+from .scheduling import scheduler
+
+# Set while carwash.archive moves rows to the archive tables
+_moving_to_archive = contextvars.ContextVar('carwash_moving_to_archive', default=False)
+
+
+@contextlib.contextmanager
+def keep_counted():
+    """Deletes in this block leave counters and revenue rollups alone: the rows moved, not left"""
+    token = _moving_to_archive.set(True)
+    try:
+        yield
+    finally:
+        _moving_to_archive.reset(token)
+
+
+@receiver(post_save, sender=ServiceType)
+@receiver(post_delete, sender=ServiceType)
+@receiver(post_save, sender=Attendant)
+@receiver(post_delete, sender=Attendant)
+def invalidate_reference_cache(sender, **kwargs):
+    """Drop cached reference data now and again once the change is committed"""
+    cache = REFERENCE_CACHES[sender]
+    cache.invalidate()
+    transaction.on_commit(cache.invalidate)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_delete, sender=ServiceRequest)
+@receiver(post_save, sender=Parking)
+@receiver(post_delete, sender=Parking)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_gate_cache(sender, instance, **kwargs):
+    """Drop cached gate records of the row's plate, vehicle and owner"""
+    gate_cache.invalidate_rows([instance])
+
+
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_save, sender=Parking)
+def publish_queue_change(sender, instance, **kwargs):
+    """Publish a live feed delta when a row enters, leaves or changes within the queue"""
+    queued_status = QUEUES[sender][1]
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if queued_status in (instance.status, previous) and live_feed.has_subscribers:
+        transaction.on_commit(lambda: publish_changes(sender, [instance.pk]))
+
+
+@receiver(post_delete, sender=ServiceRequest)
+@receiver(post_delete, sender=Parking)
+def publish_queue_removal(sender, instance, **kwargs):
+    kind, queued_status, _ = QUEUES[sender]
+    if getattr(instance, '_loaded_status', instance.status) == queued_status:
+        pk = instance.pk
+        transaction.on_commit(lambda: live_feed.publish('remove', {'kind': kind, 'id': pk}))
+
+
+@receiver(post_save, sender=Parking)
+def release_parking_space(sender, instance, raw=False, **kwargs):
+    """
+    Free the lot space of a record that stops being active
+
+    Spaces are reserved by the check-in views (ParkingLot.allocate) before
+    the record is saved; any save that moves a record out of active or to
+    another lot, from the API, a transition or the admin, releases it here.
+    """
+    held = getattr(instance, '_held_space', None)
+    instance._held_space = instance.space_key()
+    if held is not None and held != instance._held_space and not raw:
+        ParkingLot.release(*held)
+
+
+@receiver(post_delete, sender=Parking)
+def release_deleted_parking_space(sender, instance, **kwargs):
+    """Free the lot space of an active record however it is deleted, cascades included"""
+    held = getattr(instance, '_held_space', instance.space_key())
+    if held is not None:
+        ParkingLot.release(*held)
+
+
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_save, sender=Parking)
+def update_queue_counter(sender, instance, created=False, raw=False, **kwargs):
+    """Count rows entering or leaving the queue, from saves and transitions alike"""
+    previous = False if created else getattr(instance, '_queued', instance.in_queue())
+    instance._queued = instance.in_queue()
+    if previous != instance._queued and not raw:
+        QueueCounter.add(sender.queue[0], 1 if instance._queued else -1)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+@receiver(post_delete, sender=Parking)
+def remove_from_queue_counter(sender, instance, **kwargs):
+    if getattr(instance, '_queued', instance.in_queue()):
+        QueueCounter.remove(sender.queue[0])
+    instance._queued = False
+
+
+@receiver(post_save, sender=ServiceRequest)
+def update_schedule(sender, instance, **kwargs):
+    scheduler.sync(instance)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def remove_from_schedule(sender, instance, **kwargs):
+    scheduler.remove(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def update_revenue_rollup(sender, instance, raw=False, **kwargs):
+    """Runs inside Payment.save's transaction and after status transitions"""
+    if not raw:
+        instance.sync_revenue_rollup()
+
+
+@receiver(post_delete, sender=Payment)
+def withdraw_revenue(sender, instance, **kwargs):
+    """Runs inside the deleting transaction, for instance, queryset, admin and cascade deletes alike"""
+    if not _moving_to_archive.get():
+        instance.withdraw_revenue()
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_save, sender=Parking)
+@receiver(post_save, sender=Payment)
+def update_counters(sender, instance, raw=False, **kwargs):
+    """Keep Customer/Vehicle counters in step within the saving transaction"""
+    if not raw:
+        counters.sync(instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_delete, sender=ServiceRequest)
+@receiver(post_delete, sender=Parking)
+@receiver(post_delete, sender=Payment)
+def withdraw_counters(sender, instance, **kwargs):
+    if not _moving_to_archive.get():
+        counters.discard(instance)
@@ -0,0 +1,101 @@
+"""
+Database-side statistics for Smart Car Wash System
+"""
+import math
+from datetime import timedelta
+
+from django.db.models import (
+    Avg, Case, Count, DurationField, ExpressionWrapper, F, IntegerField, When
+)
+
+# Histogram bucket upper bounds in minutes; the last bucket is open-ended
+DURATION_BUCKETS_MINUTES = [15, 30, 60, 120, 240, 480, 1440]
+
+PERCENTILES = {
+    'median': 0.5,
+    'p90': 0.9,
+    'p99': 0.99,
+}
+
+
+def _hours(duration):
+    """Convert a timedelta (or None) to hours rounded to 2 decimals"""
+    if duration is None:
+        return 0
+    return round(duration.total_seconds() / 3600, 2)
+
+
+def _bucket_labels(bounds):
+    labels = []
+    lower = 0
+    for upper in bounds:
+        labels.append((lower, upper))
+        lower = upper
+    labels.append((lower, None))
+    return labels
+
+
+def with_duration(queryset):
+    """Annotate completed parking records with their stay duration"""
+    return queryset.filter(
+        status='completed', check_out_time__isnull=False
+    ).annotate(
+        duration=ExpressionWrapper(
+            F('check_out_time') - F('check_in_time'), output_field=DurationField()
+        )
+    )
+
+
+def parking_duration_stats(queryset, bucket_bounds=DURATION_BUCKETS_MINUTES):
+    """
+    Aggregate parking durations without loading rows into Python.
+
+    Count and average come from a single aggregate query, each percentile is
+    a single ordered row fetch (nearest-rank), and the histogram is a GROUP BY
+    over a CASE bucket expression, so memory use does not depend on table size.
+    """
+    durations = with_duration(queryset)
+    totals = durations.aggregate(total=Count('id'), average=Avg('duration'))
+    total = totals['total']
+
+    percentiles = {}
+    ordered = durations.order_by('duration').values_list('duration', flat=True)
+    for name, fraction in PERCENTILES.items():
+        if total:
+            rank = max(math.ceil(fraction * total), 1) - 1
+            percentiles[name] = _hours(ordered[rank])
+        else:
+            percentiles[name] = 0
+
+    buckets = _bucket_labels(bucket_bounds)
+    bucket_case = Case(
+        *[
+            When(duration__lt=timedelta(minutes=upper), then=index)
+            for index, (_, upper) in enumerate(buckets[:-1])
+        ],
+        default=len(buckets) - 1,
+        output_field=IntegerField(),
+    )
+    counts = dict(
+        durations.order_by()
+        .annotate(bucket=bucket_case)
+        .values('bucket')
+        .annotate(count=Count('id'))
+        .values_list('bucket', 'count')
+    )
+
+    return {
+        'total_vehicles_parked': total,
+        'average_duration_hours': _hours(totals['average']),
+        'median_duration_hours': percentiles['median'],
+        'p90_duration_hours': percentiles['p90'],
+        'p99_duration_hours': percentiles['p99'],
+        'histogram': [
+            {
+                'min_minutes': lower,
+                'max_minutes': upper,
+                'count': counts.get(index, 0),
+            }
+            for index, (lower, upper) in enumerate(buckets)
+        ],
+    }
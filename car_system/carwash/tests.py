@@ -1,12 +1,46 @@
 """
 Unit tests for Smart Car Wash System
 """
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.urls import remove_query_param
 from .models import (
     Attendant, Customer, Vehicle, ServiceType,
-    ServiceRequest, Parking, Payment
+    ServiceRequest, ParkingLot, ParkingBay, Parking, Payment, QueueCounter, RevenueRollup,
+    ArchivedServiceRequest, ArchivedParking, ArchivedPayment
 )
+from . import metrics
+from .counters import reconcile
+from .fastpath import row_plan
+from .gate import GateCache, gate_cache
+from .live import SUBSCRIBER_BUFFER, live_feed
+from .reference import attendant_directory, service_catalog
+from .renderers import FastJSONRenderer
+from .routing import REPLICA_ALIAS, STICKY_COOKIE, ReplicaRouter, replica_configured
+from .scheduling import FenwickTree, scheduler
+from .serializers import ParkingLotSerializer, PaymentSerializer
+from .transitions import TransitionConflict, transition
+from .views import CustomerViewSet, PaymentViewSet, ServiceRequestViewSet
 
 
 class AttendantModelTest(TestCase):
@@ -70,3 +104,1920 @@ class VehicleModelTest(TestCase):
     def test_vehicle_string_representation(self):
         expected = "TZA-1234-AB - Toyota Camry (2020)"
         self.assertEqual(str(self.vehicle), expected)
+
+
+class CarwashTestCase(TestCase):
+    """TestCase that resets process-wide caches, which never see test rollbacks"""
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The test replica mirrors default; share its connection so replica
+        # reads see the uncommitted test data, as if replication were instant
+        if replica_configured():
+            cls._replica_connection = connections[REPLICA_ALIAS]
+            connections[REPLICA_ALIAS] = connections[DEFAULT_DB_ALIAS]
+
+    @classmethod
+    def tearDownClass(cls):
+        if replica_configured():
+            connections[REPLICA_ALIAS] = cls._replica_connection
+        super().tearDownClass()
+
+    def setUp(self):
+        service_catalog.invalidate()
+        attendant_directory.invalidate()
+        scheduler.reset()
+        gate_cache.reset()
+
+
+def make_customer(n):
+    return Customer.objects.create(
+        name=f"Customer {n}",
+        phone=f"+2557000{n:05d}",
+        email=f"customer{n}@example.com",
+        id_number=f"CUS{n:06d}",
+        address="Dar es Salaam"
+    )
+
+
+def make_vehicle(customer, n):
+    return Vehicle.objects.create(
+        customer=customer,
+        plate_number=f"TZA-{n:04d}-AB",
+        vehicle_type="sedan",
+        color="white",
+        make="Toyota",
+        model="Corolla",
+        year=2020
+    )
+
+
+class QueryBudgetTest(CarwashTestCase):
+    """
+    Query counts must not grow with the number of rows returned
+
+    Budgets include the conditional GET validator query.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.attendant = Attendant.objects.create(
+            name="Budget Attendant",
+            phone="+255111111111",
+            email="budget@example.com",
+            id_number="ATT0001"
+        )
+        self.service_type = ServiceType.objects.create(
+            name="Full Wash",
+            description="Interior and exterior",
+            base_price=15000,
+            estimated_time_minutes=45
+        )
+        self.customer = make_customer(0)
+        self.vehicle = make_vehicle(self.customer, 0)
+        self.counter = 0
+
+    def add_rows(self, count):
+        """Create a full chain of records per row, each with its own relations"""
+        for _ in range(count):
+            self.counter += 1
+            customer = make_customer(self.counter)
+            vehicle = make_vehicle(customer, self.counter)
+            service = ServiceRequest.objects.create(
+                vehicle=vehicle, customer=customer,
+                attendant=self.attendant, service_type=self.service_type
+            )
+            parking = Parking.objects.create(
+                vehicle=vehicle, customer=customer, attendant=self.attendant
+            )
+            Payment.objects.create(
+                customer=customer, service_request=service, parking=parking,
+                amount=15000, payment_method='cash'
+            )
+            ServiceRequest.objects.create(
+                vehicle=self.vehicle, customer=self.customer,
+                attendant=self.attendant, service_type=self.service_type
+            )
+            Parking.objects.create(
+                vehicle=self.vehicle, customer=self.customer, attendant=self.attendant
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, url, budget):
+        """Query count is within budget and identical for 1 and 10 rows"""
+        self.add_rows(1)
+        small = self.count_queries(url)
+        self.add_rows(9)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url} grows with page size")
+        self.assertLessEqual(large, budget, url)
+
+    def test_vehicle_list(self):
+        self.assertQueryBudget('/api/vehicles/', 3)
+
+    def test_service_request_list(self):
+        self.assertQueryBudget('/api/service-requests/', 3)
+
+    def test_service_request_pending(self):
+        self.assertQueryBudget('/api/service-requests/pending/', 2)
+
+    def test_parking_list(self):
+        self.assertQueryBudget('/api/parking/', 3)
+
+    def test_parking_active(self):
+        self.assertQueryBudget('/api/parking/active/', 2)
+
+    def test_payment_list(self):
+        self.assertQueryBudget('/api/payments/', 3)
+
+    def test_vehicle_service_history(self):
+        # Vehicle, its requests, and the archive's newest date
+        self.assertQueryBudget(f'/api/vehicles/{self.vehicle.pk}/service_history/', 3)
+
+    def test_customer_summary(self):
+        self.assertQueryBudget(f'/api/customers/{self.customer.pk}/summary/', 3)
+
+
+class ParkingDurationStatsTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        customer = make_customer(1)
+        self.sedan = make_vehicle(customer, 1)
+        self.suv = make_vehicle(customer, 2)
+        self.suv.vehicle_type = 'suv'
+        self.suv.save()
+        now = timezone.now()
+        # Sedan stays of 10, 20, ..., 100 minutes and one SUV stay of 10 hours
+        for minutes in range(10, 101, 10):
+            self.park(self.sedan, now, minutes)
+        self.park(self.suv, now, 600)
+        Parking.objects.create(vehicle=self.sedan, customer=customer)
+
+    def park(self, vehicle, now, minutes):
+        parking = Parking.objects.create(vehicle=vehicle, customer=vehicle.customer)
+        Parking.objects.filter(pk=parking.pk).update(
+            status='completed',
+            check_in_time=now - timedelta(minutes=minutes),
+            check_out_time=now
+        )
+
+    def test_aggregates(self):
+        response = self.client.get('/api/parking/duration_stats/')
+        data = response.data
+        self.assertEqual(data['total_vehicles_parked'], 11)
+        self.assertEqual(data['average_duration_hours'], round(1150 / 11 / 60, 2))
+        self.assertEqual(data['median_duration_hours'], 1.0)
+        self.assertEqual(data['p90_duration_hours'], round(100 / 60, 2))
+        self.assertEqual(data['p99_duration_hours'], 10.0)
+        counts = [bucket['count'] for bucket in data['histogram']]
+        self.assertEqual(counts, [1, 1, 3, 5, 0, 0, 1, 0])
+        self.assertEqual(sum(counts), 11)
+
+    def test_vehicle_type_filter(self):
+        response = self.client.get('/api/parking/duration_stats/?vehicle_type=suv')
+        self.assertEqual(response.data['total_vehicles_parked'], 1)
+        self.assertEqual(response.data['median_duration_hours'], 10.0)
+
+    def test_invalid_date(self):
+        response = self.client.get('/api/parking/duration_stats/?start_date=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty(self):
+        response = self.client.get('/api/parking/duration_stats/?attendant_id=999')
+        self.assertEqual(response.data['total_vehicles_parked'], 0)
+        self.assertEqual(response.data['p99_duration_hours'], 0)
+
+
+class QueryPlanTest(CarwashTestCase):
+    """Hot filters and default orderings must be served by their indexes"""
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"No plan expectations for {connection.vendor}")
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always favour a sequential scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_pending_service_requests(self):
+        self.assertUsesIndex(ServiceRequest.objects.filter(status='pending'), 'sr_pending_idx')
+
+    def test_service_request_ordering(self):
+        self.assertUsesIndex(ServiceRequest.objects.all()[:10], 'sr_request_date_idx')
+
+    def test_active_parking(self):
+        self.assertUsesIndex(Parking.objects.filter(status='active'), 'parking_active_idx')
+
+    def test_parking_ordering(self):
+        self.assertUsesIndex(Parking.objects.all()[:10], 'parking_check_in_idx')
+
+    def test_completed_payments_in_range(self):
+        since = timezone.now() - timedelta(days=1)
+        self.assertUsesIndex(
+            Payment.objects.filter(status='completed', payment_date__gte=since),
+            'payment_status_date_idx'
+        )
+
+    def test_customer_payments_by_status(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(customer_id=1, status='completed'),
+            'payment_customer_status_idx'
+        )
+
+    def test_payment_ordering(self):
+        self.assertUsesIndex(Payment.objects.all()[:10], 'payment_date_idx')
+
+
+class CursorPaginationTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        customer = make_customer(1)
+        vehicle = make_vehicle(customer, 1)
+        now = timezone.now()
+        for n in range(25):
+            parking = Parking.objects.create(vehicle=vehicle, customer=customer)
+            # Pairs of records share a timestamp so the id tie-breaker matters
+            Parking.objects.filter(pk=parking.pk).update(
+                check_in_time=now - timedelta(minutes=n // 2)
+            )
+
+    def test_page_numbers_by_default(self):
+        response = self.client.get('/api/parking/')
+        self.assertEqual(response.data['count'], 25)
+
+    def test_cursor_walks_every_row_once(self):
+        url = '/api/parking/?pagination=cursor'
+        seen = []
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                response = self.client.get(url)
+                self.assertNotIn('count', response.data)
+                seen.extend(row['id'] for row in response.data['results'])
+                url = response.data['next']
+        expected = list(Parking.objects.order_by('-check_in_time', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+
+class RevenueRollupTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.customer = make_customer(1)
+
+    def pay(self, amount, method='cash', status='pending'):
+        return Payment.objects.create(
+            customer=self.customer, amount=amount, payment_method=method, status=status
+        )
+
+    def test_rollup_follows_payment_lifecycle(self):
+        payment = self.pay(10000)
+        self.pay(5000, method='mobile', status='completed')
+        self.assertEqual(Decimal(self.client.get('/api/payments/daily_revenue/').data['total_revenue']), 5000)
+
+        self.client.post(f'/api/payments/{payment.pk}/confirm_payment/')
+        data = self.client.get('/api/payments/daily_revenue/').data
+        self.assertEqual(Decimal(data['total_revenue']), 15000)
+        self.assertEqual(data['transactions'], 2)
+        by_method = {method: Decimal(total) for method, total in data['by_method'].items()}
+        self.assertEqual(by_method, {'cash': 10000, 'mobile': 5000})
+
+        response = self.client.post(f'/api/payments/{payment.pk}/refund/')
+        self.assertEqual(response.data['status'], 'refunded')
+        data = self.client.get('/api/payments/monthly_revenue/').data
+        self.assertEqual(Decimal(data['total_revenue']), 5000)
+        self.assertEqual(data['transactions'], 1)
+
+    def test_revenue_reads_do_not_touch_payments(self):
+        self.pay(5000, status='completed')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/payments/daily_revenue/')
+            self.client.get('/api/payments/monthly_revenue/')
+        self.assertFalse(any('carwash_payment' in q['sql'] for q in ctx.captured_queries))
+
+    def test_every_kind_of_delete_withdraws_revenue(self):
+        self.pay(5000, status='completed')
+        card = self.pay(7000, method='card', status='completed')
+        other = make_customer(2)
+        Payment.objects.create(customer=other, amount=3000, payment_method='cash', status='completed')
+
+        Payment.objects.filter(pk=card.pk).delete()
+        other.delete()
+        data = self.client.get('/api/payments/daily_revenue/').data
+        self.assertEqual((Decimal(data['total_revenue']), data['transactions']), (5000, 1))
+        self.assertEqual({method: Decimal(total) for method, total in data['by_method'].items()
+                          if Decimal(total)}, {'cash': 5000})
+
+    def test_rebuild_command_fixes_drift(self):
+        self.pay(5000, status='completed')
+        self.pay(7000, method='card', status='completed')
+        RevenueRollup.objects.update(total_amount=1, transaction_count=99)
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        totals = {r.payment_method: (r.total_amount, r.transaction_count) for r in RevenueRollup.objects.all()}
+        self.assertEqual(totals, {'cash': (5000, 1), 'card': (7000, 1)})
+
+
+class BulkCreateTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.service_type = ServiceType.objects.create(
+            name="Basic Wash", description="Exterior", base_price=5000,
+            estimated_time_minutes=20
+        )
+        self.customers = [make_customer(n) for n in range(3)]
+        self.vehicles = [make_vehicle(c, n) for n, c in enumerate(self.customers)]
+
+    def service_items(self):
+        return [
+            {'vehicle': v.pk, 'customer': v.customer_id, 'service_type': self.service_type.pk}
+            for v in self.vehicles
+        ]
+
+    def test_bulk_service_requests(self):
+        service_catalog.all()
+        scheduler.least_loaded()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/service-requests/bulk/', self.service_items(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(ServiceRequest.objects.count(), 3)
+        plates = [item['data']['vehicle_plate'] for item in response.data['results']]
+        self.assertEqual(plates, [v.plate_number for v in self.vehicles])
+        with CaptureQueriesContext(connection) as ctx_large:
+            self.client.post('/api/service-requests/bulk/', self.service_items() * 5, format='json')
+        self.assertEqual(len(ctx.captured_queries), len(ctx_large.captured_queries))
+
+    def test_per_item_errors(self):
+        items = self.service_items()
+        items[1]['vehicle'] = 9999
+        items.append('not a record')
+        response = self.client.post('/api/service-requests/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses, ['created', 'error', 'created', 'error'])
+        self.assertIn('vehicle', response.data['results'][1]['errors'])
+
+    def test_bulk_payments_check_uniqueness_and_rollup(self):
+        Payment.objects.create(
+            customer=self.customers[0], amount=1000, payment_method='cash', transaction_ref='TX-1'
+        )
+        items = [
+            {'customer': c.pk, 'amount': '2000', 'payment_method': 'cash',
+             'status': 'completed', 'transaction_ref': f'TX-{n}'}
+            for n, c in enumerate(self.customers)
+        ]
+        items.append(dict(items[0], transaction_ref='TX-0'))
+        response = self.client.post('/api/payments/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        errors = [n for n, item in enumerate(response.data['results']) if item['status'] == 'error']
+        self.assertEqual(errors, [1, 3])
+        self.assertEqual(RevenueRollup.objects.get(payment_method='cash').transaction_count, 2)
+
+    def test_rejects_non_list(self):
+        response = self.client.post('/api/parking/bulk/', {'vehicle': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportRecordsTest(CarwashTestCase):
+    def run_import(self, model, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_records', model, path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_customer_csv_upsert(self):
+        make_customer(1)
+        path = self.write('customers.csv', (
+            'name,phone,email,id_number,address\n'
+            'Renamed,+255700000001,customer1@example.com,CUS000001,Arusha\n'
+            'New Customer,+255700000099,new@example.com,CUS000099,Mwanza\n'
+            'Clash,+255700000099,other@example.com,CUS000100,Mwanza\n'
+            'No Address,+255700000101,x@example.com,CUS000101,\n'
+        ))
+        output, errors = self.run_import('customers', path, chunk_size=2)
+        self.assertIn('4 rows', output)
+        self.assertIn('2 upserted, 2 rejected', output)
+        self.assertEqual(Customer.objects.get(id_number='CUS000001').name, 'Renamed')
+        self.assertEqual(Customer.objects.get(id_number='CUS000001').name_key, 'renamed')
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertIn('line 4', errors)
+        self.assertIn('line 5', errors)
+
+    def test_vehicle_ndjson(self):
+        customer = make_customer(1)
+        rows = [
+            {'customer_id_number': customer.id_number, 'plate_number': 'T 100 AAA',
+             'vehicle_type': 'suv', 'color': 'red', 'make': 'Nissan', 'model': 'X-Trail', 'year': 2018},
+            {'customer_id_number': 'UNKNOWN', 'plate_number': 'T 101 AAA',
+             'vehicle_type': 'suv', 'color': 'red', 'make': 'Nissan', 'model': 'X-Trail', 'year': 2018},
+        ]
+        path = self.write('vehicles.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n{oops\n')
+        output, _ = self.run_import('vehicles', path)
+        self.assertIn('1 upserted, 2 rejected', output)
+        self.assertEqual(Vehicle.objects.get(plate_number='T 100 AAA').customer, customer)
+
+    def test_upsert_keeps_columns_a_row_omits(self):
+        customer = make_customer(1)
+        kept = make_vehicle(customer, 1)
+        Vehicle.objects.filter(pk=kept.pk).update(vin='VIN-KEPT')
+        base = {'customer_id_number': customer.id_number, 'vehicle_type': 'suv', 'color': 'red',
+                'make': 'Nissan', 'model': 'X-Trail', 'year': 2018}
+        rows = [
+            {**base, 'plate_number': kept.plate_number},
+            {**base, 'plate_number': 'T 200 BBB', 'vin': 'VIN-NEW'},
+        ]
+        path = self.write('vehicles.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n')
+        output, _ = self.run_import('vehicles', path)
+        self.assertIn('2 upserted, 0 rejected', output)
+        kept.refresh_from_db()
+        self.assertEqual((kept.vin, kept.make), ('VIN-KEPT', 'Nissan'))
+        self.assertEqual(Vehicle.objects.get(plate_number='T 200 BBB').vin, 'VIN-NEW')
+
+
+class ExportTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.customers = [make_customer(n) for n in range(3)]
+        for n, customer in enumerate(self.customers):
+            Payment.objects.create(
+                customer=customer, amount=1000 * (n + 1), payment_method='cash',
+                status='completed' if n else 'pending'
+            )
+        old = Payment.objects.create(customer=self.customers[0], amount=50, payment_method='card')
+        Payment.objects.filter(pk=old.pk).update(payment_date=timezone.now() - timedelta(days=40))
+
+    def read(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_payment_csv(self):
+        rows = list(csv.DictReader(StringIO(self.read('/api/payments/export/?status=completed'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['customer_name'] for row in rows}, {'Customer 1', 'Customer 2'})
+        self.assertEqual(rows[0]['transaction_ref'], '')
+
+    def test_payment_ndjson_date_range(self):
+        start = (timezone.localdate() - timedelta(days=7)).isoformat()
+        text = self.read(f'/api/payments/export/?export_format=ndjson&start_date={start}')
+        rows = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertIn(Decimal(rows[0]['amount']), {1000, 2000, 3000})
+
+    def test_parking_export_filters(self):
+        vehicle = make_vehicle(self.customers[1], 1)
+        Parking.objects.create(vehicle=vehicle, customer=self.customers[1])
+        rows = list(csv.DictReader(StringIO(
+            self.read(f'/api/parking/export/?customer_id={self.customers[1].pk}')
+        )))
+        self.assertEqual([row['vehicle_plate'] for row in rows], [vehicle.plate_number])
+
+    def test_bad_format(self):
+        response = self.client.get('/api/service-requests/export/?export_format=xml')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        response = await AsyncClient().get('/api/payments/export/?export_format=csv')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(body, await sync_to_async(self.read)('/api/payments/export/?export_format=csv'))
+
+
+class ReferenceCacheTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.service_type = ServiceType.objects.create(
+            name="Basic Wash", description="Exterior", base_price=5000,
+            estimated_time_minutes=20
+        )
+        ServiceType.objects.create(
+            name="Retired", description="Old", base_price=1, estimated_time_minutes=1,
+            is_active=False
+        )
+        self.attendant = Attendant.objects.create(
+            name="Cache Attendant", phone="+255222222222",
+            email="cache@example.com", id_number="ATT0002"
+        )
+
+    def test_catalog_and_directory_reads_are_cached(self):
+        self.client.get('/api/services/')
+        self.client.get('/api/attendants/')
+        with CaptureQueriesContext(connection) as ctx:
+            services = self.client.get('/api/services/').data
+            attendants = self.client.get('/api/attendants/').data
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual([s['name'] for s in services['results']], ['Basic Wash'])
+        self.assertEqual([a['name'] for a in attendants['results']], ['Cache Attendant'])
+
+    def test_foreign_key_validation_skips_reference_tables(self):
+        vehicle = make_vehicle(make_customer(1), 1)
+        service_catalog.all()
+        attendant_directory.all()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/service-requests/', {
+                'vehicle': vehicle.pk, 'customer': vehicle.customer_id,
+                'service_type': self.service_type.pk, 'attendant': self.attendant.pk,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['service_name'], 'Basic Wash')
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT'))
+        self.assertNotIn('carwash_servicetype', tables)
+        self.assertNotIn('carwash_attendant', tables)
+
+    def test_save_invalidates_and_bumps_version(self):
+        version = service_catalog.version
+        self.service_type.name = "Premium Wash"
+        self.service_type.save()
+        self.assertGreater(service_catalog.version, version)
+        self.assertEqual(service_catalog.get(self.service_type.pk).name, "Premium Wash")
+
+    def test_unknown_service_type(self):
+        vehicle = make_vehicle(make_customer(1), 1)
+        response = self.client.post('/api/service-requests/', {
+            'vehicle': vehicle.pk, 'customer': vehicle.customer_id, 'service_type': 9999,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('service_type', response.data)
+
+    def test_row_missing_from_cache_falls_back_to_database(self):
+        service_catalog.all()
+        # bulk_create sends no signals, as with a write from another process
+        added, = ServiceType.objects.bulk_create([ServiceType(
+            name="Wax", description="Wax", base_price=8000, estimated_time_minutes=30
+        )])
+        vehicle = make_vehicle(make_customer(1), 1)
+        response = self.client.post('/api/service-requests/', {
+            'vehicle': vehicle.pk, 'customer': vehicle.customer_id, 'service_type': added.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(service_catalog.get(added.pk).name, "Wax")
+
+    def test_local_cache_picks_up_unsignalled_writes(self):
+        self.client.get('/api/services/')
+        ServiceType.objects.filter(pk=self.service_type.pk).update(
+            name="Renamed Wash", updated_at=timezone.now()
+        )
+        self.assertEqual(self.client.get('/api/services/').data['results'][0]['name'], 'Basic Wash')
+        with override_settings(REFERENCE_CACHE_CHECK_SECONDS=0):
+            services = self.client.get('/api/services/').data
+        self.assertEqual([s['name'] for s in services['results']], ['Renamed Wash'])
+
+
+class ConditionalGetTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        customer = make_customer(1)
+        self.vehicle = make_vehicle(customer, 1)
+        self.parking = Parking.objects.create(vehicle=self.vehicle, customer=customer)
+
+    def test_unchanged_poll_returns_304_without_serializing(self):
+        first = self.client.get('/api/parking/active/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/parking/active/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_change_invalidates_etag(self):
+        etag = self.client.get('/api/parking/active/')['ETag']
+        self.client.post(f'/api/parking/{self.parking.pk}/check_out/')
+        response = self.client.get('/api/parking/active/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_filters_change_etag(self):
+        first = self.client.get('/api/vehicles/')['ETag']
+        other = self.client.get(f'/api/vehicles/?customer_id={self.vehicle.customer_id}')['ETag']
+        self.assertNotEqual(first, other)
+
+    def test_detail_if_modified_since(self):
+        url = f'/api/vehicles/{self.vehicle.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_malformed_detail_pk_is_404(self):
+        for path in ('payments', 'service-requests', 'customers', 'parking'):
+            self.assertEqual(self.client.get(f'/api/{path}/abc/').status_code, 404, path)
+
+    def test_related_changes_invalidate_etag(self):
+        payment = Payment.objects.create(
+            customer=self.vehicle.customer, parking=self.parking, amount=2000, payment_method='cash'
+        )
+        payments_etag = self.client.get('/api/payments/')['ETag']
+        vehicles_etag = self.client.get('/api/vehicles/')['ETag']
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+        self.client.post(f'/api/parking/{self.parking.pk}/check_out/')
+        response = self.client.get('/api/payments/', HTTP_IF_NONE_MATCH=payments_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['parking_detail']['status'], 'completed')
+
+        customer = self.vehicle.customer
+        customer.name = 'Renamed Customer'
+        customer.save()
+        response = self.client.get('/api/vehicles/', HTTP_IF_NONE_MATCH=vehicles_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['customer_name'], 'Renamed Customer')
+
+    def test_reference_list_uses_cache_fingerprint(self):
+        ServiceType.objects.create(
+            name="Basic Wash", description="Exterior", base_price=5000, estimated_time_minutes=20
+        )
+        etag = self.client.get('/api/services/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+
+class LiveQueueFeedTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_customer(1)
+        self.vehicle = make_vehicle(customer, 1)
+        self.parking = Parking.objects.create(vehicle=self.vehicle, customer=customer)
+
+    def read_event(self, events):
+        lines = next(iter(events)).decode().strip().splitlines()
+        fields = dict(line.split(': ', 1) for line in lines)
+        return fields['event'], json.loads(fields['data'])
+
+    def test_snapshot_then_deltas(self):
+        response = self.client.get('/api/live/queue/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = iter(response.streaming_content)
+        try:
+            event, data = self.read_event(events)
+            self.assertEqual(event, 'snapshot')
+            self.assertEqual([p['id'] for p in data['parking']], [self.parking.pk])
+            self.assertEqual(data['service_request'], [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.parking.notes = 'Bay 3'
+                self.parking.save()
+            event, data = self.read_event(events)
+            self.assertEqual((event, data['id'], data['data']['notes']), ('upsert', self.parking.pk, 'Bay 3'))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                APIClient().post(f'/api/parking/{self.parking.pk}/check_out/')
+            event, data = self.read_event(events)
+            self.assertEqual((event, data['kind'], data['id']), ('remove', 'parking', self.parking.pk))
+        finally:
+            response.close()
+        self.assertFalse(live_feed.has_subscribers)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        response = await AsyncClient().get('/api/live/queue/')
+        self.assertTrue(response.is_async)
+        events = response.streaming_content
+        try:
+            event, data = self.read_event([await anext(events)])
+            self.assertEqual((event, [p['id'] for p in data['parking']]), ('snapshot', [self.parking.pk]))
+            # Published from another thread, as the save hooks do
+            await sync_to_async(live_feed.publish, thread_sensitive=False)(
+                'remove', {'kind': 'parking', 'id': self.parking.pk}
+            )
+            event, data = self.read_event([await asyncio.wait_for(anext(events), 5)])
+            self.assertEqual((event, data['id']), ('remove', self.parking.pk))
+        finally:
+            await sync_to_async(response.close)()
+        self.assertFalse(live_feed.has_subscribers)
+
+    def test_no_reads_without_subscribers(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.parking.notes = 'Bay 4'
+                self.parking.save()
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        self.assertEqual([sql for sql in statements if sql not in ('SAVEPOINT', 'RELEASE')], ['UPDATE'])
+
+    def test_slow_subscriber_is_resynced(self):
+        subscription = live_feed.subscribe()
+        try:
+            for n in range(SUBSCRIBER_BUFFER + 1):
+                live_feed.publish('remove', {'kind': 'parking', 'id': n})
+            self.assertTrue(subscription.overflowed)
+            self.assertFalse(live_feed.has_subscribers)
+        finally:
+            live_feed.unsubscribe(subscription)
+
+
+class BaySchedulerTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.quick = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.full = ServiceType.objects.create(
+            name="Full Wash", description="Everything", base_price=20000, estimated_time_minutes=60
+        )
+        self.alice = Attendant.objects.create(
+            name="Alice", phone="+255300000001", email="alice@example.com", id_number="ATT-A"
+        )
+        self.bob = Attendant.objects.create(
+            name="Bob", phone="+255300000002", email="bob@example.com", id_number="ATT-B"
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+
+    def request_service(self, service_type, **extra):
+        response = self.client.post('/api/service-requests/', dict({
+            'vehicle': self.vehicle.pk, 'customer': self.vehicle.customer_id,
+            'service_type': service_type.pk,
+        }, **extra), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_fenwick_prefix_sums(self):
+        tree = FenwickTree()
+        values = [5, 3, 8, 1, 9, 2, 7]
+        for value in values:
+            tree.append(value)
+        tree.set(3, 0)
+        values[2] = 0
+        for n in range(len(values) + 1):
+            self.assertEqual(tree.prefix(n), sum(values[:n]))
+
+    def test_assigns_least_loaded_attendant(self):
+        first = self.request_service(self.full)
+        second = self.request_service(self.quick)
+        third = self.request_service(self.quick)
+        self.assertNotEqual(first['attendant'], second['attendant'])
+        self.assertEqual(third['attendant'], second['attendant'])
+        self.assertEqual(scheduler.predicted_wait(third['id']), 10)
+        response = self.client.get('/api/service-requests/next_available/')
+        self.assertEqual(response.data['attendant'], second['attendant'])
+        self.assertEqual(response.data['predicted_wait_minutes'], 20)
+
+    def test_wait_follows_start_and_complete(self):
+        self.request_service(self.full, attendant=self.alice.pk)
+        queued = self.request_service(self.quick, attendant=self.alice.pk)
+        url = f"/api/service-requests/{queued['id']}/predicted_wait/"
+        self.assertEqual(self.client.get(url).data['predicted_wait_minutes'], 60)
+
+        first = ServiceRequest.objects.exclude(pk=queued['id']).get()
+        first.status = 'in_progress'
+        first.start_time = timezone.now() - timedelta(minutes=30)
+        first.save()
+        self.assertAlmostEqual(self.client.get(url).data['predicted_wait_minutes'], 30, delta=0.5)
+
+        first.status = 'completed'
+        first.save()
+        self.assertEqual(self.client.get(url).data['predicted_wait_minutes'], 0)
+        self.client.post(f"/api/service-requests/{queued['id']}/complete_service/")
+        self.assertIsNone(self.client.get(url).data['predicted_wait_minutes'])
+
+    def test_seeds_from_database(self):
+        ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer,
+            service_type=self.full, attendant=self.alice
+        )
+        scheduler.reset()
+        attendant_id, wait = scheduler.least_loaded()
+        self.assertEqual((attendant_id, wait), (self.bob.pk, 0))
+
+
+class ParkingCapacityTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.lot = ParkingLot.objects.create(name="North", capacity=2)
+        for code in ('A1', 'A2'):
+            ParkingBay.objects.create(lot=self.lot, code=code)
+        self.vehicles = [make_vehicle(make_customer(n), n) for n in range(3)]
+
+    def check_in(self, vehicle):
+        return self.client.post('/api/parking/', {
+            'vehicle': vehicle.pk, 'customer': vehicle.customer_id, 'lot': self.lot.pk,
+        }, format='json')
+
+    def test_allocates_bays_and_rejects_when_full(self):
+        first = self.check_in(self.vehicles[0])
+        second = self.check_in(self.vehicles[1])
+        self.assertEqual((first.data['bay_code'], second.data['bay_code']), ('A1', 'A2'))
+        full = self.check_in(self.vehicles[2])
+        self.assertEqual(full.status_code, 400)
+        self.assertIn('lot', full.data)
+        self.assertEqual(Parking.objects.count(), 2)
+
+        self.client.post(f"/api/parking/{first.data['id']}/check_out/")
+        self.assertFalse(ParkingBay.objects.get(code='A1').is_occupied)
+        self.assertEqual(self.check_in(self.vehicles[2]).data['bay_code'], 'A1')
+
+    def test_closed_record_cannot_be_reactivated(self):
+        parking = self.check_in(self.vehicles[0]).data
+        self.client.patch(f"/api/parking/{parking['id']}/", {'status': 'completed'}, format='json')
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 0)
+        response = self.client.patch(f"/api/parking/{parking['id']}/", {'status': 'active'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(Parking.objects.get(pk=parking['id']).status, 'completed')
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 0)
+
+    def test_any_removal_or_close_frees_the_space(self):
+        first = self.check_in(self.vehicles[0]).data
+        second = self.check_in(self.vehicles[1]).data
+        # Cascade from deleting the owner
+        Customer.objects.filter(pk=self.vehicles[0].customer_id).delete()
+        # A save outside the API, as the admin does
+        parking = Parking.objects.get(pk=second['id'])
+        parking.status = 'completed'
+        parking.save()
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 0)
+        self.assertFalse(ParkingBay.objects.filter(is_occupied=True).exists())
+        self.assertFalse(Parking.objects.filter(pk=first['id']).exists())
+
+        third = self.check_in(self.vehicles[2])
+        self.assertEqual(third.status_code, 201)
+        Parking.objects.filter(pk=third.data['id']).delete()
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 0)
+
+    def test_reconcile_fixes_lot_occupancy(self):
+        self.check_in(self.vehicles[0])
+        ParkingLot.objects.update(occupied=2)
+        ParkingBay.objects.update(is_occupied=True)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Fixed drift in 1 parking lots and 1 bays', out.getvalue())
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 1)
+        self.assertEqual(list(ParkingBay.objects.filter(is_occupied=True).values_list('code', flat=True)), ['A1'])
+
+    def test_occupancy_reads_counters_only(self):
+        self.check_in(self.vehicles[0])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/parking-lots/occupancy/').data
+        self.assertEqual((data['capacity'], data['occupied'], data['available']), (2, 1, 1))
+        self.assertFalse(any('carwash_parking"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_bulk_check_in_respects_capacity(self):
+        items = [
+            {'vehicle': v.pk, 'customer': v.customer_id, 'lot': self.lot.pk} for v in self.vehicles
+        ]
+        self.check_in(self.vehicles[0])
+        # Lot-less records don't need a space
+        items.append({'vehicle': self.vehicles[0].pk, 'customer': self.vehicles[0].customer_id})
+        response = self.client.post('/api/parking/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']], ['created', 'error', 'error', 'created']
+        )
+        self.assertEqual(response.data['results'][1]['errors'], {'lot': [f'{self.lot.name} is full']})
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.occupied, 2)
+        self.assertEqual(ParkingBay.objects.filter(is_occupied=True).count(), 2)
+        self.assertEqual(Parking.objects.filter(status='active', lot=self.lot).count(), 2)
+
+        response = self.client.post('/api/parking/bulk/', items[:2], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 2)
+
+
+class StatusTransitionTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.alice = Attendant.objects.create(
+            name="Alice", phone="+255300000001", email="alice@example.com", id_number="ATT-A"
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+        self.service = ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash
+        )
+
+    def test_start_writes_only_changed_columns(self):
+        ServiceRequest.objects.filter(pk=self.service.pk).update(notes="Check the mirrors")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f'/api/service-requests/{self.service.pk}/start_service/',
+                {'attendant': self.alice.pk}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['attendant']), ('in_progress', self.alice.pk))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "carwash_servicerequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status" = \'pending\'', updates[0].split('WHERE')[1])
+        self.assertNotIn('"notes"', updates[0])
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.notes, "Check the mirrors")
+
+    def test_start_resolves_attendant_not_user(self):
+        response = self.client.post(f'/api/service-requests/{self.service.pk}/start_service/')
+        self.assertEqual(response.data['attendant'], self.alice.pk)
+        self.assertEqual(scheduler.predicted_wait(self.service.pk), 0)
+
+        other = ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash
+        )
+        response = self.client.post(
+            f'/api/service-requests/{other.pk}/start_service/', {'attendant': 9999}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('attendant', response.data)
+
+    def test_stale_transition_conflicts(self):
+        stale = ServiceRequest.objects.get(pk=self.service.pk)
+        transition(self.service, 'completed', completion_time=timezone.now())
+        with self.assertRaises(TransitionConflict) as ctx:
+            transition(stale, 'in_progress', start_time=timezone.now())
+        self.assertEqual(ctx.exception.current, 'completed')
+        self.assertEqual(ServiceRequest.objects.get(pk=self.service.pk).start_time, None)
+
+    def test_losing_confirm_returns_409_and_counts_revenue_once(self):
+        payment = Payment.objects.create(customer=self.vehicle.customer, amount=8000, payment_method='cash')
+        stale = Payment.objects.get(pk=payment.pk)
+        self.assertEqual(self.client.post(f'/api/payments/{payment.pk}/confirm_payment/').status_code, 200)
+        with mock.patch.object(PaymentViewSet, 'get_object', return_value=stale):
+            response = self.client.post(f'/api/payments/{payment.pk}/confirm_payment/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'completed')
+        rollup = RevenueRollup.objects.get()
+        self.assertEqual((rollup.total_amount, rollup.transaction_count), (8000, 1))
+
+    def test_check_out_releases_lot_once(self):
+        lot = ParkingLot.objects.create(name="North", capacity=1)
+        ParkingBay.objects.create(lot=lot, code='A1')
+        check_in = self.client.post('/api/parking/', {
+            'vehicle': self.vehicle.pk, 'customer': self.vehicle.customer_id, 'lot': lot.pk,
+        }, format='json')
+        stale = Parking.objects.get(pk=check_in.data['id'])
+        response = self.client.post(
+            f"/api/parking/{check_in.data['id']}/check_out/", {'parking_fee': '1500'}, format='json'
+        )
+        self.assertEqual((response.data['status'], Decimal(response.data['parking_fee'])), ('completed', 1500))
+        with self.assertRaises(TransitionConflict):
+            transition(stale, 'completed', check_out_time=timezone.now())
+        lot.refresh_from_db()
+        self.assertEqual(lot.occupied, 0)
+        self.assertFalse(ParkingBay.objects.get().is_occupied)
+
+
+@skipUnless(replica_configured(), "needs a replica alias, e.g. --settings=config.settings_local_replica")
+class ReplicaRoutingTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.customer = make_customer(1)
+
+    def routed_reads(self, method, path, data=None):
+        """Aliases chosen for every read while serving the request"""
+        aliases = []
+        route = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            aliases.append(route(router, model, **hints))
+            return aliases[-1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return set(aliases), response
+
+    def pay(self):
+        return self.routed_reads('post', '/api/payments/', {
+            'customer': self.customer.pk, 'amount': '5000', 'payment_method': 'cash',
+        })
+
+    def test_reporting_actions_read_from_replica(self):
+        for path in ('/api/payments/daily_revenue/', '/api/payments/monthly_revenue/',
+                     '/api/parking/duration_stats/', f'/api/customers/{self.customer.pk}/summary/'):
+            self.assertEqual(self.routed_reads('get', path)[0], {REPLICA_ALIAS}, path)
+
+    def test_plain_reads_and_writes_stay_on_primary(self):
+        self.assertEqual(self.routed_reads('get', '/api/payments/')[0], {DEFAULT_DB_ALIAS})
+        self.assertEqual(self.pay()[0], {DEFAULT_DB_ALIAS})
+
+    def test_client_reads_its_own_writes(self):
+        _, response = self.pay()
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.routed_reads('get', '/api/payments/daily_revenue/')[0], {DEFAULT_DB_ALIAS})
+
+        self.client.cookies[STICKY_COOKIE] = '0'
+        self.assertEqual(self.routed_reads('get', '/api/payments/daily_revenue/')[0], {REPLICA_ALIAS})
+
+
+class AsyncReadTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+        self.customer = self.vehicle.customer
+        for _ in range(12):
+            ServiceRequest.objects.create(vehicle=self.vehicle, customer=self.customer, service_type=wash)
+        Payment.objects.create(customer=self.customer, amount=4000, payment_method='cash', status='completed')
+
+    def drf_json(self, path):
+        response = self.client.get(path + ('&' if '?' in path else '?') + 'format=json')
+        self.assertIsInstance(response, Response)
+        data = response.json()
+        if isinstance(data, dict):
+            for link in ('next', 'previous'):
+                if data.get(link):
+                    data[link] = remove_query_param(data[link], 'format')
+        return data
+
+    def test_async_responses_match_drf(self):
+        for path in (
+            '/api/service-requests/', '/api/service-requests/?page=2', '/api/service-requests/pending/',
+            '/api/parking/active/', f'/api/vehicles/?customer_id={self.customer.pk}',
+            '/api/payments/?status=completed', f'/api/customers/{self.customer.pk}/summary/',
+            '/api/payments/daily_revenue/', '/api/payments/monthly_revenue/',
+        ):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertNotIsInstance(response, Response, path)
+            self.assertEqual(response.json(), self.drf_json(path), path)
+
+    def test_async_list_honours_validators(self):
+        response = self.client.get('/api/service-requests/pending/')
+        self.assertNotIsInstance(response, Response)
+        self.assertIn('Last-Modified', response)
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get('/api/service-requests/pending/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_unhandled_cases_fall_back_to_drf(self):
+        self.assertEqual(self.client.get('/api/service-requests/?page=9').status_code, 404)
+        self.assertEqual(self.client.get('/api/customers/999/summary/').status_code, 404)
+        response = self.client.get('/api/service-requests/?pagination=cursor')
+        self.assertIsInstance(response, Response)
+
+    def test_permissions_match_drf(self):
+        with mock.patch.object(ServiceRequestViewSet, 'permission_classes', [IsAuthenticated]):
+            for path in ('/api/service-requests/', '/api/service-requests/pending/', '/api/service-requests/?page=9'):
+                response = self.client.get(path)
+                drf = self.client.get(path + ('&' if '?' in path else '?') + 'format=json')
+                self.assertEqual(response.status_code, drf.status_code, path)
+                self.assertEqual(response.json(), drf.json(), path)
+
+            self.client.force_authenticate(User.objects.create_user('clerk'))
+            response = self.client.get('/api/service-requests/pending/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIsInstance(response, Response)
+
+    def test_summary_checks_object_permissions(self):
+        denied = self.customer.pk
+
+        class NotThisCustomer(BasePermission):
+            def has_object_permission(self, request, view, obj):
+                return obj.pk != denied
+
+        path = f'/api/customers/{self.customer.pk}/summary/'
+        with mock.patch.object(CustomerViewSet, 'permission_classes', [NotThisCustomer]):
+            response = self.client.get(path)
+            drf = self.client.get(path + '?format=json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), drf.json())
+        self.assertEqual(self.client.get('/api/customers/abc/summary/').status_code, 404)
+
+    def test_throttles_count_each_request_once(self):
+        class OneRequest(BaseThrottle):
+            seen = []
+
+            def allow_request(self, request, view):
+                self.seen.append(request.path)
+                return len(self.seen) == 1
+
+            def wait(self):
+                return 60
+
+        with mock.patch.object(ServiceRequestViewSet, 'throttle_classes', [OneRequest]):
+            # An out-of-range page falls back to the DRF action without a second check
+            self.assertEqual(self.client.get('/api/service-requests/?page=9').status_code, 404)
+            response = self.client.get('/api/service-requests/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(len(OneRequest.seen), 2)
+
+    async def test_concurrent_async_reads(self):
+        client = AsyncClient()
+        responses = await asyncio.gather(*(
+            client.get(path) for path in (
+                '/api/service-requests/', '/api/service-requests/pending/',
+                '/api/payments/daily_revenue/', '/api/customers/',
+            )
+        ))
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+
+
+class CustomerCountersTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.customer = make_customer(1)
+        self.vehicle = make_vehicle(self.customer, 1)
+
+    def counters(self):
+        self.customer.refresh_from_db()
+        self.vehicle.refresh_from_db()
+        return (
+            self.customer.vehicle_count, self.customer.visit_count, self.customer.lifetime_spend,
+            self.vehicle.visit_count, self.vehicle.lifetime_spend,
+        )
+
+    def visit(self):
+        response = self.client.post('/api/service-requests/', {
+            'vehicle': self.vehicle.pk, 'customer': self.customer.pk, 'service_type': self.wash.pk,
+        }, format='json')
+        return ServiceRequest.objects.get(pk=response.data['id'])
+
+    def test_counters_follow_visits_and_payments(self):
+        make_vehicle(self.customer, 2)
+        service = self.visit()
+        Parking.objects.create(vehicle=self.vehicle, customer=self.customer)
+        payment = Payment.objects.create(
+            customer=self.customer, service_request=service, amount=6000, payment_method='cash'
+        )
+        self.assertEqual(self.counters(), (2, 2, 0, 2, 0))
+        self.assertIsNotNone(self.customer.last_visit)
+
+        self.client.post(f'/api/payments/{payment.pk}/confirm_payment/')
+        self.assertEqual(self.counters(), (2, 2, 6000, 2, 6000))
+        self.client.post(f'/api/payments/{payment.pk}/refund/')
+        self.assertEqual(self.counters(), (2, 2, 0, 2, 0))
+
+        self.client.delete(f'/api/service-requests/{service.pk}/')
+        self.assertEqual(self.counters(), (2, 1, 0, 1, 0))
+
+    def test_bulk_creates_count_once_per_row(self):
+        items = [
+            {'vehicle': self.vehicle.pk, 'customer': self.customer.pk, 'service_type': self.wash.pk}
+        ] * 3
+        self.assertEqual(self.client.post('/api/service-requests/bulk/', items, format='json').status_code, 201)
+        self.assertEqual(self.counters()[1], 3)
+
+    def test_full_save_keeps_counters(self):
+        stale = Customer.objects.get(pk=self.customer.pk)
+        self.visit()
+        response = self.client.patch(f'/api/customers/{stale.pk}/', {'address': 'Arusha'}, format='json')
+        self.assertEqual(response.data['visit_count'], 1)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(self.counters()[1], 1)
+
+    def test_summary_reads_counters(self):
+        self.visit()
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(f'/api/customers/{self.customer.pk}/summary/?format=json').data
+        self.assertEqual((data['vehicles_count'], data['visit_count']), (1, 1))
+        self.assertFalse(any('SUM(' in q['sql'] or 'COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_reconcile_command_fixes_drift(self):
+        self.visit()
+        Payment.objects.create(customer=self.customer, amount=2500, payment_method='card', status='completed')
+        expected = self.counters()
+        Customer.objects.update(visit_count=40, lifetime_spend=1, last_visit=None)
+        Vehicle.objects.update(visit_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('Found drift in 1 customers and 1 vehicles', out.getvalue())
+        self.assertEqual(self.counters()[1], 40)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), expected)
+        self.assertIsNotNone(self.customer.last_visit)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Fixed drift in 0 customers and 0 vehicles', out.getvalue())
+
+    def test_reconcile_command_recounts_queues(self):
+        self.visit()
+        Parking.objects.create(vehicle=self.vehicle, customer=self.customer)
+        QueueCounter.objects.update(size=5)
+        ServiceRequest.objects.update(status='completed')
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('Found drift in 2 queue counters', out.getvalue())
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(QueueCounter.sizes(), {'pending_service_requests': 0, 'active_parking': 1})
+
+    def test_import_moving_vehicle_recounts_owners(self):
+        other = make_customer(2)
+        rows = [{
+            'customer_id_number': other.id_number, 'plate_number': self.vehicle.plate_number,
+            'vehicle_type': 'suv', 'color': 'red', 'make': 'Nissan', 'model': 'X-Trail', 'year': 2018,
+        }]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write(json.dumps(rows[0]) + '\n')
+        self.addCleanup(os.unlink, f.name)
+        call_command('import_records', 'vehicles', f.name, stdout=StringIO(), stderr=StringIO())
+        other.refresh_from_db()
+        self.assertEqual((self.counters()[0], other.vehicle_count), (0, 1))
+
+
+class FastListTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        attendant = Attendant.objects.create(
+            name="Ana\u2028Lee \u00e9", phone="+255222222222", email="ana@example.com", id_number="ATT0002"
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+        customer = self.vehicle.customer
+        lot = ParkingLot.objects.create(name="North", capacity=5)
+        services, parkings = [], []
+        for n in range(12):
+            services.append(ServiceRequest.objects.create(
+                vehicle=self.vehicle, customer=customer, service_type=wash,
+                attendant=attendant if n % 2 else None, notes='line\nbreak "quoted"'
+            ))
+            parkings.append(Parking.objects.create(
+                vehicle=self.vehicle, customer=customer, lot=lot if n % 3 else None,
+                parking_fee=Decimal('1.5')
+            ))
+        for n in range(12):
+            Payment.objects.create(
+                customer=customer, amount=Decimal('1234.5'), payment_method='cash',
+                service_request=services[n] if n % 3 == 1 else None,
+                parking=parkings[n] if n % 3 == 2 else None,
+            )
+
+    def assertSameAsSerializer(self, path):
+        fast = self.client.get(path)
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(path)
+        self.assertEqual(fast.status_code, 200, path)
+        self.assertEqual(fast.content, slow.content, path)
+        return fast
+
+    def test_list_output_is_byte_identical(self):
+        for path in (
+            '/api/service-requests/', '/api/service-requests/?page=2', '/api/service-requests/pending/',
+            '/api/parking/', '/api/parking/active/', '/api/payments/', '/api/payments/?page=2',
+            '/api/customers/', '/api/vehicles/', '/api/payments/?format=json',
+            '/api/service-requests/?format=json&ordering=-id',
+        ):
+            self.assertSameAsSerializer(path)
+
+    def test_null_relations_match_serializer(self):
+        rows = self.assertSameAsSerializer('/api/payments/?format=json').json()['results']
+        details = [row['service_detail'] for row in rows if row['service_detail']]
+        self.assertTrue(any('attendant_name' not in detail for detail in details))
+        self.assertTrue(any(row['service_detail'] is None for row in rows))
+
+    def test_unmappable_serializers_have_no_plan(self):
+        self.assertIsNone(row_plan(ParkingLotSerializer))
+        self.assertIsNotNone(row_plan(PaymentSerializer))
+
+    def test_payment_list_skips_serializer(self):
+        with mock.patch.object(PaymentSerializer, 'to_representation', side_effect=AssertionError):
+            for path in ('/api/payments/', '/api/payments/?format=json'):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(path).status_code, 200)
+                # validators, count, page
+                self.assertEqual(len(ctx.captured_queries), 3)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'a\x00\x1f\u2028\u2029\u00e9 "q" \\ /', 'when': timezone.now(),
+            'day': timezone.localdate(), 'amount': Decimal('1.50'), 'rows': [1, 2.5, None, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = 'application/json; indent=2'
+        self.assertEqual(
+            FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented)
+        )
+
+
+class SparseFieldsTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+        self.customer = self.vehicle.customer
+        service = ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.customer, service_type=self.wash
+        )
+        self.payment = Payment.objects.create(
+            customer=self.customer, service_request=service, amount=5000, payment_method='cash'
+        )
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_fields_limit_output_and_columns(self):
+        for path in ('/api/payments/?fields=id,amount,status', '/api/payments/?fields=id,amount,status&format=json'):
+            response, queries = self.get(path)
+            self.assertEqual(response.json()['results'], [{'id': self.payment.pk, 'amount': '5000.00', 'status': 'pending'}])
+            for sql in queries:
+                self.assertNotIn('JOIN', sql, path)
+            self.assertNotIn('notes', queries[-1], path)
+
+    def test_expand_nests_related_object(self):
+        customer = self.client.get(f'/api/customers/{self.customer.pk}/').json()
+        for path in (
+            '/api/payments/?fields=id,customer&expand=customer',
+            '/api/payments/?fields=id,customer&expand=customer&format=json',
+            f'/api/payments/{self.payment.pk}/?fields=id,customer&expand=customer',
+        ):
+            response, queries = self.get(path)
+            data = response.json()
+            rows = data['results'] if 'results' in data else [data]
+            self.assertEqual(rows, [{'id': self.payment.pk, 'customer': customer}], path)
+            self.assertNotIn('carwash_servicerequest', queries[-1], path)
+
+    def test_sparse_rows_match_serializer(self):
+        for path in (
+            '/api/service-requests/?fields=id,vehicle,service_name,status&expand=vehicle',
+            '/api/service-requests/?fields=id,attendant_name&format=json',
+            '/api/payments/?fields=amount,service_detail&expand=service_request',
+        ):
+            fast = self.client.get(path)
+            with override_settings(FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(path)
+            self.assertEqual(fast.content, slow.content, path)
+
+    def test_sparse_detail_needs_no_extra_queries(self):
+        response, queries = self.get(
+            f'/api/service-requests/{self.payment.service_request_id}/?fields=id,vehicle_plate'
+        )
+        self.assertEqual(response.json(), {'id': self.payment.service_request_id, 'vehicle_plate': 'TZA-0001-AB'})
+        # validators and the row
+        self.assertEqual(len(queries), 2)
+
+    def test_unknown_names_are_rejected(self):
+        for path in ('/api/payments/?fields=id,bogus', '/api/payments/?expand=amount', '/api/services/?expand=name'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+
+    def test_writes_ignore_fields(self):
+        response = self.client.post('/api/service-requests/?fields=id', {
+            'vehicle': self.vehicle.pk, 'customer': self.customer.pk, 'service_type': self.wash.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('status', response.data)
+
+
+class ProfilingTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        vehicle = make_vehicle(make_customer(1), 1)
+        for _ in range(3):
+            ServiceRequest.objects.create(vehicle=vehicle, customer=vehicle.customer, service_type=wash)
+
+    def timings(self, response):
+        return {
+            metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')
+        }
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, SLOW_REQUEST_MS=60000)
+    def test_sampled_request_reports_server_timing(self):
+        for path in ('/api/service-requests/', '/api/service-requests/?format=json'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = APIClient().get(path)
+            timings = self.timings(response)
+            self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timings['db'], path)
+            self.assertIn('serialize', timings, path)
+            self.assertIn('render', timings, path)
+            self.assertTrue(timings['total'].endswith('desc="servicerequest-list"'), path)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0, SLOW_REQUEST_MS=60000)
+    def test_unsampled_request_has_no_header(self):
+        self.assertNotIn('Server-Timing', APIClient().get('/api/service-requests/'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('config.profiling', 'WARNING') as logs:
+            APIClient().get('/api/service-requests/pending/?format=json')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'slow_request')
+        self.assertEqual(record['status'], 200)
+        self.assertTrue(record['profiled'])
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('carwash_servicerequest', record['top_queries'][0]['sql'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, SLOW_REQUEST_MS=60000)
+    async def test_async_request_records_queries(self):
+        response = await AsyncClient().get('/api/service-requests/')
+        self.assertNotIn('desc="0 queries"', self.timings(response)['db'])
+
+
+
+class MetricsTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.alice = Attendant.objects.create(
+            name="Alice", phone="+255300000001", email="alice@example.com", id_number="ATT-A"
+        )
+        self.vehicle = make_vehicle(make_customer(1), 1)
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+
+    def test_counts_requests_per_action(self):
+        service = ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash
+        )
+        self.client.post(f'/api/service-requests/{service.pk}/start_service/')
+        self.client.post(f'/api/service-requests/{service.pk}/start_service/')
+        self.client.get('/api/payments/daily_revenue/')
+        lines = self.scrape()
+
+        start = 'view="ServiceRequestViewSet",action="start_service",method="POST"'
+        self.assertIn(f'carwash_http_requests_total{{{start},status="200"}} 1', lines)
+        self.assertIn(f'carwash_http_requests_total{{{start},status="400"}} 1', lines)
+        self.assertIn(f'carwash_http_request_duration_seconds_count{{{start}}} 2', lines)
+        self.assertIn(f'carwash_http_request_duration_seconds_bucket{{{start},le="+Inf"}} 2', lines)
+        self.assertIn(
+            'carwash_http_requests_total{view="PaymentViewSet",action="daily_revenue",'
+            'method="GET",status="200"} 1', lines
+        )
+        self.assertIn('# TYPE carwash_http_request_duration_seconds histogram', lines)
+
+    def test_business_gauges_read_counters(self):
+        ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash, attendant=self.alice
+        )
+        # Unassigned requests are pending too
+        ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash
+        )
+        lot = ParkingLot.objects.create(name="North", capacity=2)
+        self.client.post('/api/parking/', {
+            'vehicle': self.vehicle.pk, 'customer': self.vehicle.customer_id, 'lot': lot.pk,
+        }, format='json')
+        # Vehicles parked outside any lot count as parked
+        self.client.post('/api/parking/', {
+            'vehicle': self.vehicle.pk, 'customer': self.vehicle.customer_id,
+        }, format='json')
+        Payment.objects.create(
+            customer=self.vehicle.customer, amount=Decimal('1500.50'), payment_method='cash', status='completed'
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            lines = self.scrape()
+        self.assertIn('carwash_pending_queue_depth 2', lines)
+        self.assertIn('carwash_parked_vehicles 2', lines)
+        self.assertIn('carwash_revenue_today{payment_method="cash"} 1500.5', lines)
+        self.assertIn('carwash_transactions_today{payment_method="cash"} 1', lines)
+        for table in ('carwash_payment"', 'carwash_parking"', 'carwash_servicerequest"'):
+            self.assertFalse(any(table in q['sql'] for q in ctx.captured_queries), table)
+
+    def test_queue_gauges_follow_transitions_deletes_and_bulk_creates(self):
+        started, cancelled = (
+            ServiceRequest.objects.create(
+                vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash
+            )
+            for _ in range(2)
+        )
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash),
+            ServiceRequest(
+                vehicle=self.vehicle, customer=self.vehicle.customer, service_type=self.wash, status='completed'
+            ),
+        ])
+        self.client.post(f'/api/service-requests/{started.pk}/start_service/')
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        parked = Parking.objects.create(vehicle=self.vehicle, customer=self.vehicle.customer)
+        Parking.objects.create(vehicle=self.vehicle, customer=self.vehicle.customer)
+        self.client.post(f'/api/parking/{parked.pk}/check_out/')
+        Parking.objects.filter(status='active').delete()
+        self.assertEqual(QueueCounter.sizes(), {'pending_service_requests': 1, 'active_parking': 0})
+        lines = self.scrape()
+        self.assertIn('carwash_pending_queue_depth 1', lines)
+        self.assertIn('carwash_parked_vehicles 0', lines)
+
+    def test_sums_processes_sharing_metrics_dir(self):
+        other = metrics.Registry()
+        labels = (('view', 'PaymentViewSet'), ('action', 'list'), ('method', 'GET'))
+        other.inc(metrics.REQUESTS, labels + (('status', '200'),), 3)
+        other.observe(metrics.LATENCY, labels, 20.0)
+        self.client.get('/api/payments/')
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other.flush(directory)
+            lines = self.scrape()
+            self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertIn(
+            'carwash_http_requests_total{view="PaymentViewSet",action="list",method="GET",status="200"} 4', lines
+        )
+        self.assertIn(
+            'carwash_http_request_duration_seconds_bucket{view="PaymentViewSet",action="list",'
+            'method="GET",le="10.0"} 1', lines
+        )
+        self.assertIn(
+            'carwash_http_request_duration_seconds_count{view="PaymentViewSet",action="list",method="GET"} 2', lines
+        )
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+
+class GenerateDataTest(CarwashTestCase):
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_data', '--customers', '20', '--service-requests', '300', '--parking', '120',
+                     '--days', '30', '--batch-size', '64', '--seed', '7', *args, stdout=out)
+        return out.getvalue()
+
+    def test_generates_consistent_history(self):
+        output = self.generate()
+        self.assertIn('300 service requests, 120 parking records', output)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(ServiceRequest.objects.count(), 300)
+        self.assertEqual(Parking.objects.count(), 120)
+        self.assertTrue(ServiceType.objects.exists() and Attendant.objects.exists())
+
+        # Timestamps keep their historical values instead of the insert time
+        oldest = ServiceRequest.objects.order_by('request_date').first()
+        self.assertLess(oldest.request_date, timezone.now() - timedelta(days=7))
+        self.assertEqual(oldest.created_at, oldest.request_date)
+        self.assertFalse(ServiceRequest.objects.filter(status='completed', completion_time__isnull=True).exists())
+        self.assertFalse(Parking.objects.filter(check_in_time__gt=timezone.now()).exists())
+        self.assertFalse(Payment.objects.exclude(
+            service_request__status='completed').exclude(parking__status='completed').exists())
+
+        # Counters and rollups were maintained by the bulk inserts
+        self.assertEqual(reconcile(dry_run=True), (0, 0))
+        totals = list(RevenueRollup.objects.order_by('date', 'payment_method')
+                      .values_list('date', 'payment_method', 'total_amount', 'transaction_count'))
+        RevenueRollup.rebuild()
+        self.assertEqual(totals, list(RevenueRollup.objects.order_by('date', 'payment_method')
+                                      .values_list('date', 'payment_method', 'total_amount', 'transaction_count')))
+
+    def test_reruns_continue_numbering(self):
+        self.generate()
+        vehicles = Vehicle.objects.count()
+        self.generate()
+        self.assertEqual(Customer.objects.count(), 40)
+        self.assertGreater(Vehicle.objects.count(), vehicles)
+        self.assertEqual(ServiceRequest.objects.count(), 600)
+
+
+class SearchTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.amani = Customer.objects.create(
+            name="Amani Mushi", phone="0712 345 678", email="amani@example.com",
+            id_number="CUS-AM", address="Dar es Salaam"
+        )
+        self.elia = Customer.objects.create(
+            name="Élia O'Brien", phone="+255 754-000-111", email="elia@example.com",
+            id_number="CUS-EO", address="Arusha"
+        )
+        self.car = Vehicle.objects.create(
+            customer=self.amani, plate_number="TZA-1234-AB", vehicle_type="sedan",
+            color="white", make="Toyota", model="Corolla", year=2020
+        )
+        self.van = Vehicle.objects.create(
+            customer=self.elia, plate_number="T 812 TZA", vehicle_type="van",
+            color="blue", make="Nissan", model="Caravan", year=2016
+        )
+
+    def search(self, q, **params):
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(row['type'], row['id'], row['match']) for row in response.data['results']]
+
+    def test_keys_are_normalized_on_every_write(self):
+        self.assertEqual(self.car.plate_key, 'TZA1234AB')
+        self.assertEqual((self.amani.phone_key, self.amani.name_key), ('255712345678', 'amani mushi'))
+        self.assertEqual(self.elia.name_key, 'elia o brien')
+
+        self.client.patch(f'/api/customers/{self.amani.pk}/', {'phone': '+255 713 000 000'}, format='json')
+        self.amani.refresh_from_db()
+        self.assertEqual(self.amani.phone_key, '255713000000')
+        Vehicle.objects.bulk_create([Vehicle(
+            customer=self.amani, plate_number='t 900 xyz', vehicle_type='suv',
+            color='red', make='Honda', model='CR-V', year=2019,
+        )])
+        self.assertTrue(Vehicle.objects.filter(plate_key='T900XYZ').exists())
+
+    def test_plate_matches_however_typed(self):
+        for typed in ('tza 1234ab', 'TZA-1234-AB', 'tza12'):
+            self.assertEqual(self.search(typed)[0], ('vehicle', self.car.pk, 'plate'), typed)
+        # Prefix matches rank before substring ones
+        self.assertEqual(self.search('tza'), [
+            ('vehicle', self.car.pk, 'plate'), ('vehicle', self.van.pk, 'plate'),
+        ])
+        self.assertEqual(self.search('4ab'), [('vehicle', self.car.pk, 'plate')])
+
+    def test_phone_and_name_matches(self):
+        self.assertEqual(self.search('0712 34'), [('customer', self.amani.pk, 'phone')])
+        self.assertEqual(self.search('+255 754'), [('customer', self.elia.pk, 'phone')])
+        self.assertEqual(self.search('mush'), [('customer', self.amani.pk, 'name')])
+        self.assertEqual(self.search('elia'), [('customer', self.elia.pk, 'name')])
+
+    def test_limit_stops_at_first_step(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self.search('tza', limit=1)), 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('"plate_key" >=', ctx.captured_queries[0]['sql'])
+
+    def test_rejects_bad_parameters(self):
+        self.assertIn('q', self.client.get('/api/search/', {'q': ' -'}).data)
+        self.assertIn('limit', self.client.get('/api/search/', {'q': 'tza', 'limit': 0}).data)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'tza', 'limit': 'x'}).status_code, 400)
+
+    def test_list_search_uses_keys(self):
+        data = self.client.get('/api/vehicles/', {'search': 'TZA1234AB'}).data
+        self.assertEqual([row['id'] for row in data['results']], [self.car.pk])
+        data = self.client.get('/api/customers/', {'search': '255754'}).data
+        self.assertEqual([row['id'] for row in data['results']], [self.elia.pk])
+
+
+class GateLookupTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.customer = make_customer(1)
+        self.vehicle = make_vehicle(self.customer, 1)
+
+    def lookup(self, plate, expected_status=200):
+        response = self.client.get('/api/gate/', {'plate': plate})
+        self.assertEqual(response.status_code, expected_status, response.data)
+        return response.data
+
+    def test_second_lookup_is_served_from_cache(self):
+        with self.assertNumQueries(3):
+            first = self.lookup('TZA-0001-AB')
+        with self.assertNumQueries(0):
+            second = self.lookup('tza 0001 ab')
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['vehicle']['id'], self.vehicle.pk)
+        self.assertEqual(second['customer']['name'], 'Customer 1')
+        self.assertIsNone(second['active_parking'])
+        self.assertEqual(second['open_service_requests'], [])
+
+    def test_check_in_and_check_out_invalidate(self):
+        self.lookup('TZA-0001-AB')
+        parking = self.client.post('/api/parking/', {
+            'vehicle': self.vehicle.pk, 'customer': self.customer.pk,
+        }, format='json').data
+        record = self.lookup('TZA-0001-AB')
+        self.assertFalse(record['cached'])
+        self.assertEqual(record['active_parking']['id'], parking['id'])
+
+        self.client.post(f"/api/parking/{parking['id']}/check_out/")
+        record = self.lookup('TZA-0001-AB')
+        self.assertFalse(record['cached'])
+        self.assertIsNone(record['active_parking'])
+
+    def test_owner_and_service_request_changes_invalidate(self):
+        self.lookup('TZA-0001-AB')
+        self.customer.name = 'Renamed'
+        self.customer.save()
+        self.assertEqual(self.lookup('TZA-0001-AB')['customer']['name'], 'Renamed')
+
+        ServiceRequest.objects.bulk_create([ServiceRequest(
+            vehicle=self.vehicle, customer=self.customer, service_type=self.wash
+        )])
+        record = self.lookup('TZA-0001-AB')
+        self.assertFalse(record['cached'])
+        self.assertEqual([row['status'] for row in record['open_service_requests']], ['pending'])
+
+    def test_unknown_plate_is_cached_until_registered(self):
+        self.assertFalse(self.lookup('T 999 XYZ', 404)['cached'])
+        self.assertTrue(self.lookup('T 999 XYZ', 404)['cached'])
+        self.client.post('/api/vehicles/', {
+            'customer': self.customer.pk, 'plate_number': 'T 999 XYZ', 'vehicle_type': 'suv',
+            'color': 'red', 'make': 'Honda', 'model': 'CR-V', 'year': 2019,
+        }, format='json')
+        self.assertEqual(self.lookup('T999XYZ')['vehicle']['plate_number'], 'T 999 XYZ')
+        self.assertIn('plate', self.lookup(' - ', 400))
+
+    @override_settings(GATE_CACHE_SIZE=2)
+    def test_lru_eviction_and_stats(self):
+        for n in (2, 3):
+            make_vehicle(self.customer, n)
+        self.lookup('TZA-0001-AB')
+        self.lookup('TZA-0002-AB')
+        self.lookup('TZA-0001-AB')
+        self.lookup('TZA-0003-AB')  # evicts 0002, the least recently used
+        self.assertTrue(self.lookup('TZA-0001-AB')['cached'])
+        self.assertFalse(self.lookup('TZA-0002-AB')['cached'])
+
+        stats = self.client.get('/api/gate/cache/').data
+        self.assertEqual(
+            {key: stats[key] for key in ('size', 'max_size', 'hits', 'misses', 'evictions')},
+            {'size': 2, 'max_size': 2, 'hits': 2, 'misses': 4, 'evictions': 2},
+        )
+        self.assertEqual(stats['hit_rate'], round(2 / 6, 4))
+        lines = self.client.get('/metrics').content.decode().splitlines()
+        self.assertIn('carwash_gate_cache_hits_total 2', lines)
+        self.assertIn('carwash_gate_cache_evictions_total 2', lines)
+        self.assertIn('# TYPE carwash_gate_cache_misses_total counter', lines)
+
+    def test_record_resolved_across_an_invalidation_is_not_kept(self):
+        def resolver(key):
+            cache.invalidate(customer_ids=[self.customer.pk])
+            return None
+        cache = GateCache(resolver=resolver)
+        self.assertEqual(cache.lookup('TZA-0001-AB'), (None, False))
+        self.assertEqual(cache.stats()['size'], 0)
+
+
+class ArchiveTest(CarwashTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.wash = ServiceType.objects.create(
+            name="Quick Wash", description="Exterior", base_price=5000, estimated_time_minutes=10
+        )
+        self.customer = make_customer(1)
+        self.vehicle = make_vehicle(self.customer, 1)
+
+        self.done = self.service('completed', days=400, payment='completed')
+        self.unpaid = self.service('completed', days=400, payment='pending')
+        self.pending = self.service('pending', days=400)
+        self.recent = self.service('completed', days=10, payment='completed')
+        self.parked = self.parking('completed', days=400)
+        self.still_parked = self.parking('active', days=400)
+        self.standalone = self.payment('refunded', days=400)
+        # Dates moved with update() bypass the counters: start from a consistent state
+        reconcile()
+        RevenueRollup.rebuild()
+
+    def age(self, instance, field, days):
+        type(instance).objects.filter(pk=instance.pk).update(**{field: timezone.now() - timedelta(days=days)})
+
+    def payment(self, status, days, **links):
+        payment = Payment.objects.create(
+            customer=self.customer, amount=7000, payment_method='cash', status=status, **links
+        )
+        self.age(payment, 'payment_date', days)
+        return payment
+
+    def service(self, status, days, payment=None):
+        service = ServiceRequest.objects.create(
+            vehicle=self.vehicle, customer=self.customer, service_type=self.wash, status=status
+        )
+        self.age(service, 'request_date', days)
+        if payment:
+            self.payment(payment, days, service_request=service)
+        return service
+
+    def parking(self, status, days):
+        parking = Parking.objects.create(vehicle=self.vehicle, customer=self.customer, status=status)
+        self.age(parking, 'check_in_time', days)
+        return parking
+
+    def archive(self, **options):
+        call_command('archive_records', stdout=StringIO(), **options)
+
+    def export(self, path, **params):
+        response = self.client.get(path, {'export_format': 'ndjson', **params})
+        return [json.loads(line)['id'] for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_moves_closed_rows_with_their_payments(self):
+        counters = Customer.objects.values_list('visit_count', 'lifetime_spend', 'last_visit').get()
+        rollups = list(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount'))
+        self.archive(batch_size=1)
+
+        self.assertEqual(set(ArchivedServiceRequest.objects.values_list('pk', flat=True)), {self.done.pk})
+        self.assertEqual(
+            set(ServiceRequest.objects.values_list('pk', flat=True)),
+            {self.unpaid.pk, self.pending.pk, self.recent.pk},
+        )
+        self.assertEqual(list(ArchivedParking.objects.values_list('pk', flat=True)), [self.parked.pk])
+        self.assertTrue(Parking.objects.filter(pk=self.still_parked.pk).exists())
+        archived_payments = ArchivedPayment.objects.order_by('pk')
+        self.assertEqual(
+            [(payment.service_request_id, payment.status) for payment in archived_payments],
+            [(self.done.pk, 'completed'), (None, 'refunded')],
+        )
+        self.assertEqual(Payment.objects.count(), 2)
+
+        # Archived rows still count
+        self.assertEqual(
+            Customer.objects.values_list('visit_count', 'lifetime_spend', 'last_visit').get(), counters
+        )
+        self.assertEqual(reconcile(dry_run=True), (0, 0))
+        RevenueRollup.rebuild()
+        self.assertEqual(list(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount')), rollups)
+
+    def test_payment_of_service_and_parking_moves_both(self):
+        service = self.service('completed', days=400)
+        parking = self.parking('completed', days=400)
+        payment = self.payment('completed', days=400, service_request=service, parking=parking)
+        open_service = self.service('completed', days=400)
+        open_parking = self.parking('active', days=400)
+        self.payment('completed', days=400, service_request=open_service, parking=open_parking)
+        reconcile()
+        RevenueRollup.rebuild()
+        counters = Customer.objects.values_list('visit_count', 'lifetime_spend').get()
+        rollups = list(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount'))
+
+        self.archive()
+        archived = ArchivedPayment.objects.get(pk=payment.pk)
+        self.assertEqual((archived.service_request_id, archived.parking_id), (service.pk, parking.pk))
+        self.assertFalse(ServiceRequest.objects.filter(pk=service.pk).exists())
+        self.assertFalse(Parking.objects.filter(pk=parking.pk).exists())
+        # The parking record of the other pair is still active: all three stay
+        self.assertTrue(ServiceRequest.objects.filter(pk=open_service.pk).exists())
+        self.assertTrue(Payment.objects.filter(parking=open_parking).exists())
+
+        self.assertEqual(Customer.objects.values_list('visit_count', 'lifetime_spend').get(), counters)
+        self.assertEqual(list(RevenueRollup.objects.values_list('date', 'payment_method', 'total_amount')), rollups)
+        self.assertEqual(reconcile(dry_run=True), (0, 0))
+
+    def test_batches_resume_where_they_stopped(self):
+        output = StringIO()
+        call_command('archive_records', dry_run=True, stdout=output)
+        self.assertIn('Service Requests: 1 to archive', output.getvalue())
+        self.assertIn('Payments: 1 to archive', output.getvalue())
+        old = self.service('cancelled', days=500)
+        self.archive(batch_size=1, max_batches=1)
+        self.assertEqual(list(ArchivedServiceRequest.objects.values_list('pk', flat=True)), [old.pk])
+        self.archive(batch_size=1)
+        self.assertEqual(ArchivedServiceRequest.objects.count(), 2)
+        self.archive(retention_days=5)
+        self.assertFalse(ServiceRequest.objects.filter(pk=self.recent.pk).exists())
+
+    def test_exports_and_history_reach_into_archive(self):
+        self.archive()
+        self.assertEqual(
+            self.export('/api/service-requests/export/'),
+            [self.recent.pk, self.pending.pk, self.unpaid.pk, self.done.pk],
+        )
+        recent_start = (timezone.localdate() - timedelta(days=30)).isoformat()
+        self.assertEqual(self.export('/api/service-requests/export/', start_date=recent_start), [self.recent.pk])
+        self.assertEqual(self.export('/api/parking/export/', status='completed'), [self.parked.pk])
+        self.assertEqual(self.export('/api/payments/export/', status='refunded'), [self.standalone.pk])
+
+        history = self.client.get(f'/api/vehicles/{self.vehicle.pk}/service_history/').data['services']
+        self.assertEqual([row['id'] for row in history][-1], self.done.pk)
+        self.assertEqual(history[-1]['service_name'], 'Quick Wash')
+        history = self.client.get(
+            f'/api/vehicles/{self.vehicle.pk}/service_history/', {'start_date': recent_start}
+        ).data['services']
+        self.assertEqual([row['id'] for row in history], [self.recent.pk])
+        response = self.client.get(f'/api/vehicles/{self.vehicle.pk}/service_history/', {'end_date': 'x'})
+        self.assertEqual(response.status_code, 400)
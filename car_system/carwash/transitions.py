@@ -0,0 +1,57 @@
+"""
+Race-free status transitions
+
+A transition is a single guarded UPDATE ... WHERE pk=<pk> AND status=<seen>
+that writes only the changed columns. When another request has moved the
+row first the UPDATE matches nothing and TransitionConflict is raised, so
+two tablets pressing the same button cannot both succeed.
+
+post_save is sent with update_fields for the changed columns, so the
+revenue rollup, live feed and scheduler hooks in carwash.signals run exactly
+as they do for save().
+"""
+from django.db import router, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+
+class TransitionConflict(Exception):
+    """The row left the expected status before the UPDATE ran"""
+
+    def __init__(self, instance, expected, current):
+        self.instance = instance
+        self.expected = expected
+        self.current = current
+        super().__init__(
+            f'{instance._meta.verbose_name} {instance.pk} is no longer {expected}'
+            + (f' (now {current})' if current else '')
+        )
+
+
+def transition(instance, to_status, **changes):
+    """
+    Move instance from its loaded status to to_status, setting changes
+
+    The instance is updated in place and returned. Raises TransitionConflict
+    when the row's status changed since it was read.
+    """
+    model = type(instance)
+    expected = instance.status
+    values = {'status': to_status, **changes, 'updated_at': timezone.now()}
+    using = router.db_for_write(model, instance=instance)
+    with transaction.atomic(using=using):
+        updated = model._base_manager.using(using).filter(
+            pk=instance.pk, status=expected
+        ).update(**values)
+        if not updated:
+            current = model._base_manager.using(using).filter(
+                pk=instance.pk
+            ).values_list('status', flat=True).first()
+            raise TransitionConflict(instance, expected, current)
+        for field, value in values.items():
+            setattr(instance, field, value)
+        post_save.send(
+            sender=model, instance=instance, created=False,
+            update_fields=frozenset(values), raw=False, using=using
+        )
+    return instance
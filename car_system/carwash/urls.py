@@ -4,6 +4,7 @@ URL configuration for carwash app
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from .async_views import with_async_reads
 
 router = DefaultRouter()
 router.register(r'attendants', views.AttendantViewSet)
@@ -11,9 +12,14 @@ router.register(r'customers', views.CustomerViewSet)
 router.register(r'vehicles', views.VehicleViewSet)
 router.register(r'services', views.ServiceTypeViewSet)
 router.register(r'service-requests', views.ServiceRequestViewSet)
+router.register(r'parking-lots', views.ParkingLotViewSet)
 router.register(r'parking', views.ParkingViewSet)
 router.register(r'payments', views.PaymentViewSet)
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('live/queue/', views.live_queue, name='live-queue'),
+    path('search/', views.typeahead, name='typeahead'),
+    path('gate/', views.gate_lookup, name='gate-lookup'),
+    path('gate/cache/', views.gate_cache_stats, name='gate-cache'),
+    path('', include(with_async_reads(router.urls))),
 ]
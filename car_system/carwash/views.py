@@ -2,30 +2,451 @@
 Views for Smart Car Wash System API
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Sum, Count
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponseNotAllowed, StreamingHttpResponse
+from django.db.models import Q, Sum, Count, Max
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+import hashlib
+from itertools import chain
 
 from .models import (
     Attendant, Customer, Vehicle, ServiceType,
-    ServiceRequest, Parking, Payment
+    ServiceRequest, ParkingLot, Parking, Payment, RevenueRollup
 )
 from .serializers import (
     AttendantSerializer, CustomerSerializer, VehicleSerializer,
-    ServiceTypeSerializer, ServiceRequestSerializer,
-    ParkingSerializer, PaymentSerializer
+    ServiceTypeSerializer, ServiceRequestSerializer, ArchivedServiceRequestSerializer,
+    ParkingLotSerializer, ParkingSerializer, PaymentSerializer
 )
+from .archive import ARCHIVES, archived_rows
+from .exports import EXPORT_FORMATS, astream_rows, stream_rows
+from .fastpath import row_plan
+from .fields import name_key, plate_key
+from .gate import gate_cache
+from .live import AsyncStream, live_feed, publish_changes, stream as live_stream
+from .pagination import CursorOrPageNumberPagination
+from .reference import attendant_directory, service_catalog
+from .routing import replica_read
+from .scheduling import scheduler
+from .search import typeahead as search_typeahead
+from .stats import parking_duration_stats
+from .transitions import TransitionConflict, transition
+
+# Relations read by each serializer, loaded up front to avoid N+1 queries
+SERVICE_REQUEST_RELATED = ('vehicle', 'customer', 'attendant', 'service_type')
+PARKING_RELATED = ('vehicle', 'customer', 'attendant', 'bay')
+PAYMENT_RELATED = (
+    'customer',
+    *(f'service_request__{name}' for name in SERVICE_REQUEST_RELATED),
+    *(f'parking__{name}' for name in PARKING_RELATED),
+)
+
 
+def date_range_filters(params, field):
+    """
+    Filters for optional `start_date`/`end_date` (YYYY-MM-DD, inclusive) params.
+
+    Bounds are compared against the raw datetime column so the filter stays
+    index-friendly. Raises ValueError naming the parameter on bad input.
+    """
+    filters = {}
+    for param, lookup, offset in (('start_date', 'gte', 0), ('end_date', 'lt', 1)):
+        if params.get(param):
+            value = parse_date(params[param])
+            if value is None:
+                raise ValueError(f'{param} must be a date in YYYY-MM-DD format')
+            day_start = datetime.combine(value + timedelta(days=offset), time.min)
+            filters[f'{field}__{lookup}'] = timezone.make_aware(day_start)
+    return filters
+
+
+def reserve_spaces(lot, count):
+    """Reserve spaces in a lot for check-ins, rejecting them when it is full"""
+    try:
+        return lot.allocate(count)
+    except ParkingLot.Full as exc:
+        raise ValidationError({'lot': [str(exc)]})
+
+
+def conflict_response(exc):
+    """409 for a transition that lost the race to another request"""
+    return Response(
+        {'error': str(exc), 'status': exc.current},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+class BulkCreateMixin:
+    """Adds POST `bulk/` for creating a list of records in one request"""
+    bulk_max_items = 500
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create several records at once.
+
+        Valid items are inserted together in a single transaction; each
+        invalid item is reported by its index and nothing else is affected.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'error': 'Expected a list of records'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.bulk_max_items:
+            return Response(
+                {'error': f'At most {self.bulk_max_items} records can be created at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        valid, errors = serializer.validate_items()
+        with transaction.atomic():
+            valid = self.admit_bulk_items(valid, errors)
+            created = self.perform_bulk_create(serializer, [attrs for _, attrs in valid])
+
+        ids = [instance.pk for instance in created]
+        model = self.get_queryset().model
+        transaction.on_commit(lambda: publish_changes(model, ids))
+        rows = self.get_queryset().in_bulk(ids)
+        data = self.get_serializer([rows[pk] for pk in ids], many=True).data
+
+        results = [None] * len(request.data)
+        for (index, _), item in zip(valid, data):
+            results[index] = {'status': 'created', 'data': item}
+        for index, detail in errors.items():
+            results[index] = {'status': 'error', 'errors': detail}
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': len(valid),
+            'failed': len(errors),
+            'results': results,
+        }, status=response_status)
+
+    def admit_bulk_items(self, valid, errors):
+        """
+        Hook to turn away valid items that can't be created now
+
+        Returns the admitted `(index, attrs)` pairs and adds the error detail
+        of each rejected item to `errors`.
+        """
+        return valid
+
+    def perform_bulk_create(self, serializer, items):
+        return serializer.bulk_create(items)
+
+
+class ExportMixin:
+    """
+    Adds GET `export/` streaming every matching row as CSV or NDJSON.
+
+    Rows are read as plain tuples in chunks (server-side cursors on
+    PostgreSQL), so memory stays flat regardless of the export size. Under
+    ASGI they are streamed asynchronously, see served_async().
+    Archived rows (carwash.archive) follow the live ones when the date
+    range reaches into the archive.
+    """
+    export_fields = ()  # (column, lookup) pairs
+    export_date_field = None
+    export_filter_params = {}  # query param -> lookup
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream records as CSV or NDJSON
+
+        Query params: export_format (csv or ndjson), start_date, end_date,
+        plus the list filters of this endpoint.
+        """
+        params = request.query_params
+        export_format = params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            date_filters = date_range_filters(params, self.export_date_field)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        filters = {
+            lookup: params[param]
+            for param, lookup in self.export_filter_params.items() if params.get(param)
+        }
+        queryset = self.get_queryset().filter(**date_filters, **filters)
+
+        columns = [column for column, _ in self.export_fields]
+        lookups = [lookup for _, lookup in self.export_fields]
+        sources = [queryset]
+        if queryset.model in ARCHIVES:
+            start = date_filters.get(f'{self.export_date_field}__gte')
+            archived = archived_rows(queryset.model, {**date_filters, **filters}, start)
+            if archived is not None:
+                sources.append(archived)
+        rows = chain.from_iterable(
+            source.values_list(*lookups).iterator(chunk_size=self.export_chunk_size) for source in sources
+        )
+        if served_async(request):
+            content = astream_rows(export_format, columns, rows, self.export_chunk_size)
+        else:
+            content = stream_rows(export_format, columns, rows)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+        filename = f'{self.basename}-{timezone.localdate():%Y%m%d}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+def served_async(request):
+    """
+    True when request came in through ASGI.
+
+    Django reads a sync iterator given to a StreamingHttpResponse to the end
+    before sending anything under ASGI (and an async one under WSGI), so
+    streamed responses pick the iterator matching the handler.
+    """
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+class NotModified(Exception):
+    """Raised before an action runs when the client's cached copy is current"""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def selected_relations(select_related, prefix=''):
+    """Lookup paths of every relation in a query's select_related tree"""
+    if not isinstance(select_related, dict):
+        return []
+    paths = []
+    for name, nested in select_related.items():
+        paths.append(prefix + name)
+        paths.extend(selected_relations(nested, f'{prefix}{name}__'))
+    return paths
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified support for GET list, detail and selected actions.
+
+    Validators come from a single MAX(updated_at)/COUNT query over the
+    queryset the action serves, plus MAX(updated_at) of each relation it
+    select_related()s, which are the related rows the response renders, so
+    an unchanged poll is answered with 304 before anything is loaded or
+    serialized. Writes that bypass save() must set updated_at for clients
+    to see them.
+    """
+    # action -> extra filters the action applies on top of get_queryset()
+    conditional_actions = {'list': {}, 'retrieve': {}}
+
+    def get_conditional_queryset(self):
+        """Rows the current action serves, for the MAX(updated_at)/COUNT query"""
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **self.conditional_actions[self.action]
+        )
+        if self.detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, DjangoValidationError):
+                # A malformed pk matches nothing, as in get_object()
+                raise Http404
+        return queryset.order_by()
+
+    def conditional_state(self, queryset):
+        """Aggregates over the served rows that change whenever the response does"""
+        state = {'count': Count('pk'), 'last_modified': Max('updated_at')}
+        for path in selected_relations(queryset.query.select_related):
+            state[f'{path}_modified'] = Max(f'{path}__updated_at')
+        return state
+
+    def validators_from_state(self, state):
+        """(etag, last_modified) from the aggregate of conditional_state()"""
+        fingerprint = '|'.join(str(value) for value in state.values())
+        modified = [value for name, value in state.items() if name != 'count' and value is not None]
+        return self.make_etag(fingerprint), max(modified, default=None)
+
+    def get_conditional_validators(self):
+        """Return (etag, last_modified datetime or None) for the current action"""
+        queryset = self.get_conditional_queryset()
+        state = queryset.aggregate(**self.conditional_state(queryset))
+        return self.validators_from_state(state)
+
+    def make_etag(self, fingerprint):
+        value = f'{self.basename}|{self.action}|{fingerprint}|{self.request.get_full_path()}'
+        return '"%s"' % hashlib.sha1(value.encode()).hexdigest()
+
+    def conditional_enabled(self, request):
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return False
+        # Cursor pages exist to avoid whole-table scans; don't add one back
+        use_cursor = getattr(self.paginator, 'use_cursor', None)
+        return not (self.action == 'list' and use_cursor and use_cursor(request))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_etag = self.conditional_last_modified = None
+        if not self.conditional_enabled(request):
+            return
+        etag, last_modified = self.get_conditional_validators()
+        self.conditional_etag = etag
+        if last_modified is not None:
+            self.conditional_last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=self.conditional_last_modified
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'conditional_etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.conditional_etag
+            if self.conditional_last_modified is not None:
+                response['Last-Modified'] = http_date(self.conditional_last_modified)
+        return response
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=` and `?expand=` (comma-separated) for reads.
+
+    `fields` limits the response to the named fields and `expand` renders
+    the named relations as nested objects (SparseFieldsMixin in
+    carwash.serializers). The queryset loads only the columns and joins the
+    response needs. Unknown names are a 400.
+    """
+    sparse_actions = ('list', 'retrieve', 'pending', 'active')
+
+    def sparse_fieldset(self):
+        """(fields or None, expand) requested for this action, or None"""
+        if self.request.method not in ('GET', 'HEAD') or self.action not in self.sparse_actions:
+            return None
+        params = self.request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        serializer_class = self.get_serializer_class()
+        fields = expand = frozenset()
+        if 'fields' in params:
+            fields = frozenset(name for name in params['fields'].split(',') if name)
+            unknown = fields.difference(serializer_class.Meta.fields)
+            if unknown:
+                raise ValidationError({'fields': [f"Unknown field: {', '.join(sorted(unknown))}"]})
+        if params.get('expand'):
+            expand = frozenset(name for name in params['expand'].split(',') if name)
+            unknown = expand.difference(serializer_class.expandable_fields())
+            if unknown:
+                raise ValidationError({'expand': [f"Cannot expand: {', '.join(sorted(unknown))}"]})
+        return (fields if 'fields' in params else None), expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fieldset = self.sparse_fieldset()
+        if fieldset is not None:
+            context['fields'], context['expand'] = fieldset
+        return context
 
-class AttendantViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = self.sparse_fieldset()
+        plan = row_plan(self.get_serializer_class(), *fieldset) if fieldset else None
+        return plan.narrow(queryset) if plan is not None else queryset
+
+
+class FastListMixin(SparseFieldsMixin):
+    """
+    Builds list responses from values_list() rows (carwash.fastpath).
+
+    Applies to JSON responses while FAST_LIST_SERIALIZATION is on; cursor
+    pages, the browsable API and serializers without a row plan use the
+    serializer. The output is the same either way.
+    """
+
+    def get_row_plan(self):
+        if not getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            return None
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is not None and renderer.format != 'json':
+            return None
+        use_cursor = getattr(self.paginator, 'use_cursor', None)
+        if use_cursor and use_cursor(self.request):
+            return None
+        return row_plan(self.get_serializer_class(), *(self.sparse_fieldset() or ()))
+
+    def serialize_rows(self, queryset):
+        """Serialized rows of queryset, through the row plan when there is one"""
+        plan = self.get_row_plan()
+        if plan is None:
+            return self.get_serializer(queryset, many=True).data
+        return plan.rows(plan.values(queryset))
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_row_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(plan.pageable(queryset))
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(plan.values(queryset)))
+
+
+class ReferenceListMixin:
+    """Serves the list action from an in-process reference cache"""
+    reference_cache = None
+    reference_active_only = False
+
+    def uses_reference_cache(self):
+        params = self.request.query_params
+        return self.action == 'list' and not params.get('ordering') and not params.get('search')
+
+    def get_conditional_validators(self):
+        if self.uses_reference_cache():
+            return self.make_etag(self.reference_cache.fingerprint), None
+        return super().get_conditional_validators()
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_reference_cache():
+            return super().list(request, *args, **kwargs)
+        rows = self.reference_cache.active() if self.reference_active_only else self.reference_cache.all()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(rows, many=True).data)
+
+
+class AttendantViewSet(ReferenceListMixin, SparseFieldsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Attendants"""
     queryset = Attendant.objects.all()
     serializer_class = AttendantSerializer
+    reference_cache = attendant_directory
 
     @action(detail=True, methods=['get'])
+    @replica_read
     def performance(self, request, pk=None):
         """Get performance statistics for an attendant"""
         attendant = self.get_object()
@@ -39,40 +460,40 @@ class AttendantViewSet(viewsets.ModelViewSet):
         })
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(FastListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Customers"""
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    search_fields = ['name', 'phone', 'phone_key', 'email', 'id_number']
 
     @action(detail=True, methods=['get'])
+    @replica_read
     def summary(self, request, pk=None):
-        """Get customer summary and history"""
+        """Get customer summary and history from the maintained counters"""
         customer = self.get_object()
-        vehicles_count = customer.vehicles.count()
-        total_spent = customer.payments.filter(status='completed').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-        recent_services = customer.service_requests.all()[:5]
-        recent_parking = customer.parking_records.all()[:5]
+        recent_services = customer.service_requests.select_related(*SERVICE_REQUEST_RELATED)[:5]
+        recent_parking = customer.parking_records.select_related(*PARKING_RELATED)[:5]
 
         return Response({
             'customer': CustomerSerializer(customer).data,
-            'vehicles_count': vehicles_count,
-            'total_spent': str(total_spent),
+            'vehicles_count': customer.vehicle_count,
+            'visit_count': customer.visit_count,
+            'last_visit': customer.last_visit,
+            'total_spent': str(customer.lifetime_spend),
             'recent_services': ServiceRequestSerializer(recent_services, many=True).data,
             'recent_parking': ParkingSerializer(recent_parking, many=True).data,
         })
 
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(FastListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Vehicles"""
-    queryset = Vehicle.objects.all()
+    queryset = Vehicle.objects.select_related('customer')
     serializer_class = VehicleSerializer
+    search_fields = ['plate_number', 'plate_key', 'make', 'model', 'customer__name']
 
     def get_queryset(self):
         """Filter vehicles by customer if provided"""
-        queryset = Vehicle.objects.all()
+        queryset = super().get_queryset()
         customer_id = self.request.query_params.get('customer_id')
         if customer_id:
             queryset = queryset.filter(customer_id=customer_id)
@@ -80,32 +501,119 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def service_history(self, request, pk=None):
-        """Get service history for a vehicle"""
+        """
+        Get service history for a vehicle
+
+        Optional start_date/end_date (YYYY-MM-DD) limit the range; archived
+        requests follow the live ones when the range reaches the archive.
+        """
         vehicle = self.get_object()
-        services = vehicle.service_requests.all()
+        try:
+            filters = date_range_filters(request.query_params, 'request_date')
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        services = vehicle.service_requests.filter(**filters).select_related(*SERVICE_REQUEST_RELATED)
+        data = ServiceRequestSerializer(services, many=True).data
+        archived = archived_rows(
+            ServiceRequest, {'vehicle': vehicle, **filters}, filters.get('request_date__gte')
+        )
+        if archived is not None:
+            archived = archived.select_related(*SERVICE_REQUEST_RELATED)
+            data += ArchivedServiceRequestSerializer(archived, many=True).data
         return Response({
             'vehicle': VehicleSerializer(vehicle).data,
-            'services': ServiceRequestSerializer(services, many=True).data,
+            'services': data,
         })
 
 
-class ServiceTypeViewSet(viewsets.ModelViewSet):
+class ServiceTypeViewSet(ReferenceListMixin, SparseFieldsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Service Types"""
     queryset = ServiceType.objects.filter(is_active=True)
     serializer_class = ServiceTypeSerializer
+    reference_cache = service_catalog
+    reference_active_only = True
 
 
-class ServiceRequestViewSet(viewsets.ModelViewSet):
+class ServiceRequestViewSet(BulkCreateMixin, ExportMixin, FastListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Service Requests"""
-    queryset = ServiceRequest.objects.all()
+    queryset = ServiceRequest.objects.select_related(*SERVICE_REQUEST_RELATED)
     serializer_class = ServiceRequestSerializer
+    pagination_class = CursorOrPageNumberPagination
+    conditional_actions = {'list': {}, 'retrieve': {}, 'pending': {'status': 'pending'}}
+    export_date_field = 'request_date'
+    export_filter_params = {
+        'status': 'status',
+        'customer_id': 'customer_id',
+        'vehicle_id': 'vehicle_id',
+    }
+    export_fields = (
+        ('id', 'id'),
+        ('vehicle', 'vehicle_id'),
+        ('vehicle_plate', 'vehicle__plate_number'),
+        ('customer', 'customer_id'),
+        ('customer_name', 'customer__name'),
+        ('attendant', 'attendant_id'),
+        ('attendant_name', 'attendant__name'),
+        ('service_type', 'service_type_id'),
+        ('service_name', 'service_type__name'),
+        ('request_date', 'request_date'),
+        ('start_time', 'start_time'),
+        ('completion_time', 'completion_time'),
+        ('status', 'status'),
+        ('notes', 'notes'),
+    )
+
+    def perform_create(self, serializer):
+        """Assign the least-loaded active attendant when none is given"""
+        if serializer.validated_data.get('attendant') is None:
+            attendant_id, _ = scheduler.least_loaded()
+            if attendant_id is not None:
+                serializer.save(attendant=attendant_directory.get(attendant_id))
+                return
+        serializer.save()
+
+    def perform_bulk_create(self, serializer, items):
+        created = super().perform_bulk_create(serializer, items)
+        unassigned = []
+        for service in created:
+            if service.attendant_id is None and service.status == 'pending':
+                attendant_id, _ = scheduler.least_loaded()
+                if attendant_id is None:
+                    break
+                service.attendant = attendant_directory.get(attendant_id)
+                unassigned.append(service)
+            scheduler.sync(service)
+        ServiceRequest.objects.bulk_update(unassigned, ['attendant'])
+        return created
+
+    @action(detail=False, methods=['get'])
+    def next_available(self, request):
+        """Predict which attendant takes the next request and how long it waits"""
+        attendant_id, wait = scheduler.least_loaded()
+        attendant = attendant_directory.get(attendant_id) if attendant_id else None
+        return Response({
+            'attendant': attendant_id,
+            'attendant_name': attendant.name if attendant else None,
+            'predicted_wait_minutes': wait,
+        })
+
+    @action(detail=True, methods=['get'])
+    def predicted_wait(self, request, pk=None):
+        """Predict minutes until a queued request starts (null if not queued)"""
+        try:
+            service_id = int(pk)
+        except ValueError:
+            return Response({'error': 'Invalid service request id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'service_request': service_id,
+            'predicted_wait_minutes': scheduler.predicted_wait(service_id),
+        })
 
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get all pending service requests"""
-        pending_services = ServiceRequest.objects.filter(status='pending')
-        serializer = self.get_serializer(pending_services, many=True)
-        return Response(serializer.data)
+        pending_services = self.get_queryset().filter(status='pending')
+        return Response(self.serialize_rows(pending_services))
 
     @action(detail=True, methods=['post'])
     def start_service(self, request, pk=None):
@@ -116,13 +624,40 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
                 {'error': 'Only pending services can be started'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        service.status = 'in_progress'
-        service.start_time = timezone.now()
-        if not service.attendant:
-            service.attendant = request.user  # Assign current user if available
-        service.save()
+        changes = {'start_time': timezone.now()}
+        attendant = self.resolve_attendant(request, service)
+        if attendant != service.attendant:
+            changes['attendant'] = attendant
+        try:
+            transition(service, 'in_progress', **changes)
+        except TransitionConflict as exc:
+            return conflict_response(exc)
         return Response(ServiceRequestSerializer(service).data)
 
+    def resolve_attendant(self, request, service):
+        """
+        Attendant taking the service: `attendant` in the body, else the one
+        already assigned, else the active attendant whose email matches the
+        logged-in user, else the least-loaded active attendant
+        """
+        if request.data.get('attendant') not in (None, ''):
+            try:
+                attendant = attendant_directory.get(int(request.data['attendant']))
+            except (TypeError, ValueError):
+                attendant = None
+            if attendant is None or not attendant.is_active:
+                raise ValidationError({'attendant': ['Unknown or inactive attendant']})
+            return attendant
+        if service.attendant:
+            return service.attendant
+        email = getattr(request.user, 'email', '')
+        if email:
+            for attendant in attendant_directory.active():
+                if attendant.email.lower() == email.lower():
+                    return attendant
+        attendant_id, _ = scheduler.least_loaded()
+        return attendant_directory.get(attendant_id) if attendant_id is not None else None
+
     @action(detail=True, methods=['post'])
     def complete_service(self, request, pk=None):
         """Mark service as completed"""
@@ -132,23 +667,101 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
                 {'error': 'Service cannot be completed in this status'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        service.status = 'completed'
-        service.completion_time = timezone.now()
-        service.save()
+        try:
+            transition(service, 'completed', completion_time=timezone.now())
+        except TransitionConflict as exc:
+            return conflict_response(exc)
         return Response(ServiceRequestSerializer(service).data)
 
 
-class ParkingViewSet(viewsets.ModelViewSet):
+class ParkingLotViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    """ViewSet for managing Parking Lots and their live occupancy"""
+    queryset = ParkingLot.objects.all()
+    serializer_class = ParkingLotSerializer
+
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        """Get live occupancy across active lots from the maintained counters"""
+        lots = ParkingLot.objects.filter(is_active=True)
+        data = ParkingLotSerializer(lots, many=True).data
+        capacity = sum(lot['capacity'] for lot in data)
+        occupied = sum(lot['occupied'] for lot in data)
+        return Response({
+            'capacity': capacity,
+            'occupied': occupied,
+            'available': max(capacity - occupied, 0),
+            'lots': data,
+        })
+
+
+class ParkingViewSet(BulkCreateMixin, ExportMixin, FastListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Parking Records"""
-    queryset = Parking.objects.all()
+    queryset = Parking.objects.select_related(*PARKING_RELATED)
     serializer_class = ParkingSerializer
+    pagination_class = CursorOrPageNumberPagination
+    conditional_actions = {'list': {}, 'retrieve': {}, 'active': {'status': 'active'}}
+    export_date_field = 'check_in_time'
+    export_filter_params = {
+        'status': 'status',
+        'customer_id': 'customer_id',
+        'vehicle_id': 'vehicle_id',
+    }
+    export_fields = (
+        ('id', 'id'),
+        ('vehicle', 'vehicle_id'),
+        ('vehicle_plate', 'vehicle__plate_number'),
+        ('customer', 'customer_id'),
+        ('customer_name', 'customer__name'),
+        ('check_in_time', 'check_in_time'),
+        ('check_out_time', 'check_out_time'),
+        ('status', 'status'),
+        ('parking_fee', 'parking_fee'),
+        ('attendant', 'attendant_id'),
+        ('attendant_name', 'attendant__name'),
+        ('notes', 'notes'),
+    )
+
+    def perform_create(self, serializer):
+        """Reserve a space (and a free bay) in the lot when checking in"""
+        lot = serializer.validated_data.get('lot')
+        with transaction.atomic():
+            bays = []
+            if lot and serializer.validated_data.get('status', 'active') == 'active':
+                bays = reserve_spaces(lot, 1)
+            serializer.save(bay=bays[0] if bays else None)
+
+    def admit_bulk_items(self, valid, errors):
+        """Check in as many records per lot as it has room for; the rest are reported as full"""
+        by_lot = {}
+        for index, attrs in valid:
+            if attrs.get('lot') and attrs.get('status', 'active') == 'active':
+                by_lot.setdefault(attrs['lot'], []).append((index, attrs))
+        rejected = set()
+        for lot, lot_items in by_lot.items():
+            reserved, bays = lot.allocate_available(len(lot_items))
+            for (_, attrs), bay in zip(lot_items, bays):
+                attrs['bay'] = bay
+            for index, _ in lot_items[reserved:]:
+                errors[index] = {'lot': [f'{lot.name} is full']}
+                rejected.add(index)
+        return [(index, attrs) for index, attrs in valid if index not in rejected]
+
+    def update(self, request, *args, **kwargs):
+        """Edit a record; a closed record cannot become active again, as its space was released"""
+        parking = self.get_object()
+        if parking.status != 'active' and request.data.get('status') == 'active':
+            return Response(
+                {'error': 'A closed parking record cannot be reactivated; check the vehicle in again',
+                 'status': parking.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        return super().update(request, *args, **kwargs)
 
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get all currently parked vehicles"""
-        active_parking = Parking.objects.filter(status='active')
-        serializer = self.get_serializer(active_parking, many=True)
-        return Response(serializer.data)
+        active_parking = self.get_queryset().filter(status='active')
+        return Response(self.serialize_rows(active_parking))
 
     @action(detail=True, methods=['post'])
     def check_out(self, request, pk=None):
@@ -159,44 +772,70 @@ class ParkingViewSet(viewsets.ModelViewSet):
                 {'error': 'Vehicle is not currently parked'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        parking.status = 'completed'
-        parking.check_out_time = timezone.now()
+        changes = {'check_out_time': timezone.now()}
 
         # Calculate parking fee if not already set
         if not parking.parking_fee and 'parking_fee' in request.data:
-            parking.parking_fee = request.data['parking_fee']
-
-        parking.save()
+            field = ParkingSerializer(parking).fields['parking_fee']
+            changes['parking_fee'] = field.run_validation(request.data['parking_fee'])
+
+        try:
+            # Frees the lot space through the save hook in carwash.signals
+            transition(parking, 'completed', **changes)
+        except TransitionConflict as exc:
+            return conflict_response(exc)
         return Response(ParkingSerializer(parking).data)
 
     @action(detail=False, methods=['get'])
+    @replica_read
     def duration_stats(self, request):
-        """Get parking duration statistics"""
-        completed = Parking.objects.filter(status='completed', check_out_time__isnull=False)
-        total_vehicles = completed.count()
-        avg_duration = 0
-
-        if total_vehicles > 0:
-            duration_sum = sum([
-                (p.check_out_time - p.check_in_time).total_seconds()
-                for p in completed
-            ])
-            avg_duration = duration_sum / total_vehicles / 3600  # Convert to hours
+        """
+        Get parking duration statistics
 
-        return Response({
-            'total_vehicles_parked': total_vehicles,
-            'average_duration_hours': round(avg_duration, 2),
-        })
+        Optional filters: start_date, end_date (YYYY-MM-DD, on check-in),
+        attendant_id and vehicle_type.
+        """
+        params = request.query_params
+        try:
+            parkings = Parking.objects.filter(**date_range_filters(params, 'check_in_time'))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if params.get('attendant_id'):
+            parkings = parkings.filter(attendant_id=params['attendant_id'])
+        if params.get('vehicle_type'):
+            parkings = parkings.filter(vehicle__vehicle_type=params['vehicle_type'])
+
+        return Response(parking_duration_stats(parkings))
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(BulkCreateMixin, ExportMixin, FastListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for managing Payments"""
-    queryset = Payment.objects.all()
+    queryset = Payment.objects.select_related(*PAYMENT_RELATED)
     serializer_class = PaymentSerializer
+    pagination_class = CursorOrPageNumberPagination
+    export_date_field = 'payment_date'
+    export_filter_params = {
+        'status': 'status',
+        'customer_id': 'customer_id',
+    }
+    export_fields = (
+        ('id', 'id'),
+        ('customer', 'customer_id'),
+        ('customer_name', 'customer__name'),
+        ('service_request', 'service_request_id'),
+        ('parking', 'parking_id'),
+        ('amount', 'amount'),
+        ('payment_method', 'payment_method'),
+        ('status', 'status'),
+        ('transaction_ref', 'transaction_ref'),
+        ('payment_date', 'payment_date'),
+        ('notes', 'notes'),
+    )
 
     def get_queryset(self):
         """Filter payments"""
-        queryset = Payment.objects.all()
+        queryset = super().get_queryset()
         status = self.request.query_params.get('status')
         customer_id = self.request.query_params.get('customer_id')
 
@@ -216,42 +855,123 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 {'error': 'Only pending payments can be confirmed'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        payment.status = 'completed'
+        changes = {}
         if 'transaction_ref' in request.data:
-            payment.transaction_ref = request.data['transaction_ref']
-        payment.save()
+            field = PaymentSerializer(payment).fields['transaction_ref']
+            changes['transaction_ref'] = field.run_validation(request.data['transaction_ref'])
+        try:
+            transition(payment, 'completed', **changes)
+        except TransitionConflict as exc:
+            return conflict_response(exc)
+        return Response(PaymentSerializer(payment).data)
+
+    @action(detail=True, methods=['post'])
+    def refund(self, request, pk=None):
+        """Refund a completed payment"""
+        payment = self.get_object()
+        if payment.status != 'completed':
+            return Response(
+                {'error': 'Only completed payments can be refunded'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        changes = {}
+        if 'notes' in request.data:
+            changes['notes'] = PaymentSerializer(payment).fields['notes'].run_validation(request.data['notes'])
+        try:
+            transition(payment, 'refunded', **changes)
+        except TransitionConflict as exc:
+            return conflict_response(exc)
         return Response(PaymentSerializer(payment).data)
 
     @action(detail=False, methods=['get'])
+    @replica_read
     def daily_revenue(self, request):
         """Get daily revenue statistics"""
-        today = timezone.now().date()
-        today_payments = Payment.objects.filter(
-            status='completed',
-            payment_date__date=today
-        )
-        total_revenue = today_payments.aggregate(total=Sum('amount'))['total'] or 0
-        transaction_count = today_payments.count()
+        today = timezone.localdate()
+        rollups = RevenueRollup.objects.filter(date=today)
+        totals = rollups.aggregate(total=Sum('total_amount'), count=Sum('transaction_count'))
 
         return Response({
             'date': today,
-            'total_revenue': str(total_revenue),
-            'transactions': transaction_count,
+            'total_revenue': str(totals['total'] or 0),
+            'transactions': totals['count'] or 0,
+            'by_method': {
+                rollup.payment_method: str(rollup.total_amount) for rollup in rollups
+            },
         })
 
     @action(detail=False, methods=['get'])
+    @replica_read
     def monthly_revenue(self, request):
         """Get monthly revenue statistics"""
-        today = timezone.now()
-        first_day = today.replace(day=1)
-        monthly_payments = Payment.objects.filter(
-            status='completed',
-            payment_date__gte=first_day
-        )
-        total_revenue = monthly_payments.aggregate(total=Sum('amount'))['total'] or 0
+        today = timezone.localdate()
+        rollups = RevenueRollup.objects.filter(date__gte=today.replace(day=1), date__lte=today)
+        totals = rollups.aggregate(total=Sum('total_amount'), count=Sum('transaction_count'))
 
         return Response({
             'month': today.strftime('%B %Y'),
-            'total_revenue': str(total_revenue),
-            'transactions': monthly_payments.count(),
+            'total_revenue': str(totals['total'] or 0),
+            'transactions': totals['count'] or 0,
         })
+
+
+def live_queue(request):
+    """
+    Server-sent events feed of the wash-bay queue
+
+    Sends a `snapshot` event with pending service requests and active
+    parking, then `upsert`/`remove` deltas as rows change. A `resync` event
+    means the client fell behind and should reconnect.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    subscription = live_feed.subscribe()
+    stream = AsyncStream if served_async(request) else live_stream
+    response = StreamingHttpResponse(stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+TYPEAHEAD_MAX_LIMIT = 50
+
+
+@api_view(['GET'])
+def typeahead(request):
+    """Vehicles and customers matching a partly typed plate, phone number or name"""
+    query = request.query_params.get('q', '')
+    if len(name_key(query).replace(' ', '')) < 2:
+        raise ValidationError({'q': ['Type at least 2 letters or digits.']})
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= TYPEAHEAD_MAX_LIMIT:
+        raise ValidationError({'limit': [f'Must be between 1 and {TYPEAHEAD_MAX_LIMIT}.']})
+    return Response({'query': query, 'results': search_typeahead(query, limit)})
+
+
+@api_view(['GET'])
+def gate_lookup(request):
+    """
+    Vehicle, owner, active parking and open service requests of an arriving plate
+
+    Served from the in-process gate cache when the plate was looked up
+    recently; `cached` says which.
+    """
+    plate = request.query_params.get('plate', '')
+    if len(plate_key(plate)) < 2:
+        raise ValidationError({'plate': ['Enter a plate number.']})
+    record, cached = gate_cache.lookup(plate)
+    if record is None:
+        return Response(
+            {'error': f'No vehicle with plate {plate}', 'cached': cached},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response({'plate': plate_key(plate), 'cached': cached, **record})
+
+
+@api_view(['GET'])
+def gate_cache_stats(request):
+    """Size, hit rate, evictions and invalidations of this process's gate cache"""
+    return Response(gate_cache.stats())
@@ -0,0 +1,14 @@
+"""
+ASGI config for Smart Car Wash System project.
+
+Serves the async read endpoints (carwash.async_views) without tying up a
+worker per waiting client, e.g. `uvicorn config.asgi:application`.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+application = get_asgi_application()
@@ -0,0 +1,109 @@
+"""
+Request profiling middleware
+
+A sampled share of requests (PROFILING_SAMPLE_RATE) is profiled with
+carwash.profiling: the response carries a Server-Timing header with query
+count and time, serialization, rendering and total time, e.g.
+
+    Server-Timing: db;dur=4.1;desc="3 queries", serialize;dur=2.0,
+                   render;dur=0.3, total;dur=9.8;desc="payment-list"
+
+Any request slower than SLOW_REQUEST_MS is written to the `config.profiling`
+logger as one JSON object, with the slowest statements when it was
+profiled. Requests that are not sampled only pay for two clock reads.
+"""
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from carwash.profiling import start_profile, stop_profile
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.slow_seconds = getattr(settings, 'SLOW_REQUEST_MS', 1000) / 1000
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = token = None
+        if self.sampled():
+            profile, token = start_profile()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                stop_profile(token)
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profile = token = None
+        if self.sampled():
+            profile, token = start_profile()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                stop_profile(token)
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    def finish(self, request, response, profile, elapsed):
+        if profile is not None:
+            response['Server-Timing'] = server_timing(request, profile, elapsed)
+        if elapsed >= self.slow_seconds:
+            logger.warning(json.dumps(slow_request_record(request, response, profile, elapsed)))
+        return response
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else None
+
+
+def server_timing(request, profile, elapsed):
+    metrics = [f'db;dur={profile.db_time * 1000:.1f};desc="{len(profile.queries)} queries"']
+    metrics.extend(
+        f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(profile.phases.items())
+    )
+    name = view_name(request)
+    metrics.append(f'total;dur={elapsed * 1000:.1f}' + (f';desc="{name}"' if name else ''))
+    return ', '.join(metrics)
+
+
+def slow_request_record(request, response, profile, elapsed):
+    record = {
+        'event': 'slow_request',
+        'method': request.method,
+        'path': request.path,
+        'view': view_name(request),
+        'status': response.status_code,
+        'total_ms': round(elapsed * 1000, 1),
+        'profiled': profile is not None,
+    }
+    if profile is not None:
+        record.update({
+            'queries': len(profile.queries),
+            'db_ms': round(profile.db_time * 1000, 1),
+            **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in profile.phases.items()},
+            'top_queries': profile.top_queries(),
+        })
+    return record
@@ -27,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'carwash.metrics.MetricsMiddleware',
+    'config.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -35,6 +37,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'carwash.routing.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -68,6 +71,22 @@ DATABASES = {
     }
 }
 
+# Optional streaming replica for reporting endpoints (carwash.routing).
+# Leave DB_REPLICA_HOST empty to serve every read from the primary.
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=DB_REPLICA_HOST,
+        PORT=config('DB_REPLICA_PORT', default='5432'),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['carwash.routing.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after one of its writes
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,13 +122,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': [
+        'carwash.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
 }
 
+# Build JSON list responses from values_list() rows (carwash.fastpath)
+# instead of the serializers; the output is the same.
+FAST_LIST_SERIALIZATION = config('FAST_LIST_SERIALIZATION', default=True, cast=bool)
+
+# Share of requests profiled with a Server-Timing header (0 to 1), and the
+# duration above which a request is logged to `config.profiling`
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=1.0 if DEBUG else 0.01, cast=float)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+
+# Prometheus metrics at /metrics. With several worker processes, point
+# METRICS_DIR at a directory they share (emptied on deploy) so the endpoint
+# sums all of them; METRICS_TOKEN, when set, is required as a Bearer token
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=5, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+
+# In-process cache of service types and attendants (carwash.reference).
+# Set to a CACHES alias to share invalidations across worker processes;
+# otherwise each process re-checks the tables every CHECK_SECONDS.
+REFERENCE_CACHE_ALIAS = config('REFERENCE_CACHE_ALIAS', default='')
+REFERENCE_CACHE_CHECK_SECONDS = config('REFERENCE_CACHE_CHECK_SECONDS', default=5, cast=int)
+
+# In-process LRU of resolved gate plate lookups (carwash.gate). Local
+# changes invalidate entries at once; entries expire after GATE_CACHE_SECONDS
+# so changes made by other worker processes are picked up too.
+GATE_CACHE_SIZE = config('GATE_CACHE_SIZE', default=2048, cast=int)
+GATE_CACHE_SECONDS = config('GATE_CACHE_SECONDS', default=30, cast=float)
+
+# Closed service requests, parking and payments older than this many days
+# are moved to the archive tables by `manage.py archive_records`.
+ARCHIVE_RETENTION_DAYS = config('ARCHIVE_RETENTION_DAYS', default=365, cast=int)
+
+# How often the in-memory bay scheduler (carwash.scheduling) re-seeds from
+# the database to pick up assignments made by other worker processes.
+SCHEDULER_RESYNC_SECONDS = config('SCHEDULER_RESYNC_SECONDS', default=30, cast=int)
@@ -0,0 +1,22 @@
+"""
+Local settings with two SQLite files standing in for primary and replica
+
+    python manage.py migrate --settings=config.settings_local_replica
+    python manage.py migrate --database=replica --settings=config.settings_local_replica
+    cp primary.sqlite3 replica.sqlite3   # "replicate"
+    python manage.py runserver --settings=config.settings_local_replica
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}